@@ -0,0 +1,76 @@
+import uuid
+from datetime import datetime
+from typing import List, Optional
+from sqlalchemy import and_, func, or_, update
+from sqlmodel import Session, select
+
+from app.models.ingest import (
+    IngestJob, IngestJobCreate, IngestJobPublic, INGEST_JOB_PENDING, INGEST_JOB_RUNNING
+)
+
+
+def create_ingest_job(*, session: Session, job_create: IngestJobCreate) -> IngestJob:
+    db_obj = IngestJob.model_validate(job_create)
+    session.add(db_obj)
+    session.commit()
+    session.refresh(db_obj)
+    return db_obj
+
+
+def get_ingest_job(*, session: Session, job_id: uuid.UUID) -> Optional[IngestJob]:
+    return session.get(IngestJob, job_id)
+
+
+def update_ingest_job(*, session: Session, job_id: uuid.UUID, **fields) -> Optional[IngestJob]:
+    db_obj = session.get(IngestJob, job_id)
+    if not db_obj:
+        return None
+    db_obj.sqlmodel_update(fields)
+    session.add(db_obj)
+    session.commit()
+    session.refresh(db_obj)
+    return db_obj
+
+
+def _last_seen():
+    # Pending jobs have no heartbeat yet: they count from their creation
+    return func.coalesce(IngestJob.heartbeat_at, IngestJob.created_at)
+
+
+def claim_ingest_job(*, session: Session, job_id: uuid.UUID, owner: str, stale_before: datetime, **fields) -> bool:
+    """
+    Atomically give a job to `owner` (and set `fields`) if it is pending, or running
+    without a heartbeat since `stale_before`. False if another worker has it.
+    """
+    statement = update(IngestJob).where(
+        IngestJob.id == job_id,
+        or_(
+            IngestJob.status == INGEST_JOB_PENDING,
+            and_(IngestJob.status == INGEST_JOB_RUNNING, _last_seen() < stale_before),
+        ),
+    ).values(owner=owner, **fields)
+    claimed = session.execute(statement).rowcount == 1
+    session.commit()
+    return claimed
+
+
+def update_claimed_ingest_job(*, session: Session, job_id: uuid.UUID, owner: str, **fields) -> bool:
+    """Update a job only while `owner` still has it."""
+    statement = update(IngestJob).where(IngestJob.id == job_id, IngestJob.owner == owner).values(**fields)
+    updated = session.execute(statement).rowcount == 1
+    session.commit()
+    return updated
+
+
+def get_stale_ingest_jobs(*, session: Session, stale_before: datetime) -> List[IngestJob]:
+    """Unfinished jobs nobody has sent a heartbeat for since `stale_before`."""
+    statement = select(IngestJob).where(
+        IngestJob.status.in_([INGEST_JOB_PENDING, INGEST_JOB_RUNNING]),
+        _last_seen() < stale_before,
+    ).order_by(IngestJob.created_at)
+    return list(session.exec(statement).all())
+
+
+def to_public(job: IngestJob) -> IngestJobPublic:
+    progress = min(1.0, job.bytes_processed / job.bytes_total) if job.bytes_total else 0.0
+    return IngestJobPublic.model_validate(job, update={"progress": progress})
@@ -1,100 +1,30 @@
+import asyncio
 import json
 import os
+import time
 from pydantic import BaseModel
-from typing import List, Dict, Optional
+from typing import AsyncIterator, Iterator, List, Dict, Optional, Tuple
 
-from langchain.chat_models import init_chat_model
-from langchain_openai import OpenAIEmbeddings, AzureOpenAIEmbeddings, AzureChatOpenAI
+from langchain_core.documents import Document
 from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables.config import run_in_executor
 from langchain_core.vectorstores import VectorStore
 from langchain_core.messages import BaseMessageChunk, message_to_dict
-from langchain_qdrant import QdrantVectorStore
-from qdrant_client import QdrantClient
 
+from app.core.clients import CLIENTS
 from app.core.config import settings
+from app.core.embeddings import CachedEmbeddings
+from app.core.metrics import record_error, record_request, record_timings, record_tokens, timed_stream
+from app.core.providers import PROVIDERS, ProviderAccessor
+from app.core.text import pack_contexts
+from app.core.vectorstore import NumpyVectorStore
 
-# Try to import Google Vertex AI (optional)
-try:
-    from langchain_google_vertexai import ChatVertexAI, VertexAIEmbeddings
-    VERTEX_AVAILABLE = True
-except ImportError:
-    VERTEX_AVAILABLE = False
-    ChatVertexAI = None
-    VertexAIEmbeddings = None
-
-# Try to import Google Gemini API (optional)
-try:
-    from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
-    GEMINI_API_AVAILABLE = True
-except ImportError:
-    GEMINI_API_AVAILABLE = False
-    ChatGoogleGenerativeAI = None
-    GoogleGenerativeAIEmbeddings = None
-
-
-# Initialize LLM based on provider selection
-if settings.USE_GEMINI_API and settings.GOOGLE_API_KEY:
-    if not GEMINI_API_AVAILABLE:
-        raise ImportError("langchain-google-genai is not installed. Run: pip install langchain-google-genai")
-    print("🌟 Using Google Gemini API")
-    LLM = ChatGoogleGenerativeAI(
-        model=settings.GEMINI_MODEL,
-        google_api_key=settings.GOOGLE_API_KEY,
-    )
-elif settings.USE_GOOGLE_VERTEX and settings.GOOGLE_CLOUD_PROJECT:
-    if not VERTEX_AVAILABLE:
-        raise ImportError("langchain-google-vertexai is not installed. Run: pip install langchain-google-vertexai")
-    print("🟡 Using Google Vertex AI")
-    LLM = ChatVertexAI(
-        model=settings.GOOGLE_VERTEX_MODEL,
-        project=settings.GOOGLE_CLOUD_PROJECT,
-        location=settings.GOOGLE_CLOUD_LOCATION,
-    )
-elif settings.USE_AZURE and settings.AZURE_OPENAI_API_KEY:
-    print("🔵 Using Azure OpenAI")
-    LLM = AzureChatOpenAI(
-        azure_deployment=settings.AZURE_OPENAI_DEPLOYMENT_NAME,
-        azure_endpoint=settings.AZURE_OPENAI_ENDPOINT,
-        api_key=settings.AZURE_OPENAI_API_KEY,
-        api_version=settings.AZURE_OPENAI_API_VERSION,
-    )
-else:
-    print("🟢 Using OpenAI")
-    LLM = init_chat_model(
-        settings.OPENAI_MODEL_NAME or "gpt-4o-mini",
-        model_provider="openai",
-        api_key=settings.OPENAI_API_KEY
-    )
 
-# Initialize Embeddings based on provider selection
-if settings.USE_GEMINI_API and settings.GOOGLE_API_KEY:
-    if not GEMINI_API_AVAILABLE:
-        raise ImportError("langchain-google-genai is not installed. Run: pip install langchain-google-genai")
-    print("🌟 Using Google Gemini Embeddings")
-    EMBEDDINGS = GoogleGenerativeAIEmbeddings(
-        model="models/embedding-001",
-        google_api_key=settings.GOOGLE_API_KEY,
-    )
-elif settings.USE_GOOGLE_VERTEX and settings.GOOGLE_CLOUD_PROJECT:
-    if not VERTEX_AVAILABLE:
-        raise ImportError("langchain-google-vertexai is not installed. Run: pip install langchain-google-vertexai")
-    EMBEDDINGS = VertexAIEmbeddings(
-        model_name=settings.GOOGLE_VERTEX_EMBEDDING_MODEL,
-        project=settings.GOOGLE_CLOUD_PROJECT,
-        location=settings.GOOGLE_CLOUD_LOCATION,
-    )
-elif settings.USE_AZURE and settings.AZURE_OPENAI_API_KEY:
-    EMBEDDINGS = AzureOpenAIEmbeddings(
-        azure_deployment=settings.AZURE_OPENAI_EMBEDDING_DEPLOYMENT,
-        azure_endpoint=settings.AZURE_OPENAI_ENDPOINT,
-        api_key=settings.AZURE_OPENAI_API_KEY,
-        api_version=settings.AZURE_OPENAI_API_VERSION,
-    )
-else:
-    EMBEDDINGS = OpenAIEmbeddings(
-        model=settings.OPENAI_EMBEDDINGS_NAME or "text-embedding-3-small",
-        api_key=settings.OPENAI_API_KEY,
-    )
+# The selected provider's models are imported and built on first use (see app.core.providers)
+LLM = ProviderAccessor(PROVIDERS.llm)
+EMBEDDINGS = ProviderAccessor(PROVIDERS.embeddings)
+EMBEDDINGS_PROVIDER, EMBEDDINGS_MODEL = PROVIDERS.provider, PROVIDERS.embeddings_model
+SYMMETRIC_EMBEDDINGS = PROVIDERS.symmetric_embeddings
 
 # Lazy initialization to avoid OpenAI API calls at startup
 _VECTOR_STORE = None
@@ -102,18 +32,32 @@ _VECTOR_STORE = None
 def get_vector_store():
     """Get or create the vector store instance"""
     global _VECTOR_STORE
+    if _VECTOR_STORE is None and settings.VECTOR_STORE_BACKEND == "numpy":
+        print(f"📦 Using in-process vector store at {settings.NUMPY_VECTOR_STORE_PATH}")
+        _VECTOR_STORE = NumpyVectorStore(EMBEDDINGS, path=settings.NUMPY_VECTOR_STORE_PATH)
     if _VECTOR_STORE is None:
-        client = QdrantClient(
-            url=settings.QDRANT_URL,
-            api_key=settings.QDRANT_API_KEY if settings.QDRANT_API_KEY else None
-        )
+        from langchain_qdrant import QdrantVectorStore
+        if settings.QDRANT_URL == ":memory:":
+            create_local_collection()
         _VECTOR_STORE = QdrantVectorStore(
-            client=client,
+            client=CLIENTS.qdrant(),
             collection_name=settings.QDRANT_COLLECTION_NAME,
             embedding=EMBEDDINGS,
         )
     return _VECTOR_STORE
 
+def create_local_collection() -> None:
+    """Qdrant's in-memory local mode starts empty: create the collection, sized for the embeddings."""
+    from qdrant_client import models
+    client = CLIENTS.qdrant()
+    if not client.collection_exists(settings.QDRANT_COLLECTION_NAME):
+        client.create_collection(
+            settings.QDRANT_COLLECTION_NAME,
+            vectors_config=models.VectorParams(
+                size=len(EMBEDDINGS.embed_query("dimension probe")), distance=models.Distance.COSINE
+            ),
+        )
+
 # Create a simple accessor that looks like a constant but calls the function
 class VectorStoreAccessor:
     def __getattribute__(self, name):
@@ -142,6 +86,8 @@ class State(BaseModel):
     question: str
     context: Optional[List[Dict]]
     answer: str
+    # Per-request prompt context budget (default: PROMPT_CONTEXT_TOKEN_BUDGET)
+    token_budget: Optional[int] = None
 
 
 def retrieve(db: VectorStore, state: State):
@@ -150,24 +96,249 @@ def retrieve(db: VectorStore, state: State):
     return {"context": retrieved_docs}
 
 
-def generate(state: State):
-    docs_content = "\n\n".join(doc.page_content for doc in state["context"])
-    messages = PROMPT.invoke(
+async def aretrieve(db: VectorStore, state: State):
+    # Async counterpart of `retrieve`, never blocks the event loop.
+    retrieved_docs = await db.asimilarity_search(state["question"])
+    return {"context": retrieved_docs}
+
+
+def search_by_vector(embedding: List[float], k: int = 4) -> List[Tuple[Document, float]]:
+    """
+    Dense search with a precomputed query embedding.
+    Unlike QdrantVectorStore.similarity_search_with_score_by_vector this skips the
+    per-call collection validation round-trip.
+    """
+    store = get_vector_store()
+    if isinstance(store, NumpyVectorStore):
+        return store.similarity_search_with_score_by_vector(embedding, k)
+    points = store.client.query_points(
+        collection_name=store.collection_name,
+        query=embedding,
+        using=store.vector_name,
+        limit=k,
+        with_payload=True,
+        with_vectors=False,
+    ).points
+    return [
+        (
+            store._document_from_point(
+                point, store.collection_name, store.content_payload_key, store.metadata_payload_key
+            ),
+            point.score,
+        )
+        for point in points
+    ]
+
+
+def get_vectors(ids: List[str]) -> Dict[str, List[float]]:
+    """Stored vectors by point ID, e.g. for re-ranking results that came without them."""
+    store = get_vector_store()
+    if isinstance(store, NumpyVectorStore):
+        return store.get_vectors(ids)
+    if not ids:
+        return {}
+    points = store.client.retrieve(
+        collection_name=store.collection_name,
+        ids=ids,
+        with_payload=False,
+        with_vectors=[store.vector_name] if store.vector_name else True,
+    )
+    vectors = {}
+    for point in points:
+        vector = point.vector
+        if isinstance(vector, dict):
+            vector = vector.get(store.vector_name)
+        if vector is not None:
+            vectors[str(point.id)] = vector
+    return vectors
+
+
+def search_by_vector_with_vectors(
+    embedding: List[float], k: int = 4
+) -> Tuple[List[Tuple[Document, float]], Dict[str, List[float]]]:
+    """Like `search_by_vector`, also returning the hits' stored vectors keyed by point ID."""
+    store = get_vector_store()
+    if isinstance(store, NumpyVectorStore):
+        results = store.similarity_search_with_score_by_vector(embedding, k)
+        return results, store.get_vectors([doc.metadata["_id"] for doc, _ in results])
+    points = store.client.query_points(
+        collection_name=store.collection_name,
+        query=embedding,
+        using=store.vector_name,
+        limit=k,
+        with_payload=True,
+        with_vectors=[store.vector_name] if store.vector_name else True,
+    ).points
+    results, vectors = [], {}
+    for point in points:
+        results.append((
+            store._document_from_point(
+                point, store.collection_name, store.content_payload_key, store.metadata_payload_key
+            ),
+            point.score,
+        ))
+        vector = point.vector
+        if isinstance(vector, dict):
+            vector = vector.get(store.vector_name)
+        if vector is not None:
+            vectors[str(point.id)] = vector
+    return results, vectors
+
+
+def existing_point_ids(ids: List[str], batch_size: int = 1000) -> set:
+    """Return the subset of `ids` that already exist in the collection (no payloads or vectors)."""
+    store = get_vector_store()
+    if isinstance(store, NumpyVectorStore):
+        return store.existing_ids(ids)
+    existing = set()
+    for start in range(0, len(ids), batch_size):
+        points = store.client.retrieve(
+            collection_name=store.collection_name,
+            ids=ids[start:start + batch_size],
+            with_payload=False,
+            with_vectors=False,
+        )
+        existing.update(str(point.id) for point in points)
+    return existing
+
+
+def iter_stored_chunks(batch_size: int = 256) -> Iterator[Tuple[str, str]]:
+    """Scroll the whole collection, yielding (point_id, page_content)."""
+    store = get_vector_store()
+    if isinstance(store, NumpyVectorStore):
+        yield from store.iter_chunks()
+        return
+    offset = None
+    while True:
+        points, offset = store.client.scroll(
+            collection_name=store.collection_name,
+            limit=batch_size,
+            offset=offset,
+            with_payload=[store.content_payload_key],
+            with_vectors=False,
+        )
+        for point in points:
+            yield str(point.id), (point.payload or {}).get(store.content_payload_key, "")
+        if offset is None:
+            return
+
+
+def upsert_embedded(ids: List[str], documents: List[Document], vectors: List[List[float]]) -> None:
+    """Upsert chunks whose embeddings were computed up front (no embedding call here)."""
+    store = get_vector_store()
+    if isinstance(store, NumpyVectorStore):
+        store.upsert_vectors(ids, documents, vectors)
+        return
+    from qdrant_client import models
+    payloads = store._build_payloads(
+        [doc.page_content for doc in documents],
+        [doc.metadata for doc in documents],
+        store.content_payload_key,
+        store.metadata_payload_key,
+    )
+    store.client.upsert(
+        collection_name=store.collection_name,
+        points=[
+            models.PointStruct(id=point_id, vector={store.vector_name: vector}, payload=payload)
+            for point_id, vector, payload in zip(ids, vectors, payloads)
+        ],
+    )
+
+
+async def asearch_by_vector(embedding: List[float], k: int = 4) -> List[Tuple[Document, float]]:
+    return await run_in_executor(None, search_by_vector, embedding, k)
+
+
+def search_by_vectors(embeddings: List[List[float]], limits: List[int]) -> List[List[Tuple[Document, float]]]:
+    """Dense search for many precomputed query embeddings in a single batch request."""
+    if not embeddings:
+        return []
+    store = get_vector_store()
+    if isinstance(store, NumpyVectorStore):
+        results = store.similarity_search_with_score_by_vectors(embeddings, max(limits))
+        return [hits[:k] for hits, k in zip(results, limits)]
+    from qdrant_client import models
+    responses = store.client.query_batch_points(
+        collection_name=store.collection_name,
+        requests=[
+            models.QueryRequest(query=embedding, using=store.vector_name, limit=k, with_payload=True)
+            for embedding, k in zip(embeddings, limits)
+        ],
+    )
+    return [
+        [
+            (
+                store._document_from_point(
+                    point, store.collection_name, store.content_payload_key, store.metadata_payload_key
+                ),
+                point.score,
+            )
+            for point in response.points
+        ]
+        for response in responses
+    ]
+
+
+async def asearch_by_vector_with_vectors(
+    embedding: List[float], k: int = 4
+) -> Tuple[List[Tuple[Document, float]], Dict[str, List[float]]]:
+    return await run_in_executor(None, search_by_vector_with_vectors, embedding, k)
+
+
+async def aget_vectors(ids: List[str]) -> Dict[str, List[float]]:
+    return await run_in_executor(None, get_vectors, ids)
+
+
+async def asearch_by_vectors(embeddings: List[List[float]], limits: List[int]) -> List[List[Tuple[Document, float]]]:
+    return await run_in_executor(None, search_by_vectors, embeddings, limits)
+
+
+async def aembed_queries(texts: List[str]) -> List[List[float]]:
+    """Embed many queries with as few provider calls as the provider allows."""
+    if isinstance(EMBEDDINGS, CachedEmbeddings):
+        return await EMBEDDINGS.aembed_queries(texts)
+    if SYMMETRIC_EMBEDDINGS:
+        return await EMBEDDINGS.aembed_documents(texts)
+    return list(await asyncio.gather(*(EMBEDDINGS.aembed_query(text) for text in texts)))
+
+
+def build_messages(state: State):
+    # Retrieved documents come best first; keep them within the prompt token budget
+    docs = state["context"]
+    packed = pack_contexts(
+        [doc.page_content for doc in docs],
+        [doc.metadata for doc in docs],
+        state.get("token_budget") or settings.PROMPT_CONTEXT_TOKEN_BUDGET,
+    )
+    docs_content = "\n\n".join(text for _, text, _ in packed)
+    return PROMPT.invoke(
         {"question": state["question"], "context": docs_content})
+
+
+def generate(state: State):
+    messages = build_messages(state)
     # print(messages)
     stream = LLM.stream(messages)
     return stream
 
 
 def generate_sync(state: State):
-    docs_content = "\n\n".join(doc.page_content for doc in state["context"])
-    messages = PROMPT.invoke(
-        {"question": state["question"], "context": docs_content})
+    messages = build_messages(state)
     # print(messages)
     stream = LLM.invoke(messages)
     return stream
 
 
+def agenerate(state: State):
+    messages = build_messages(state)
+    return LLM.astream(messages)
+
+
+async def agenerate_sync(state: State):
+    messages = build_messages(state)
+    return await LLM.ainvoke(messages)
+
+
 def generate_chunks(stream: BaseMessageChunk):
     for chunk in stream:
         res = message_to_dict(chunk)
@@ -182,6 +353,12 @@ def generate_text_chunks(stream: BaseMessageChunk):
     # yield "[END]"
 
 
+async def agenerate_text_chunks(stream: AsyncIterator[BaseMessageChunk]):
+    async for chunk in stream:
+        # Same value as message_to_dict(chunk)['data']['content'], without serializing the chunk
+        yield chunk.content
+
+
 def generate_text_chunks_socket(stream: BaseMessageChunk):
     for chunk in stream:
         # print(message_to_dict(chunk))
@@ -211,4 +388,44 @@ def retrieve_and_generate_sync(prompt, tenant=None):
     state['context'] = context['context']
 
     message = generate_sync(state)
-    return message
\ No newline at end of file
+    return message
+
+
+async def aretrieve_and_generate(prompt, tenant=None):
+    state = {'question': prompt, 'context': None, 'answer': ''}
+    if tenant:
+        state.update({'tenant': tenant})
+
+    start = time.perf_counter()
+    try:
+        context = await aretrieve(VECTOR_STORE, state)
+    except Exception:
+        record_error("chat_stream")
+        raise
+    state['context'] = context['context']
+
+    # Time to first token, generation time and usage are recorded as the stream is consumed
+    timings = {"retrieval": time.perf_counter() - start}
+    return timed_stream(agenerate(state), "chat_stream", timings, start)
+
+
+async def aretrieve_and_generate_sync(prompt, tenant=None):
+    state = {'question': prompt, 'context': None, 'answer': ''}
+    if tenant:
+        state.update({'tenant': tenant})
+
+    start = time.perf_counter()
+    try:
+        context = await aretrieve(VECTOR_STORE, state)
+        state['context'] = context['context']
+        retrieved = time.perf_counter()
+
+        message = await agenerate_sync(state)
+    except Exception:
+        record_error("chat")
+        raise
+    end = time.perf_counter()
+    record_timings("chat", {"retrieval": retrieved - start, "generate": end - retrieved, "total": end - start})
+    record_tokens("chat", usage=getattr(message, "usage_metadata", None))
+    record_request("chat")
+    return message
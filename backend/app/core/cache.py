@@ -0,0 +1,289 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+
+
+@dataclass
+class CacheEntry:
+    params: str
+    value: Any
+    created_at: float
+    row_id: Optional[str] = None
+
+
+class SemanticCache:
+    """
+    Answer cache keyed on query embeddings.
+
+    Entries live in a fixed-size float32 matrix of unit vectors, so a lookup is a
+    single matrix-vector product. A lookup hits when the best entry with the same
+    request parameters has cosine similarity >= `threshold` and is younger than
+    `ttl_seconds`. Least recently used entries are evicted once `max_entries` is
+    reached. When `path` is set, entries are also written to a SQLite file and
+    reloaded on startup. SQLite writes run on a single background thread, in order,
+    so neither the event loop nor the lock waits on a commit.
+
+    `invalidate` bumps `generation`. Callers read it before computing an answer and
+    pass it to `store`, so an answer computed from the old collection is dropped.
+    With a SQLite file the generation is persisted there: every worker sharing the
+    file checks it on lookup and drops its entries once another worker invalidated.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.95,
+        max_entries: int = 1024,
+        ttl_seconds: int = 3600,
+        path: Optional[str] = None,
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale_stores = 0
+        self.generation = 0
+
+        self._lock = threading.RLock()
+        self._vectors: Optional[np.ndarray] = None
+        self._valid = np.zeros(max_entries, dtype=bool)
+        # slot -> entry, least recently used first
+        self._entries: "OrderedDict[int, CacheEntry]" = OrderedDict()
+        self._free_slots = list(range(max_entries - 1, -1, -1))
+
+        self._db: Optional[sqlite3.Connection] = None
+        self._reader: Optional[sqlite3.Connection] = None
+        self._writer: Optional[ThreadPoolExecutor] = None
+        if path:
+            self._open(path)
+
+    @staticmethod
+    def params_key(params: Dict) -> str:
+        return json.dumps(params, sort_keys=True, default=str)
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _is_expired(self, entry: CacheEntry, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - entry.created_at > self.ttl_seconds
+
+    def _write(self, fn, *args) -> Optional[Future]:
+        """Queue a SQLite write on the writer thread."""
+        if self._writer is None:
+            return None
+        return self._writer.submit(fn, *args)
+
+    def flush(self) -> None:
+        """Wait for queued SQLite writes to finish."""
+        future = self._write(lambda: None)
+        if future is not None:
+            future.result()
+
+    def _persisted_generation(self) -> int:
+        row = self._reader.execute("SELECT value FROM semantic_cache_meta WHERE key = 'generation'").fetchone()
+        return row[0] if row else 0
+
+    def _sync_generation(self) -> None:
+        """Drop the in-memory entries if another worker invalidated the shared file."""
+        if self._reader is None:
+            return
+        try:
+            persisted = self._persisted_generation()
+        except sqlite3.Error:
+            return
+        with self._lock:
+            if persisted > self.generation:
+                self._clear()
+                self.generation = persisted
+
+    def lookup(self, embedding: List[float], params: Dict) -> Optional[Any]:
+        """Return the cached value for the closest matching query, or None."""
+        query = self._normalize(embedding)
+        key = self.params_key(params)
+        now = time.time()
+        self._sync_generation()
+
+        with self._lock:
+            if self._vectors is None or query.shape[0] != self._vectors.shape[1]:
+                self.misses += 1
+                return None
+
+            similarities = self._vectors @ query
+            similarities[~self._valid] = -np.inf
+            candidates = np.flatnonzero(similarities >= self.threshold)
+
+            for slot in candidates[np.argsort(-similarities[candidates])]:
+                slot = int(slot)
+                entry = self._entries[slot]
+                if self._is_expired(entry, now):
+                    self._evict(slot)
+                    continue
+                if entry.params != key:
+                    continue
+                self._entries.move_to_end(slot)
+                self.hits += 1
+                return entry.value
+
+            self.misses += 1
+            return None
+
+    def store(self, embedding: List[float], params: Dict, value: Any, generation: Optional[int] = None) -> None:
+        """
+        Cache `value` for the query embedding, evicting the LRU entry if full.
+        Nothing is stored if the cache was invalidated since `generation` was read.
+        """
+        self._sync_generation()
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                self.stale_stores += 1
+                return
+            self._insert(self._normalize(embedding), self.params_key(params), value, time.time())
+
+    def _insert(self, vector: np.ndarray, key: str, value: Any, created_at: float, row_id: Optional[str] = None) -> None:
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+            elif vector.shape[0] != self._vectors.shape[1]:
+                # The embedding model changed: start over.
+                self._reset(vector.shape[0])
+
+            if not self._free_slots:
+                lru_slot = next(iter(self._entries))
+                self._evict(lru_slot)
+
+            if row_id is None and self._db is not None:
+                row_id = uuid.uuid4().hex
+                self._write(
+                    self._insert_row, row_id, key, vector.tobytes(), json.dumps(value), created_at, self.generation
+                )
+
+            slot = self._free_slots.pop()
+            self._vectors[slot] = vector
+            self._valid[slot] = True
+            self._entries[slot] = CacheEntry(params=key, value=value, created_at=created_at, row_id=row_id)
+
+    def _evict(self, slot: int) -> None:
+        entry = self._entries.pop(slot)
+        self._valid[slot] = False
+        self._free_slots.append(slot)
+        self.evictions += 1
+        if entry.row_id is not None:
+            self._write(self._delete_row, entry.row_id)
+
+    def _clear(self) -> None:
+        self._valid[:] = False
+        self._entries.clear()
+        self._free_slots = list(range(self.max_entries - 1, -1, -1))
+
+    def _reset(self, dim: int) -> None:
+        self._vectors = np.zeros((self.max_entries, dim), dtype=np.float32)
+        self._clear()
+        self._write(self._delete_rows)
+
+    def invalidate(self) -> None:
+        """Drop every entry, e.g. after new documents were ingested."""
+        with self._lock:
+            self._clear()
+            self.invalidations += 1
+            self.generation += 1
+        self._write(self._bump_generation)
+
+    # Writer thread only
+
+    def _insert_row(self, row_id: str, key: str, blob: bytes, value: str, created_at: float, generation: int) -> None:
+        # Skipped if another worker invalidated the file after this entry was computed
+        self._db.execute(
+            "INSERT INTO semantic_cache_entries (id, params, embedding, value, created_at, generation) "
+            "SELECT ?, ?, ?, ?, ?, ? WHERE "
+            "(SELECT value FROM semantic_cache_meta WHERE key = 'generation') <= ?",
+            (row_id, key, blob, value, created_at, generation, generation),
+        )
+        self._db.commit()
+
+    def _delete_row(self, row_id: str) -> None:
+        self._db.execute("DELETE FROM semantic_cache_entries WHERE id = ?", (row_id,))
+        self._db.commit()
+
+    def _delete_rows(self) -> None:
+        self._db.execute("DELETE FROM semantic_cache_entries")
+        self._db.commit()
+
+    def _bump_generation(self) -> None:
+        self._db.execute("UPDATE semantic_cache_meta SET value = value + 1 WHERE key = 'generation'")
+        self._db.execute("DELETE FROM semantic_cache_entries")
+        self._db.commit()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "stale_stores": self.stale_stores,
+                "memory_bytes": self._vectors.nbytes if self._vectors is not None else 0,
+                "persistent": self._db is not None,
+            }
+
+    def _open(self, path: str) -> None:
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        # Rows of the old schema carry no generation and cannot be checked against invalidations
+        self._db.execute("DROP TABLE IF EXISTS semantic_cache")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS semantic_cache_entries ("
+            "id TEXT PRIMARY KEY, params TEXT NOT NULL, embedding BLOB NOT NULL, "
+            "value TEXT NOT NULL, created_at REAL NOT NULL, generation INTEGER NOT NULL)"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS semantic_cache_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._db.execute("INSERT OR IGNORE INTO semantic_cache_meta (key, value) VALUES ('generation', 0)")
+        self._db.commit()
+        self._reader = sqlite3.connect(path, check_same_thread=False)
+        self.generation = self._persisted_generation()
+        self._db.execute("DELETE FROM semantic_cache_entries WHERE generation < ?", (self.generation,))
+        if self.ttl_seconds > 0:
+            self._db.execute(
+                "DELETE FROM semantic_cache_entries WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            )
+        self._db.commit()
+
+        rows = self._db.execute(
+            "SELECT id, params, embedding, value, created_at FROM semantic_cache_entries "
+            "WHERE generation = ? ORDER BY created_at DESC LIMIT ?",
+            (self.generation, self.max_entries),
+        ).fetchall()
+        # Oldest first so the LRU order survives the reload.
+        for row_id, key, blob, value, created_at in reversed(rows):
+            vector = np.frombuffer(blob, dtype=np.float32)
+            if self._vectors is not None and vector.shape[0] != self._vectors.shape[1]:
+                continue
+            self._insert(vector, key, json.loads(value), created_at, row_id=row_id)
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="semantic-cache")
+
+
+SEMANTIC_CACHE = SemanticCache(
+    threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+    max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.SEMANTIC_CACHE_TTL_SECONDS,
+    path=settings.SEMANTIC_CACHE_PATH,
+)
@@ -0,0 +1,316 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables.config import run_in_executor
+
+from app.core.embeddings import DOCUMENT, QUERY
+
+# Kinds of recorded chat calls
+GENERATE = "generate"
+STREAM = "stream"
+
+
+class CassetteMiss(LookupError):
+    """Replay mode got a request that was never recorded."""
+
+
+def _pack(value: Any) -> bytes:
+    return zlib.compress(json.dumps(value, separators=(",", ":")).encode("utf-8"))
+
+
+def _unpack(blob: bytes) -> Any:
+    return json.loads(zlib.decompress(blob).decode("utf-8"))
+
+
+def _stable(value: Any) -> Any:
+    """JSON stand-in for call arguments json can't encode (e.g. tool schemas)."""
+    if isinstance(value, type):
+        return value.__qualname__
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    return str(value)
+
+
+def _request_message(message: BaseMessage) -> Dict:
+    # IDs and response metadata differ between runs without changing the request
+    return {"type": message.type, **message.model_dump(exclude={"id", "response_metadata", "usage_metadata"})}
+
+
+class Cassette:
+    """
+    On-disk recording of provider calls, in SQLite.
+
+    Chat calls are keyed on sha256(model, messages, stop, call kwargs such as
+    temperature, tools or max_tokens). A blocking call stores the
+    response message and its latency; a streamed call stores every chunk with its
+    offset from the start of the request, so time to first token and token pacing
+    replay faithfully. Both are zlib-compressed JSON. Embeddings are stored per text
+    as float32 blobs with the latency of the call they came in, so replayed batches
+    don't have to match the recorded ones.
+    """
+
+    def __init__(self, path: str, model: str, latency_scale: float = 1.0):
+        self.path = path
+        self.model = model
+        self.latency_scale = latency_scale
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chat_calls ("
+            "request_hash TEXT NOT NULL, kind TEXT NOT NULL, response BLOB NOT NULL, "
+            "PRIMARY KEY (request_hash, kind))"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, kind TEXT NOT NULL, text_hash TEXT NOT NULL, "
+            "vector BLOB NOT NULL, seconds REAL NOT NULL, "
+            "PRIMARY KEY (model, kind, text_hash))"
+        )
+        self._db.commit()
+
+    def chat_key(self, messages: List[BaseMessage], stop: Optional[List[str]], kwargs: Dict[str, Any]) -> str:
+        request = [self.model, [_request_message(message) for message in messages], stop, kwargs]
+        return hashlib.sha256(json.dumps(request, sort_keys=True, default=_stable).encode("utf-8")).hexdigest()
+
+    def record_chat(self, key: str, kind: str, response: Dict) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO chat_calls (request_hash, kind, response) VALUES (?, ?, ?)",
+                (key, kind, _pack(response)),
+            )
+            self._db.commit()
+            self.recorded += 1
+
+    def chat(self, key: str, kind: str) -> Tuple[str, Dict]:
+        """The recording of this request, preferring the same kind of call."""
+        with self._lock:
+            rows = dict(self._db.execute(
+                "SELECT kind, response FROM chat_calls WHERE request_hash = ?", (key,)
+            ).fetchall())
+            if not rows:
+                self.misses += 1
+                raise CassetteMiss(f"No recorded chat call for request {key[:12]} in {self.path}")
+            self.replayed += 1
+        found = kind if kind in rows else next(iter(rows))
+        return found, _unpack(rows[found])
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def record_embeddings(self, kind: str, texts: List[str], vectors: List[List[float]], seconds: float) -> None:
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, kind, text_hash, vector, seconds) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (self.model, kind, self.text_hash(text), np.asarray(vector, dtype=np.float32).tobytes(), seconds)
+                    for text, vector in zip(texts, vectors)
+                ],
+            )
+            self._db.commit()
+            self.recorded += 1
+
+    def embeddings(self, kind: str, texts: List[str]) -> Tuple[List[List[float]], float]:
+        """Recorded vectors of `texts` and the latency to replay (the slowest recorded call among them)."""
+        hashes = [self.text_hash(text) for text in texts]
+        found = {}
+        with self._lock:
+            for text_hash in set(hashes):
+                row = self._db.execute(
+                    "SELECT vector, seconds FROM embeddings WHERE model = ? AND kind = ? AND text_hash = ?",
+                    (self.model, kind, text_hash),
+                ).fetchone()
+                if row is not None:
+                    found[text_hash] = row
+            if len(found) < len(set(hashes)):
+                self.misses += 1
+                raise CassetteMiss(
+                    f"{len(set(hashes)) - len(found)} of {len(texts)} texts have no recorded embedding in {self.path}"
+                )
+            self.replayed += 1
+        vectors = [np.frombuffer(found[text_hash][0], dtype=np.float32).tolist() for text_hash in hashes]
+        return vectors, max(found[text_hash][1] for text_hash in hashes)
+
+    def stats(self) -> Dict:
+        return {
+            "path": self.path,
+            "latency_scale": self.latency_scale,
+            "recorded": self.recorded,
+            "replayed": self.replayed,
+            "misses": self.misses,
+        }
+
+
+def _message(response: Dict) -> AIMessage:
+    return messages_from_dict([response["message"]])[0]
+
+
+def _joined(chunks: List[Dict]) -> AIMessage:
+    """A streamed recording served to a blocking call."""
+    message = None
+    for chunk in chunks:
+        message = _message(chunk) if message is None else message + _message(chunk)
+    message = message or AIMessageChunk(content="")
+    return AIMessage(content=message.content, usage_metadata=message.usage_metadata)
+
+
+class CassetteChatModel(BaseChatModel):
+    """
+    Chat model that records the wrapped model's calls to a `Cassette`, or (with no
+    `underlying` model) replays them with the recorded latency times `latency_scale`.
+    """
+
+    cassette: Any
+    underlying: Optional[Any] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "cassette"
+
+    def _replay_delay(self, seconds: float) -> float:
+        return seconds * self.cassette.latency_scale
+
+    def _generate(
+        self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any
+    ) -> ChatResult:
+        key = self.cassette.chat_key(messages, stop, kwargs)
+        if self.underlying is not None:
+            start = time.perf_counter()
+            message = self.underlying.invoke(messages, stop=stop, **kwargs)
+            response = {"message": message_to_dict(message), "seconds": time.perf_counter() - start}
+            self.cassette.record_chat(key, GENERATE, response)
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+        kind, response = self.cassette.chat(key, GENERATE)
+        if kind == STREAM:
+            time.sleep(self._replay_delay(response["chunks"][-1]["offset"] if response["chunks"] else 0.0))
+            message = _joined(response["chunks"])
+        else:
+            time.sleep(self._replay_delay(response["seconds"]))
+            message = _message(response)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any
+    ) -> ChatResult:
+        key = self.cassette.chat_key(messages, stop, kwargs)
+        if self.underlying is not None:
+            start = time.perf_counter()
+            message = await self.underlying.ainvoke(messages, stop=stop, **kwargs)
+            response = {"message": message_to_dict(message), "seconds": time.perf_counter() - start}
+            await run_in_executor(None, self.cassette.record_chat, key, GENERATE, response)
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+        kind, response = await run_in_executor(None, self.cassette.chat, key, GENERATE)
+        if kind == STREAM:
+            await asyncio.sleep(self._replay_delay(response["chunks"][-1]["offset"] if response["chunks"] else 0.0))
+            message = _joined(response["chunks"])
+        else:
+            await asyncio.sleep(self._replay_delay(response["seconds"]))
+            message = _message(response)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _replay_chunks(self, response: Dict, kind: str) -> List[Tuple[float, AIMessageChunk]]:
+        if kind == STREAM:
+            return [(chunk["offset"], _message(chunk)) for chunk in response["chunks"]]
+        # A blocking recording served to a stream: one chunk at the end
+        message = _message(response)
+        return [(response["seconds"], AIMessageChunk(content=message.content, usage_metadata=message.usage_metadata))]
+
+    def _stream(
+        self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any
+    ) -> Iterator[ChatGenerationChunk]:
+        key = self.cassette.chat_key(messages, stop, kwargs)
+        start = time.perf_counter()
+        if self.underlying is not None:
+            chunks = []
+            for chunk in self.underlying.stream(messages, stop=stop, **kwargs):
+                chunks.append({"offset": time.perf_counter() - start, "message": message_to_dict(chunk)})
+                yield ChatGenerationChunk(message=chunk)
+            self.cassette.record_chat(key, STREAM, {"chunks": chunks})
+            return
+
+        kind, response = self.cassette.chat(key, STREAM)
+        for offset, chunk in self._replay_chunks(response, kind):
+            time.sleep(max(0.0, start + self._replay_delay(offset) - time.perf_counter()))
+            yield ChatGenerationChunk(message=chunk)
+
+    async def _astream(
+        self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        key = self.cassette.chat_key(messages, stop, kwargs)
+        start = time.perf_counter()
+        if self.underlying is not None:
+            chunks = []
+            async for chunk in self.underlying.astream(messages, stop=stop, **kwargs):
+                chunks.append({"offset": time.perf_counter() - start, "message": message_to_dict(chunk)})
+                yield ChatGenerationChunk(message=chunk)
+            # Only complete streams are recorded: a cancelled one never reaches this line
+            await run_in_executor(None, self.cassette.record_chat, key, STREAM, {"chunks": chunks})
+            return
+
+        kind, response = await run_in_executor(None, self.cassette.chat, key, STREAM)
+        for offset, chunk in self._replay_chunks(response, kind):
+            await asyncio.sleep(max(0.0, start + self._replay_delay(offset) - time.perf_counter()))
+            yield ChatGenerationChunk(message=chunk)
+
+
+class CassetteEmbeddings(Embeddings):
+    """Embeddings counterpart of `CassetteChatModel`: records per text, replays any batching."""
+
+    def __init__(self, cassette: Cassette, underlying: Optional[Embeddings] = None, symmetric: bool = False):
+        self.cassette = cassette
+        self.underlying = underlying
+        # Query embeddings equal document embeddings (see CachedEmbeddings), so share the recordings
+        self.query_kind = DOCUMENT if symmetric else QUERY
+
+    def _embed(self, kind: str, texts: List[str], call) -> List[List[float]]:
+        if self.underlying is not None:
+            start = time.perf_counter()
+            vectors = call(texts)
+            self.cassette.record_embeddings(kind, texts, vectors, time.perf_counter() - start)
+            return vectors
+        vectors, seconds = self.cassette.embeddings(kind, texts)
+        time.sleep(seconds * self.cassette.latency_scale)
+        return vectors
+
+    async def _aembed(self, kind: str, texts: List[str], call) -> List[List[float]]:
+        if self.underlying is not None:
+            start = time.perf_counter()
+            vectors = await call(texts)
+            await run_in_executor(
+                None, self.cassette.record_embeddings, kind, texts, vectors, time.perf_counter() - start
+            )
+            return vectors
+        vectors, seconds = await run_in_executor(None, self.cassette.embeddings, kind, texts)
+        await asyncio.sleep(seconds * self.cassette.latency_scale)
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(DOCUMENT, texts, lambda batch: self.underlying.embed_documents(batch))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(self.query_kind, [text], lambda batch: [self.underlying.embed_query(batch[0])])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self._aembed(DOCUMENT, texts, lambda batch: self.underlying.aembed_documents(batch))
+
+    async def aembed_query(self, text: str) -> List[float]:
+        async def call(batch):
+            return [await self.underlying.aembed_query(batch[0])]
+        return (await self._aembed(self.query_kind, [text], call))[0]
@@ -0,0 +1,142 @@
+import threading
+from typing import Any, Dict, Optional, Union
+
+import httpx
+
+from app.core.config import settings
+
+# HTTP/2 needs the optional `h2` package (pip install httpx[http2])
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+def http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.HTTP_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_POOL_MAX_KEEPALIVE,
+        keepalive_expiry=settings.HTTP_POOL_KEEPALIVE_EXPIRY,
+    )
+
+
+def use_http2() -> bool:
+    return settings.HTTP2_ENABLED and HTTP2_AVAILABLE
+
+
+# Reported instead of pool stats when httpx/httpcore internals are not where we expect
+UNAVAILABLE = "unavailable"
+
+
+def pool_stats(client: Any) -> Union[Dict, str, None]:
+    """
+    Connection counts of an httpx client's pool (None if the client was not created yet).
+    They are read from private httpcore internals, so any other httpx version, or a
+    custom transport, reports "unavailable" instead of failing the stats endpoint.
+    """
+    if client is None:
+        return None
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    connections = getattr(pool, "connections", None)
+    if connections is None:
+        return UNAVAILABLE
+    try:
+        connections = list(connections)
+        idle = sum(1 for connection in connections if connection.is_idle())
+        active = len(connections) - idle
+        return {
+            "connections": len(connections),
+            "active": active,
+            "idle": idle,
+            "http2": sum(1 for connection in connections if "HTTP/2" in connection.info()),
+            "queued_requests": sum(1 for request in list(getattr(pool, "_requests", [])) if request.is_queued()),
+            "utilization": round(active / settings.HTTP_POOL_MAX_CONNECTIONS, 3),
+        }
+    except (AttributeError, TypeError):
+        return UNAVAILABLE
+
+
+class ClientRegistry:
+    """
+    Process-wide network clients, created on first use and shared by every caller.
+
+    The OpenAI/Azure chat and embedding models share one keep-alive pool per
+    sync/async flavour, and every Qdrant call (vector store, ingestion, admin
+    endpoints) goes through one QdrantClient, over gRPC when QDRANT_PREFER_GRPC is set.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._qdrant = None
+        self._http: Optional[httpx.Client] = None
+        self._async_http: Optional[httpx.AsyncClient] = None
+
+    def qdrant(self):
+        with self._lock:
+            if self._qdrant is None:
+                # Imported on first use: qdrant_client is slow to import (cold starts)
+                from qdrant_client import QdrantClient
+
+                if settings.QDRANT_URL == ":memory:":
+                    self._qdrant = QdrantClient(location=":memory:")
+                else:
+                    # REST settings are still used by the few calls gRPC mode sends over HTTP
+                    self._qdrant = QdrantClient(
+                        url=settings.QDRANT_URL,
+                        api_key=settings.QDRANT_API_KEY if settings.QDRANT_API_KEY else None,
+                        prefer_grpc=settings.QDRANT_PREFER_GRPC,
+                        grpc_port=settings.QDRANT_GRPC_PORT,
+                        timeout=settings.QDRANT_TIMEOUT,
+                        limits=http_limits(),
+                        http2=use_http2(),
+                    )
+            return self._qdrant
+
+    def http_client(self) -> httpx.Client:
+        with self._lock:
+            if self._http is None:
+                self._http = httpx.Client(
+                    limits=http_limits(), http2=use_http2(), timeout=settings.HTTP_TIMEOUT
+                )
+            return self._http
+
+    def http_async_client(self) -> httpx.AsyncClient:
+        with self._lock:
+            if self._async_http is None:
+                self._async_http = httpx.AsyncClient(
+                    limits=http_limits(), http2=use_http2(), timeout=settings.HTTP_TIMEOUT
+                )
+            return self._async_http
+
+    def _qdrant_rest_client(self) -> Optional[httpx.Client]:
+        # Private qdrant_client internals: None when they moved (or for :memory:)
+        client = self._qdrant
+        for attribute in ("_client", "openapi_client", "client", "_client"):
+            client = getattr(client, attribute, None)
+        return client
+
+    def stats(self) -> Dict:
+        qdrant = None
+        if self._qdrant is not None:
+            rest_client = self._qdrant_rest_client()
+            qdrant = {
+                "transport": "grpc" if settings.QDRANT_PREFER_GRPC else "rest",
+                "rest_pool": pool_stats(rest_client) if rest_client is not None else UNAVAILABLE,
+            }
+        return {
+            "http2": use_http2(),
+            "limits": {
+                "max_connections": settings.HTTP_POOL_MAX_CONNECTIONS,
+                "max_keepalive_connections": settings.HTTP_POOL_MAX_KEEPALIVE,
+                "keepalive_expiry": settings.HTTP_POOL_KEEPALIVE_EXPIRY,
+            },
+            "providers": {
+                "sync_pool": pool_stats(self._http),
+                "async_pool": pool_stats(self._async_http),
+            },
+            "qdrant": qdrant,
+        }
+
+
+CLIENTS = ClientRegistry()
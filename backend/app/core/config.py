@@ -91,10 +91,166 @@ class Settings(BaseSettings):
     GOOGLE_API_KEY: Union[str, None] = None
     GEMINI_MODEL: str = "gemini-1.5-flash"
     
+    ## Fake provider (offline benchmarks and load tests - set USE_FAKE_PROVIDER=true to enable)
+    # Deterministic local stand-ins for the LLM and embeddings; no API calls
+    USE_FAKE_PROVIDER: bool = False
+    # Time to the first token, then per further token
+    FAKE_LLM_LATENCY_MS: float = 200.0
+    FAKE_LLM_TOKEN_LATENCY_MS: float = 5.0
+    FAKE_LLM_ANSWER_TOKENS: int = 40
+    # Per embeddings call (one batch)
+    FAKE_EMBEDDINGS_LATENCY_MS: float = 20.0
+    FAKE_EMBEDDINGS_DIM: int = 256
+    # Uniform ± jitter added to every fake latency, seeded on the input
+    FAKE_LATENCY_JITTER_MS: float = 0.0
+    FAKE_SEED: int = 0
+    
+    ## LLM routing
+    # Chat providers to route between, e.g. "openai,gemini" (empty: only the one selected
+    # above); each needs its own settings. Embeddings always use the selected provider.
+    LLM_PROVIDERS: Annotated[Union[List[str], str], BeforeValidator(parse_cors)] = []
+    # Send the same request to the next provider when the first is slower than its p95
+    LLM_HEDGE_ENABLED: bool = True
+    LLM_HEDGE_PERCENTILE: float = 95.0
+    # Hedge delay until a provider has LLM_ROUTER_MIN_SAMPLES latencies, and its floor
+    LLM_HEDGE_DEFAULT_DELAY_MS: float = 2000.0
+    LLM_HEDGE_MIN_DELAY_MS: float = 50.0
+    LLM_ROUTER_MIN_SAMPLES: int = 20
+    # Latencies kept per provider for the percentile, and the weight of a new sample
+    LLM_ROUTER_WINDOW: int = 200
+    LLM_ROUTER_EWMA_ALPHA: float = 0.2
+    # A provider's latency score is multiplied by (1 + this x its error-rate EWMA)
+    LLM_ROUTER_ERROR_PENALTY: float = 10.0
+    # A provider without traffic for this long gets the next call, to notice recovery
+    LLM_ROUTER_PROBE_INTERVAL_S: float = 30.0
+    
+    ## Provider cassette (reproducible performance runs)
+    # "record" saves every LLM/embeddings call (with streamed chunk timing) to the
+    # cassette; "replay" serves them from it without building or calling the provider
+    PROVIDER_CASSETTE_MODE: Literal["off", "record", "replay"] = "off"
+    PROVIDER_CASSETTE_PATH: str = "provider_cassette.sqlite"
+    # Replayed latency = recorded latency x this (0 measures only our own overhead)
+    PROVIDER_CASSETTE_LATENCY_SCALE: float = 1.0
+    
     ## Qdrant
     QDRANT_COLLECTION_NAME: str
     QDRANT_API_KEY: str
+    # ":memory:" runs Qdrant's local mode in-process (benchmarks, tests)
     QDRANT_URL: str
+    # Talk to Qdrant over gRPC (port QDRANT_GRPC_PORT) instead of REST
+    QDRANT_PREFER_GRPC: bool = False
+    QDRANT_GRPC_PORT: int = 6334
+    QDRANT_TIMEOUT: int = 30
+
+    ## Metrics
+    # Per-stage histograms, token and cache counters on /metrics, Server-Timing headers
+    METRICS_ENABLED: bool = True
+
+    ## Lambda
+    # Build models, vector store and connections during the Lambda INIT phase
+    LAMBDA_PRELOAD: bool = True
+    # Per-request timeout of the provider call that keeps its connection warm
+    WARMUP_TIMEOUT: float = 5.0
+
+    ## HTTP clients
+    # Keep-alive pool shared by the Qdrant REST client and the OpenAI/Azure models
+    HTTP_POOL_MAX_CONNECTIONS: int = 100
+    HTTP_POOL_MAX_KEEPALIVE: int = 20
+    HTTP_POOL_KEEPALIVE_EXPIRY: float = 30.0
+    HTTP_TIMEOUT: float = 60.0
+    # Negotiated over TLS when the `h2` package is installed
+    HTTP2_ENABLED: bool = True
+
+    ## Vector store
+    # "qdrant", or "numpy" for the in-process store (single node, small corpora, tests)
+    VECTOR_STORE_BACKEND: Literal["qdrant", "numpy"] = "qdrant"
+    # Directory holding the numpy store's vector matrix and payload log
+    NUMPY_VECTOR_STORE_PATH: str = "vector_store"
+
+    ## Concurrency
+    # Size of the thread pool used to offload blocking calls (e.g. vector store
+    # searches without a native async API) off the event loop.
+    BLOCKING_IO_MAX_WORKERS: int = 64
+
+    ## Ingestion
+    # Chunks split, embedded and upserted per window; bounds ingest memory
+    INGEST_WINDOW_CHUNKS: int = 256
+    # Characters read from an upload at a time
+    INGEST_READ_BLOCK_CHARS: int = 64 * 1024
+    # Chunks per embedding API call and how many calls run at once
+    INGEST_EMBED_BATCH_SIZE: int = 64
+    INGEST_EMBED_CONCURRENCY: int = 4
+    # Provider rate limit for embedding calls per minute (0 = unlimited)
+    INGEST_EMBED_MAX_RPM: int = 0
+    # Embedded batches waiting to be upserted before embedding pauses
+    INGEST_UPSERT_QUEUE_SIZE: int = 8
+    # Background ingest jobs: uploads are spooled here until the job finishes
+    INGEST_JOBS_DIR: str = "ingest_jobs"
+    INGEST_JOB_MAX_ATTEMPTS: int = 3
+    INGEST_JOB_PROGRESS_INTERVAL_SECONDS: float = 1.0
+    # A job whose worker sent no heartbeat for this long is taken over by another worker
+    INGEST_JOB_STALE_SECONDS: float = 120.0
+
+    ## Query expansion
+    # Parallel expansion mode: max wait for the expansion LLM call before answering without it
+    QUERY_EXPANSION_BUDGET_MS: int = 1500
+
+    ## Prompt size
+    # Max tokens of retrieved context in the answer prompt
+    PROMPT_CONTEXT_TOKEN_BUDGET: int = 3000
+    # LLM summarization is skipped when every context is shorter than this
+    SUMMARIZE_MIN_CONTEXT_TOKENS: int = 50
+
+    ## Context compression
+    # Extractive summarization keeps this share of each context's characters...
+    CONTEXT_COMPRESSION_RATIO: float = 0.5
+    # ...and at most this many
+    CONTEXT_COMPRESSION_MAX_CHARS: int = 600
+    # Embed chunk sentences at ingest so extractive summarization can rank them by similarity.
+    # Costs an extra embeddings call per ingest batch; without it sentences are ranked lexically.
+    CONTEXT_COMPRESSION_PRECOMPUTE: bool = False
+
+    ## Single-flight
+    # Identical concurrent queries share one retrieval/generation (and its token stream)
+    SINGLE_FLIGHT_ENABLED: bool = True
+
+    ## Streaming
+    # Token chunks are merged into one frame for up to this long (0 sends every chunk)
+    STREAM_COALESCE_WINDOW_MS: int = 30
+    # ...or until the frame holds this many characters
+    STREAM_COALESCE_MAX_BYTES: int = 1024
+
+    ## Chat websocket
+    # Generations running at once on one /chat/rag/ws connection
+    CHAT_WS_MAX_CONCURRENT: int = 4
+
+    ## Batch queries
+    QUERY_BATCH_MAX_SIZE: int = 1000
+    # Questions of one /query/batch call in the generation stage at once
+    QUERY_BATCH_CONCURRENCY: int = 8
+
+    ## Hybrid retrieval
+    # SQLite file backing the local BM25 index (None keeps it in memory only)
+    SPARSE_INDEX_PATH: Union[str, None] = "sparse_index.sqlite"
+    # k constant of reciprocal rank fusion
+    HYBRID_RRF_K: int = 60
+
+    ## Embedding cache
+    EMBEDDINGS_CACHE_ENABLED: bool = True
+    EMBEDDINGS_CACHE_MAX_ENTRIES: int = 10000
+    # In-memory vectors take 4 bytes per dimension (~6 KB at 1536): this caps their total
+    EMBEDDINGS_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    # SQLite file for persisted embeddings; point it at /tmp on read-only filesystems (Lambda)
+    EMBEDDINGS_CACHE_PATH: Union[str, None] = "embeddings_cache.sqlite"
+
+    ## Semantic answer cache
+    SEMANTIC_CACHE_ENABLED: bool = True
+    # Minimum cosine similarity between query embeddings for a cache hit
+    SEMANTIC_CACHE_THRESHOLD: float = 0.95
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 1024
+    SEMANTIC_CACHE_TTL_SECONDS: int = 60 * 60
+    # Optional SQLite file to persist cached answers across restarts
+    SEMANTIC_CACHE_PATH: Union[str, None] = None
 
 
 settings = Settings()  # type: ignore
@@ -0,0 +1,97 @@
+from typing import List, Optional
+
+import numpy as np
+
+from app.core.bot import EMBEDDINGS
+from app.core.embeddings import CachedEmbeddings
+from app.core.config import settings
+from app.core.sparse import tokenize
+from app.core.text import clean_text, split_sentences
+
+
+def chunk_sentences(texts: List[str]) -> List[str]:
+    """Unique sentences of stored chunks, split exactly as `compress_contexts` will split them."""
+    return list(dict.fromkeys(
+        sentence for text in texts for sentence in split_sentences(clean_text(text))
+    ))
+
+
+def precompute_sentence_embeddings() -> bool:
+    # Only worth it when the vectors land in the embedding cache for query time
+    return settings.CONTEXT_COMPRESSION_PRECOMPUTE and isinstance(EMBEDDINGS, CachedEmbeddings)
+
+
+def kept_chars(context: str, ratio: float, max_chars: int) -> int:
+    """Characters extractive compression keeps of `context`: a share of it, capped."""
+    return min(max_chars, int(len(context) * ratio))
+
+
+def lexical_scores(query: str, sentences: List[str]) -> np.ndarray:
+    """Share of the query's distinct terms each sentence contains."""
+    terms = set(tokenize(query))
+    if not terms:
+        return np.zeros(len(sentences), dtype=np.float32)
+    return np.asarray(
+        [len(terms.intersection(tokenize(sentence))) / len(terms) for sentence in sentences], dtype=np.float32
+    )
+
+
+async def sentence_scores(query: str, sentences: List[str], query_embedding: Optional[List[float]]) -> np.ndarray:
+    """
+    Cosine similarity to the query when every sentence vector was precomputed at ingest
+    (see `chunk_sentences`); otherwise lexical overlap, so no sentence is embedded live.
+    """
+    vectors = None
+    if isinstance(EMBEDDINGS, CachedEmbeddings):
+        vectors = await EMBEDDINGS.acached_documents(sentences)
+    if vectors is None:
+        return lexical_scores(query, sentences)
+
+    if query_embedding is None:
+        query_embedding = await EMBEDDINGS.aembed_query(query)
+    vectors = np.stack(vectors)
+    query_vector = np.asarray(query_embedding, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1) * (np.linalg.norm(query_vector) or 1.0)
+    return (vectors @ query_vector) / np.where(norms == 0, 1.0, norms)
+
+
+async def compress_contexts(
+    query: str,
+    contexts: List[str],
+    ratio: float,
+    max_chars: int,
+    query_embedding: Optional[List[float]] = None,
+) -> List[str]:
+    """
+    Extractive compression: keep the sentences of each context most relevant to the
+    query, up to `ratio` of its characters (at most `max_chars`), in their original order.
+
+    All sentences are scored at once by `sentence_scores`.
+    """
+    budgets = [kept_chars(context, ratio, max_chars) for context in contexts]
+    split = [split_sentences(context) if len(context) > budget else [] for context, budget in zip(contexts, budgets)]
+    sentences = [sentence for context_sentences in split for sentence in context_sentences]
+    if not sentences:
+        return contexts
+
+    scores = await sentence_scores(query, sentences, query_embedding)
+
+    compressed = []
+    offset = 0
+    for context, context_sentences, budget in zip(contexts, split, budgets):
+        context_scores = scores[offset:offset + len(context_sentences)]
+        offset += len(context_sentences)
+        if len(context_sentences) <= 1:
+            compressed.append(context)
+            continue
+
+        keep, used = [], 0
+        for i in np.argsort(-context_scores, kind="stable"):
+            length = len(context_sentences[i]) + 1
+            # Always keep the best sentence, then whatever still fits
+            if keep and used + length > budget:
+                continue
+            keep.append(int(i))
+            used += length
+        compressed.append(' '.join(context_sentences[i] for i in sorted(keep)))
+    return compressed
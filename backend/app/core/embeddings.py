@@ -0,0 +1,243 @@
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.runnables.config import run_in_executor
+
+logger = logging.getLogger(__name__)
+
+
+# Some providers (Gemini, Vertex) embed queries and documents with different task
+# types, so the two kinds are cached separately.
+QUERY = "query"
+DOCUMENT = "document"
+
+# SQLite limits the number of bound parameters per statement
+_SQLITE_BATCH = 500
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Memoizing wrapper around any LangChain `Embeddings`.
+
+    Vectors are keyed on (provider, model, kind, sha256(text)). Lookups go to an
+    in-memory LRU first, then to an optional SQLite store of float32 blobs, and only
+    the remaining texts are sent to the provider, in a single batched call.
+
+    The LRU holds float32 arrays (4 bytes per dimension plus about 250 bytes of
+    overhead per entry: ~6 KB for a 1536-dimensional vector) and is bounded by both
+    `max_entries` and `max_bytes`; vectors become lists only when returned.
+    """
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        provider: str,
+        model: str,
+        max_entries: int = 10000,
+        max_bytes: int = 64 * 1024 * 1024,
+        path: Optional[str] = None,
+        symmetric: bool = False,
+    ):
+        self.underlying = underlying
+        # Query embeddings equal document embeddings, so query batches may use embed_documents
+        self.symmetric = symmetric
+        self.provider = provider
+        self.model = model
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.api_calls = 0
+
+        self._lock = threading.RLock()
+        self._memory: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._memory_bytes = 0
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            self._open(path)
+
+    def _open(self, path: str) -> None:
+        try:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embedding_cache ("
+                "provider TEXT NOT NULL, model TEXT NOT NULL, kind TEXT NOT NULL, "
+                "text_hash TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (provider, model, kind, text_hash))"
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            # e.g. read-only filesystem on Lambda; keep working in memory only
+            logger.warning("Embedding cache persistence disabled (%s): %s", path, e)
+            self._db = None
+
+    @staticmethod
+    def text_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _get_many(self, kind: str, hashes: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        with self._lock:
+            for text_hash in hashes:
+                key = (kind, text_hash)
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[text_hash] = self._memory[key]
+            self.memory_hits += len(found)
+
+            remaining = [h for h in hashes if h not in found]
+            if self._db is None or not remaining:
+                return found
+
+            for start in range(0, len(remaining), _SQLITE_BATCH):
+                batch = remaining[start:start + _SQLITE_BATCH]
+                rows = self._db.execute(
+                    "SELECT text_hash, vector FROM embedding_cache "
+                    "WHERE provider = ? AND model = ? AND kind = ? "
+                    f"AND text_hash IN ({','.join('?' * len(batch))})",
+                    (self.provider, self.model, kind, *batch),
+                ).fetchall()
+                for text_hash, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    found[text_hash] = vector
+                    self._remember(kind, text_hash, vector)
+                    self.disk_hits += 1
+        return found
+
+    def _remember(self, kind: str, text_hash: str, vector: np.ndarray) -> None:
+        key = (kind, text_hash)
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= previous.nbytes
+        self._memory[key] = vector
+        self._memory_bytes += vector.nbytes
+        while self._memory and (len(self._memory) > self.max_entries or self._memory_bytes > self.max_bytes):
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted.nbytes
+
+    def _put_many(self, kind: str, vectors: Dict[str, np.ndarray]) -> None:
+        with self._lock:
+            for text_hash, vector in vectors.items():
+                self._remember(kind, text_hash, vector)
+            if self._db is not None and vectors:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embedding_cache "
+                    "(provider, model, kind, text_hash, vector) VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (self.provider, self.model, kind, text_hash, vector.tobytes())
+                        for text_hash, vector in vectors.items()
+                    ],
+                )
+                self._db.commit()
+
+    def _plan(self, kind: str, texts: List[str]) -> Tuple[List[str], Dict[str, np.ndarray], Dict[str, str]]:
+        """Hash the texts, resolve cached vectors and collect the unique misses."""
+        hashes = [self.text_hash(text) for text in texts]
+        found = self._get_many(kind, list(dict.fromkeys(hashes)))
+        missing = {}
+        for text_hash, text in zip(hashes, texts):
+            if text_hash not in found:
+                missing.setdefault(text_hash, text)
+        return hashes, found, missing
+
+    def _finish(
+        self, kind: str, hashes: List[str], found: Dict[str, np.ndarray],
+        missing: Dict[str, str], vectors: List[List[float]],
+    ) -> List[List[float]]:
+        # Round through float32 so fresh, memory and disk hits return identical vectors
+        new = {
+            text_hash: np.asarray(vector, dtype=np.float32)
+            for text_hash, vector in zip(missing.keys(), vectors)
+        }
+        self._put_many(kind, new)
+        found.update(new)
+        return [found[text_hash].tolist() for text_hash in hashes]
+
+    def _embed(self, kind: str, texts: List[str], call: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        hashes, found, missing = self._plan(kind, texts)
+        vectors = []
+        if missing:
+            self.misses += len(missing)
+            self.api_calls += 1
+            vectors = call(list(missing.values()))
+        return self._finish(kind, hashes, found, missing, vectors)
+
+    async def _aembed(
+        self, kind: str, texts: List[str], call: Callable[[List[str]], Awaitable[List[List[float]]]]
+    ) -> List[List[float]]:
+        if self._db is None:
+            hashes, found, missing = self._plan(kind, texts)
+        else:
+            hashes, found, missing = await run_in_executor(None, self._plan, kind, texts)
+        vectors = []
+        if missing:
+            self.misses += len(missing)
+            self.api_calls += 1
+            vectors = await call(list(missing.values()))
+        if self._db is None or not missing:
+            return self._finish(kind, hashes, found, missing, vectors)
+        return await run_in_executor(None, self._finish, kind, hashes, found, missing, vectors)
+
+    async def acached_documents(self, texts: List[str]) -> Optional[List[np.ndarray]]:
+        """Cached document vectors of `texts`, or None if any is missing; never calls the provider."""
+        hashes = [self.text_hash(text) for text in texts]
+        unique = list(dict.fromkeys(hashes))
+        if self._db is None:
+            found = self._get_many(DOCUMENT, unique)
+        else:
+            found = await run_in_executor(None, self._get_many, DOCUMENT, unique)
+        if len(found) < len(unique):
+            return None
+        return [found[text_hash] for text_hash in hashes]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(DOCUMENT, texts, self.underlying.embed_documents)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(QUERY, [text], lambda batch: [self.underlying.embed_query(batch[0])])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self._aembed(DOCUMENT, texts, self.underlying.aembed_documents)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        async def call(batch: List[str]) -> List[List[float]]:
+            return [await self.underlying.aembed_query(batch[0])]
+
+        return (await self._aembed(QUERY, [text], call))[0]
+
+    async def aembed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embed many queries; uncached ones go out in one call when the model is symmetric."""
+        async def call(batch: List[str]) -> List[List[float]]:
+            if self.symmetric:
+                return await self.underlying.aembed_documents(batch)
+            return list(await asyncio.gather(*(self.underlying.aembed_query(text) for text in batch)))
+
+        return await self._aembed(QUERY, texts, call)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "provider": self.provider,
+                "model": self.model,
+                "memory_entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "memory_bytes": self._memory_bytes,
+                "max_bytes": self.max_bytes,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "api_calls": self.api_calls,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "persistent": self._db is not None,
+            }
@@ -0,0 +1,166 @@
+import asyncio
+import hashlib
+import math
+import random
+import re
+import time
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+_WORD = re.compile(r"\w+")
+
+
+class FakeProviderError(Exception):
+    """A failure injected by `FakeChatModel.error_rate`."""
+
+
+def _rng(seed: int, *parts: str) -> random.Random:
+    # Seeded from the input, so the same request always gets the same answer and delays
+    digest = hashlib.sha256("\x00".join([str(seed), *parts]).encode("utf-8")).digest()
+    return random.Random(digest)
+
+
+def _delay_seconds(rng: random.Random, latency_ms: float, jitter_ms: float) -> float:
+    return max(0.0, latency_ms + rng.uniform(-jitter_ms, jitter_ms)) / 1000
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic stand-in for a chat model, for load tests and offline benchmarks.
+
+    The answer is `answer_tokens` words drawn from the prompt with a generator
+    seeded on the prompt. The first token arrives after `latency_ms` (± `jitter_ms`)
+    and every further token after `token_latency_ms`, in both the blocking and the
+    streaming APIs. Token usage is reported like a real provider's. A `slow_rate`
+    share of calls take `slow_ms` longer to start and an `error_rate` share fail,
+    to exercise tail latency and failover.
+    """
+
+    latency_ms: float = 200.0
+    token_latency_ms: float = 5.0
+    jitter_ms: float = 0.0
+    answer_tokens: int = 40
+    seed: int = 0
+    slow_rate: float = 0.0
+    slow_ms: float = 0.0
+    error_rate: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def _plan(self, messages: List[BaseMessage]):
+        prompt = "\n".join(str(message.content) for message in messages)
+        rng = _rng(self.seed, prompt)
+        words = _WORD.findall(prompt) or ["answer"]
+        tokens = [rng.choice(words) for _ in range(self.answer_tokens)]
+        usage = {
+            "input_tokens": len(words),
+            "output_tokens": len(tokens),
+            "total_tokens": len(words) + len(tokens),
+        }
+        first = _delay_seconds(rng, self.latency_ms, self.jitter_ms)
+        if rng.random() < self.slow_rate:
+            first += self.slow_ms / 1000
+        fails = rng.random() < self.error_rate
+        return tokens, usage, first, self.token_latency_ms / 1000, fails
+
+    def _generate(
+        self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any
+    ) -> ChatResult:
+        tokens, usage, first, per_token, fails = self._plan(messages)
+        time.sleep(first + per_token * max(0, len(tokens) - 1))
+        if fails:
+            raise FakeProviderError("Fake provider error")
+        message = AIMessage(content=" ".join(tokens), usage_metadata=usage)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any
+    ) -> ChatResult:
+        tokens, usage, first, per_token, fails = self._plan(messages)
+        await asyncio.sleep(first + per_token * max(0, len(tokens) - 1))
+        if fails:
+            raise FakeProviderError("Fake provider error")
+        message = AIMessage(content=" ".join(tokens), usage_metadata=usage)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _chunks(self, tokens: List[str], usage: dict) -> Iterator[ChatGenerationChunk]:
+        for index, token in enumerate(tokens):
+            last = index == len(tokens) - 1
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content=token if last else token + " ",
+                usage_metadata=usage if last else None,
+            ))
+
+    def _stream(
+        self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any
+    ) -> Iterator[ChatGenerationChunk]:
+        tokens, usage, first, per_token, fails = self._plan(messages)
+        time.sleep(first)
+        if fails:
+            raise FakeProviderError("Fake provider error")
+        for index, chunk in enumerate(self._chunks(tokens, usage)):
+            if index:
+                time.sleep(per_token)
+            yield chunk
+
+    async def _astream(
+        self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        tokens, usage, first, per_token, fails = self._plan(messages)
+        await asyncio.sleep(first)
+        if fails:
+            raise FakeProviderError("Fake provider error")
+        for index, chunk in enumerate(self._chunks(tokens, usage)):
+            if index:
+                await asyncio.sleep(per_token)
+            yield chunk
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Deterministic stand-in for an embeddings model: a unit-normalized bag of hashed
+    words, so texts sharing words are close and retrieval still returns related
+    chunks. Every call (one per batch, like a provider request) takes `latency_ms`
+    (± `jitter_ms`).
+    """
+
+    def __init__(self, dim: int = 256, latency_ms: float = 20.0, jitter_ms: float = 0.0, seed: int = 0):
+        self.dim = dim
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.seed = seed
+
+    def _vector(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        for word in _WORD.findall(text.lower()):
+            digest = hashlib.blake2b(f"{self.seed}:{word}".encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dim
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(value * value for value in vector))
+        if not norm:
+            # No words: an arbitrary but fixed direction
+            vector[0], norm = 1.0, 1.0
+        return [value / norm for value in vector]
+
+    def _delay(self, texts: List[str]) -> float:
+        return _delay_seconds(_rng(self.seed, *texts), self.latency_ms, self.jitter_ms)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self._delay(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(self._delay(texts))
+        return [self._vector(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
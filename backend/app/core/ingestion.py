@@ -0,0 +1,412 @@
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import re
+import time
+import uuid
+from dataclasses import dataclass
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Set, TextIO
+
+from langchain_core.documents import Document
+from langchain_core.runnables.config import run_in_executor
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from app.core.bot import EMBEDDINGS, existing_point_ids, iter_stored_chunks, upsert_embedded
+from app.core.config import settings
+from app.core.context import chunk_sentences, precompute_sentence_embeddings
+from app.core.metrics import record_request, record_timings
+from app.core.sparse import SPARSE_INDEX
+from app.core.text import token_metadata
+
+
+# Fixed namespace so the same chunk text always maps to the same point ID
+CHUNK_ID_NAMESPACE = uuid.UUID("6f1c3c8e-5b7a-4d0e-9a43-2f8d1e4b7c21")
+
+# Separators optimized for medical text
+SPLIT_SEPARATORS = ["\n\n", "\n", ". ", "? ", "! ", "; ", ", ", " ", ""]
+
+_JSON_SKIP = re.compile(r"[\s,]*")
+_JSON_DELIMITER = re.compile(r"\s*[,\]]")
+
+
+@dataclass
+class IngestResult:
+    new: int = 0
+    skipped: int = 0
+    windows: int = 0
+    batches: int = 0
+    # Per-stage seconds. Embed and upsert stages overlap, so they can add up to
+    # more than the wall-clock time.
+    parse_seconds: float = 0.0
+    dedupe_seconds: float = 0.0
+    embed_seconds: float = 0.0
+    upsert_seconds: float = 0.0
+    # Time embedding batches spent blocked on a full upsert queue
+    backpressure_seconds: float = 0.0
+    wall_seconds: float = 0.0
+
+    @property
+    def total(self) -> int:
+        return self.new + self.skipped
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.total / self.wall_seconds if self.wall_seconds else 0.0
+
+    def stats(self) -> Dict:
+        return {
+            "windows": self.windows,
+            "embedding_batches": self.batches,
+            "chunks_per_second": round(self.chunks_per_second, 2),
+            "timings": {
+                "parse_split": round(self.parse_seconds, 4),
+                "dedupe": round(self.dedupe_seconds, 4),
+                "embed": round(self.embed_seconds, 4),
+                "upsert": round(self.upsert_seconds, 4),
+                "backpressure": round(self.backpressure_seconds, 4),
+                "wall": round(self.wall_seconds, 4),
+            },
+        }
+
+
+class RateLimiter:
+    """Spaces out calls so at most `per_minute` start in any minute (0 disables it)."""
+
+    def __init__(self, per_minute: int):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+def chunk_id(doc: Document) -> str:
+    """
+    Deterministic Qdrant point ID (UUID) derived from the chunk's source, record
+    position (the `index` of CSV/JSON rows and uploaded texts) and content hash.
+    Identical text from different sources or records stays a separate point; only
+    a repeat of the same text at the same place is deduplicated.
+    """
+    content_hash = hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+    seed = json.dumps([doc.metadata.get("source"), doc.metadata.get("index"), content_hash], default=str)
+    return str(uuid.uuid5(CHUNK_ID_NAMESPACE, seed))
+
+
+def make_text_splitter(chunk_size: int, chunk_overlap: int) -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        separators=SPLIT_SEPARATORS,
+        keep_separator=True,  # Keep punctuation for context
+    )
+
+
+def new_chunks(documents: List[Document], in_flight: Set[str]) -> Dict[str, Document]:
+    """
+    Map chunk IDs (see `chunk_id`) to chunks that are not stored yet.
+    Existing IDs are checked before embedding, so unchanged chunks cost nothing.
+    Chunks already queued by this run (`in_flight`) are skipped too.
+    """
+    unique: Dict[str, Document] = {}
+    for doc in documents:
+        point_id = chunk_id(doc)
+        if point_id not in in_flight:
+            unique.setdefault(point_id, doc)
+
+    existing = existing_point_ids(list(unique))
+    new = {point_id: doc for point_id, doc in unique.items() if point_id not in existing}
+    # Token counts go into the payload so the query path never tokenizes
+    for doc in new.values():
+        doc.metadata.update(token_metadata(doc.page_content))
+    return new
+
+
+def store_chunks(ids: List[str], documents: List[Document], vectors: List[List[float]]) -> None:
+    """Upsert embedded chunks and add them to the BM25 index used by hybrid retrieval."""
+    upsert_embedded(ids, documents, vectors)
+    SPARSE_INDEX.add(ids, [doc.page_content for doc in documents])
+
+
+def rebuild_sparse_index(batch_size: int = 256) -> int:
+    """Index every chunk already in the collection (e.g. ingested before BM25 existed)."""
+    added = 0
+    batch = []
+    for item in iter_stored_chunks(batch_size):
+        batch.append(item)
+        if len(batch) >= batch_size:
+            added += SPARSE_INDEX.add(*zip(*batch))
+            batch = []
+    if batch:
+        added += SPARSE_INDEX.add(*zip(*batch))
+    return added
+
+
+def record_to_document(record, idx: int, source: str, fallback: Callable[[dict], str]) -> Document:
+    """Turn one CSV row / JSON object into a Document, preferring content/text/QA fields."""
+    if not isinstance(record, dict):
+        text = record if isinstance(record, str) else json.dumps(record)
+        return Document(page_content=text, metadata={"source": source, "index": idx})
+
+    # Try to find a content field or fall back to the whole record
+    if 'content' in record:
+        text = record['content']
+    elif 'text' in record:
+        text = record['text']
+    elif 'question' in record and 'answer' in record:
+        text = f"Question: {record['question']}\nAnswer: {record['answer']}"
+    else:
+        text = fallback(record)
+
+    metadata = {k: v for k, v in record.items() if k not in ['content', 'text']}
+    metadata['source'] = source
+    metadata['index'] = idx
+    return Document(page_content=text, metadata=metadata)
+
+
+def iter_txt_documents(stream: TextIO, source: str, block_chars: int) -> Iterator[Document]:
+    """Yield the text in blocks of roughly `block_chars`, cut at paragraph or line boundaries."""
+    buffer = ""
+    while True:
+        block = stream.read(block_chars)
+        buffer += block
+        if not block:
+            if buffer:
+                yield Document(page_content=buffer, metadata={"source": source})
+            return
+        if len(buffer) >= block_chars:
+            cut = buffer.rfind("\n\n")
+            if cut <= 0:
+                cut = buffer.rfind("\n")
+            if cut <= 0:
+                cut = len(buffer)
+            yield Document(page_content=buffer[:cut], metadata={"source": source})
+            buffer = buffer[cut:]
+
+
+def iter_csv_documents(stream: TextIO, source: str) -> Iterator[Document]:
+    def combine_fields(row: dict) -> str:
+        return '\n'.join([f"{k}: {v}" for k, v in row.items()])
+
+    for idx, row in enumerate(csv.DictReader(stream)):
+        yield record_to_document(row, idx, source, combine_fields)
+
+
+def _json_truncated(error: json.JSONDecodeError, length: int) -> bool:
+    """Whether decoding may have failed only because the buffer ends mid-element."""
+    # Strings report where they start; other errors where decoding stopped, which for a
+    # truncated element is at most a literal or escape (e.g. -Infinity, \uXXXX) before the end
+    return error.msg.startswith("Unterminated string") or length - error.pos <= 10
+
+
+def iter_json_documents(stream: TextIO, source: str, block_chars: int) -> Iterator[Document]:
+    """
+    Lazily yield the elements of a top-level JSON array, decoding one element at a time.
+    A top-level object is treated as a single record. A malformed element raises as soon
+    as it is read, not once the rest of the file was buffered.
+    """
+    decoder = json.JSONDecoder()
+    buffer = stream.read(block_chars).lstrip()
+
+    if not buffer.startswith('['):
+        # Single object: nothing to stream
+        data = json.loads(buffer + stream.read())
+        items = [data] if isinstance(data, dict) else data
+        for idx, item in enumerate(items):
+            yield record_to_document(item, idx, source, json.dumps)
+        return
+
+    pos = 1
+    idx = 0
+    eof = False
+    while True:
+        pos = _JSON_SKIP.match(buffer, pos).end()
+        if pos == len(buffer):
+            if eof:
+                raise json.JSONDecodeError("Unterminated array", buffer, pos)
+            buffer = stream.read(block_chars)
+            eof = not buffer
+            pos = 0
+            continue
+        if buffer[pos] == ']':
+            return
+
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError as e:
+            if eof or not _json_truncated(e, len(buffer)):
+                raise
+            end = None
+        # So may a number near its end ("3" of "3.25"): take it once the delimiter after it was read
+        if end is None or (not eof and len(buffer) - end <= 10 and not _JSON_DELIMITER.match(buffer, end)):
+            more = stream.read(block_chars)
+            eof = not more
+            buffer = buffer[pos:] + more
+            pos = 0
+            continue
+
+        yield record_to_document(item, idx, source, json.dumps)
+        idx += 1
+        pos = end
+        if pos >= block_chars:
+            # Drop the consumed prefix so the buffer stays bounded
+            buffer = buffer[pos:]
+            pos = 0
+
+
+def iter_file_documents(file: BinaryIO, extension: str, source: str, block_chars: Optional[int] = None) -> Iterator[Document]:
+    """Parse an uploaded TXT/JSON/CSV file lazily, without reading it into memory."""
+    block_chars = block_chars or settings.INGEST_READ_BLOCK_CHARS
+    # newline='' leaves line endings untouched, which is also what csv expects
+    stream = io.TextIOWrapper(file, encoding="utf-8", newline="")
+    try:
+        if extension == 'txt':
+            yield from iter_txt_documents(stream, source, block_chars)
+        elif extension == 'json':
+            yield from iter_json_documents(stream, source, block_chars)
+        elif extension == 'csv':
+            yield from iter_csv_documents(stream, source)
+        else:
+            raise ValueError(f"Unsupported file format: {extension}")
+    finally:
+        # Don't let the wrapper close the caller's file when it is garbage collected
+        stream.detach()
+
+
+async def ingest_documents(
+    documents: Iterator[Document],
+    text_splitter: RecursiveCharacterTextSplitter,
+    window_size: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    concurrency: Optional[int] = None,
+    on_progress: Optional[Callable[[IngestResult], None]] = None,
+    result: Optional[IngestResult] = None,
+) -> IngestResult:
+    """
+    Split, embed and upsert documents as a pipeline.
+
+    - parse/split: documents are split in windows of `window_size` chunks in the
+      blocking executor, so only a window of chunks is held at a time.
+    - dedupe: chunks whose IDs (source, position, content) already exist are skipped; new
+      ones get their token counts added to the payload.
+    - embed: new chunks are grouped into batches of `batch_size` and up to
+      `concurrency` batches are embedded at once, spaced by INGEST_EMBED_MAX_RPM.
+      With CONTEXT_COMPRESSION_PRECOMPUTE their sentences are embedded too, for
+      extractive context compression.
+    - upsert: a worker writes embedded batches to the vector store while the next
+      batches embed. Its queue is bounded, so embedding waits (backpressure) when
+      the vector store falls behind.
+
+    Counters go to `result` if given, so a caller still sees what was stored
+    when the pipeline fails part way.
+    """
+    window_size = window_size or settings.INGEST_WINDOW_CHUNKS
+    batch_size = batch_size or settings.INGEST_EMBED_BATCH_SIZE
+    concurrency = concurrency or settings.INGEST_EMBED_CONCURRENCY
+
+    result = result if result is not None else IngestResult()
+    started = time.perf_counter()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=settings.INGEST_UPSERT_QUEUE_SIZE)
+    semaphore = asyncio.Semaphore(concurrency)
+    limiter = RateLimiter(settings.INGEST_EMBED_MAX_RPM)
+    in_flight: Set[str] = set()
+    precompute_sentences = precompute_sentence_embeddings()
+
+    def next_window() -> List[Document]:
+        chunks = []
+        for doc in documents:
+            chunks.extend(text_splitter.split_documents([doc]))
+            if len(chunks) >= window_size:
+                break
+        return chunks
+
+    async def embed_batch(ids: List[str], docs: List[Document]) -> None:
+        async with semaphore:
+            await limiter.acquire()
+            start = time.perf_counter()
+            vectors = await EMBEDDINGS.aembed_documents([doc.page_content for doc in docs])
+            if precompute_sentences:
+                # Warm the embedding cache for extractive context compression
+                await limiter.acquire()
+                await EMBEDDINGS.aembed_documents(chunk_sentences([doc.page_content for doc in docs]))
+            result.embed_seconds += time.perf_counter() - start
+        start = time.perf_counter()
+        await queue.put((ids, docs, vectors))
+        result.backpressure_seconds += time.perf_counter() - start
+
+    async def upsert_worker() -> None:
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            ids, docs, vectors = item
+            start = time.perf_counter()
+            await run_in_executor(None, store_chunks, ids, docs, vectors)
+            result.upsert_seconds += time.perf_counter() - start
+            result.new += len(ids)
+            in_flight.difference_update(ids)
+            if on_progress is not None:
+                result.wall_seconds = time.perf_counter() - started
+                on_progress(result)
+
+    upserter = asyncio.create_task(upsert_worker())
+    pending: Set[asyncio.Task] = set()
+
+    async def wait_pending(limit: int) -> None:
+        # Wait until at most `limit` batches are pending, surfacing upsert failures early
+        nonlocal pending
+        while len(pending) > limit:
+            done, pending = await asyncio.wait(pending | {upserter}, return_when=asyncio.FIRST_COMPLETED)
+            pending.discard(upserter)
+            for task in done:
+                task.result()
+
+    try:
+        while True:
+            start = time.perf_counter()
+            chunks = await run_in_executor(None, next_window)
+            result.parse_seconds += time.perf_counter() - start
+            if not chunks:
+                break
+            result.windows += 1
+
+            start = time.perf_counter()
+            new = await run_in_executor(None, new_chunks, chunks, in_flight)
+            result.dedupe_seconds += time.perf_counter() - start
+            result.skipped += len(chunks) - len(new)
+            in_flight.update(new)
+
+            ids, docs = list(new.keys()), list(new.values())
+            for offset in range(0, len(ids), batch_size):
+                pending.add(asyncio.create_task(
+                    embed_batch(ids[offset:offset + batch_size], docs[offset:offset + batch_size])
+                ))
+                result.batches += 1
+                # Don't parse further ahead than the embedding stage can absorb
+                await wait_pending(concurrency * 2)
+
+        await wait_pending(0)
+        # Tell the upserter to stop once the queue drains (also guarded against its failure)
+        pending.add(asyncio.create_task(queue.put(None)))
+        await wait_pending(0)
+        await upserter
+    finally:
+        for task in pending | {upserter}:
+            task.cancel()
+
+    result.wall_seconds = time.perf_counter() - started
+    record_timings("ingest", result.stats()["timings"])
+    record_request("ingest")
+    if on_progress is not None:
+        on_progress(result)
+    return result
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from typing import Optional
+
+from langchain_core.runnables.config import run_in_executor
+from sqlmodel import Session
+
+from app.controllers.ingest_jobs import (
+    claim_ingest_job, get_ingest_job, get_stale_ingest_jobs, update_claimed_ingest_job
+)
+from app.core.cache import SEMANTIC_CACHE
+from app.core.config import settings
+from app.core.db import engine
+from app.core.ingestion import IngestResult, ingest_documents, iter_file_documents, make_text_splitter
+from app.core.metrics import record_error
+from app.core.scheduler import aio_scheduler
+from app.models.ingest import (
+    IngestJob, INGEST_JOB_COMPLETED, INGEST_JOB_FAILED, INGEST_JOB_PENDING, INGEST_JOB_RUNNING
+)
+
+logger = logging.getLogger(__name__)
+
+# Identifies this process as the owner of the jobs it claims
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def schedule_ingest_job(job_id: uuid.UUID) -> None:
+    """Run the ingest job on the app's AsyncIOScheduler as soon as possible."""
+    aio_scheduler.add_job(
+        run_ingest_job,
+        args=[job_id],
+        id=f"ingest-{job_id}",
+        replace_existing=True,
+        misfire_grace_time=None,
+    )
+
+
+def _stale_before() -> datetime:
+    return datetime.now(timezone.utc) - timedelta(seconds=settings.INGEST_JOB_STALE_SECONDS)
+
+
+def _update(job_id: uuid.UUID, **fields) -> bool:
+    """Update a job this worker runs; False if another worker took it over."""
+    with Session(engine) as session:
+        return update_claimed_ingest_job(session=session, job_id=job_id, owner=WORKER_ID, **fields)
+
+
+def _start(job_id: uuid.UUID) -> Optional[IngestJob]:
+    """Claim the job for this worker; None if it is finished or another worker runs it."""
+    with Session(engine) as session:
+        job = get_ingest_job(session=session, job_id=job_id)
+        if not job or job.status not in (INGEST_JOB_PENDING, INGEST_JOB_RUNNING):
+            return None
+        now = datetime.now(timezone.utc)
+        if job.attempts >= settings.INGEST_JOB_MAX_ATTEMPTS:
+            claim_ingest_job(
+                session=session, job_id=job_id, owner=WORKER_ID, stale_before=_stale_before(),
+                status=INGEST_JOB_FAILED, error=f"Gave up after {job.attempts} attempts", finished_at=now,
+            )
+            return None
+        # Counters restart on resume; chunks stored by a previous attempt show up as skipped
+        claimed = claim_ingest_job(
+            session=session, job_id=job_id, owner=WORKER_ID, stale_before=_stale_before(),
+            status=INGEST_JOB_RUNNING, attempts=IngestJob.attempts + 1, started_at=now, heartbeat_at=now,
+            error=None, bytes_processed=0, chunks_new=0, chunks_skipped=0,
+        )
+        if not claimed:
+            return None
+        session.refresh(job)
+        return job
+
+
+async def _heartbeat(job_id: uuid.UUID) -> None:
+    while True:
+        await asyncio.sleep(settings.INGEST_JOB_STALE_SECONDS / 4)
+        if not await run_in_executor(None, _update, job_id, heartbeat_at=datetime.now(timezone.utc)):
+            logger.warning("Ingest job %s was taken over by another worker", job_id)
+            return
+
+
+def _progress_fields(result: IngestResult) -> dict:
+    return {
+        "chunks_new": result.new,
+        "chunks_skipped": result.skipped,
+        "chunks_per_second": result.chunks_per_second,
+        "stats": result.stats(),
+    }
+
+
+async def run_ingest_job(job_id: uuid.UUID) -> None:
+    job = await run_in_executor(None, _start, job_id)
+    if job is None:
+        return
+
+    loop = asyncio.get_running_loop()
+    last_saved = 0.0
+    saving: Optional[asyncio.Future] = None
+    result = IngestResult()
+    heartbeat = asyncio.ensure_future(_heartbeat(job_id))
+
+    try:
+        with open(job.file_path, "rb") as raw:
+            def on_progress(result: IngestResult) -> None:
+                # Throttle DB writes and don't wait for them, so the pipeline isn't slowed down
+                nonlocal last_saved, saving
+                now = time.monotonic()
+                if now - last_saved < settings.INGEST_JOB_PROGRESS_INTERVAL_SECONDS or (saving and not saving.done()):
+                    return
+                last_saved = now
+                saving = loop.run_in_executor(
+                    None, partial(_update, job_id, bytes_processed=raw.tell(), **_progress_fields(result))
+                )
+
+            documents = iter_file_documents(raw, job.file_type, job.filename)
+            text_splitter = make_text_splitter(job.chunk_size, job.chunk_overlap)
+            await ingest_documents(
+                documents, text_splitter,
+                batch_size=job.embed_batch_size,
+                concurrency=job.embed_concurrency,
+                on_progress=on_progress,
+                result=result,
+            )
+    except Exception as e:
+        logger.exception("Ingest job %s failed: %s", job_id, e)
+        record_error("ingest")
+        if saving:
+            await asyncio.wait([saving])
+        await run_in_executor(
+            None, _update, job_id,
+            status=INGEST_JOB_FAILED, error=str(e)[:2048], finished_at=datetime.now(timezone.utc),
+            **_progress_fields(result),
+        )
+        _remove_upload(job.file_path)
+        return
+    finally:
+        heartbeat.cancel()
+        if result.new:
+            # Cached answers may be stale now that the collection changed, even partly
+            SEMANTIC_CACHE.invalidate()
+
+    if saving:
+        # Don't let a late progress write overwrite the final counters
+        await asyncio.wait([saving])
+    await run_in_executor(
+        None, _update, job_id,
+        status=INGEST_JOB_COMPLETED, bytes_processed=job.bytes_total,
+        finished_at=datetime.now(timezone.utc), **_progress_fields(result),
+    )
+    _remove_upload(job.file_path)
+
+
+def _remove_upload(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def resume_ingest_jobs() -> int:
+    """
+    Reschedule jobs left behind by a process that died: pending or running without a
+    heartbeat for INGEST_JOB_STALE_SECONDS. Workers racing for a job are settled by
+    `claim_ingest_job`, so only one of them runs it.
+    """
+    try:
+        with Session(engine) as session:
+            jobs = get_stale_ingest_jobs(session=session, stale_before=_stale_before())
+    except Exception as e:
+        # e.g. migrations not applied yet
+        logger.exception("Could not resume ingest jobs: %s", e)
+        return 0
+
+    for job in jobs:
+        schedule_ingest_job(job.id)
+    return len(jobs)
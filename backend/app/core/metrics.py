@@ -0,0 +1,275 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Seconds; covers a cached lookup (ms) up to a long generation
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    """Monotonic counter per label combination."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [
+            f"{self.name}_total{_labels(self.labelnames, map(_escape, labels))} {value}"
+            for labels, value in values
+        ]
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram per label combination.
+
+    Observing is a bisect and three additions under a lock; cumulative bucket
+    counts are only computed when the metrics are rendered.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # labels -> [per-bucket counts (last one is +Inf), sum, count]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = [(labels, list(series[0]), series[1], series[2]) for labels, series in self._values.items()]
+        lines = []
+        for labels, counts, total, count in values:
+            labels = [_escape(label) for label in labels]
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Metrics in the Prometheus text format.
+
+    Hot-path metrics are updated in place; collectors (cache hit rates and similar
+    state that already lives elsewhere) are only called when /metrics is scraped.
+    """
+
+    def __init__(self):
+        self._metrics: List[Any] = []
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]) -> None:
+        """`collector()` yields (name, type, help, [(name, labels, value)]) families at scrape time."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                logger.exception("Metrics collector failed: %s", e)
+                continue
+            for name, kind, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for sample_name, labels, value in samples:
+                    label_values = [_escape(value) for value in labels.values()]
+                    lines.append(f"{sample_name}{_labels(list(labels), label_values)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "rag_stage_seconds", "Duration of each RAG pipeline stage.", ("pipeline", "stage")
+))
+TIME_TO_FIRST_TOKEN = REGISTRY.register(Histogram(
+    "rag_time_to_first_token_seconds", "Time from request start to the first generated token.", ("pipeline",)
+))
+TOKENS = REGISTRY.register(Counter(
+    "rag_tokens", "Tokens of packed context, prompts and completions.", ("pipeline", "kind")
+))
+REQUESTS = REGISTRY.register(Counter(
+    "rag_requests", "Finished RAG requests by outcome (ok, cache_hit, error).", ("pipeline", "outcome")
+))
+
+
+def record_timings(pipeline: str, timings: Dict[str, float]) -> None:
+    """Observe the per-stage seconds of one request; `first_token` goes to the TTFT histogram."""
+    if not settings.METRICS_ENABLED:
+        return
+    for stage, seconds in timings.items():
+        if stage == "first_token":
+            TIME_TO_FIRST_TOKEN.observe(seconds, pipeline)
+        else:
+            STAGE_SECONDS.observe(seconds, pipeline, stage)
+
+
+def record_tokens(pipeline: str, context: Optional[int] = None, usage: Optional[Dict] = None) -> None:
+    """Count packed context tokens and, when the provider reports them, prompt/completion tokens."""
+    if not settings.METRICS_ENABLED:
+        return
+    if context:
+        TOKENS.inc(context, pipeline, "context")
+    if usage:
+        TOKENS.inc(usage.get("input_tokens", 0), pipeline, "prompt")
+        TOKENS.inc(usage.get("output_tokens", 0), pipeline, "completion")
+
+
+def record_request(pipeline: str, outcome: str = "ok") -> None:
+    if settings.METRICS_ENABLED:
+        REQUESTS.inc(1, pipeline, outcome)
+
+
+def record_error(pipeline: str) -> None:
+    if settings.METRICS_ENABLED:
+        REQUESTS.inc(1, pipeline, "error")
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    """`Server-Timing` header value (durations in ms) for the given stage timings."""
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
+
+
+async def timed_stream(
+    chunks: AsyncIterator[Any], pipeline: str, timings: Dict[str, float], start: float
+) -> AsyncIterator[Any]:
+    """
+    Pass LLM message chunks through, recording time to first token and generation time
+    (plus token usage if the provider sends it) once the stream ends.
+    """
+    generate_start = time.perf_counter()
+    usage = None
+    try:
+        async for chunk in chunks:
+            if "first_token" not in timings:
+                timings["first_token"] = time.perf_counter() - start
+            usage = getattr(chunk, "usage_metadata", None) or usage
+            yield chunk
+    except Exception:
+        record_error(pipeline)
+        raise
+    else:
+        record_request(pipeline)
+    finally:
+        timings["generate"] = time.perf_counter() - generate_start
+        timings["total"] = time.perf_counter() - start
+        record_timings(pipeline, timings)
+        record_tokens(pipeline, usage=usage)
+
+
+def collect_caches():
+    # Imported here: these modules import the bot, which imports this module
+    from app.core.cache import SEMANTIC_CACHE
+    from app.core.embeddings import CachedEmbeddings
+    from app.core.providers import PROVIDERS
+    from app.core.singleflight import SINGLE_FLIGHT
+
+    hits, misses = [], []
+    semantic = SEMANTIC_CACHE.stats()
+    hits.append(("rag_cache_hits_total", {"cache": "semantic"}, semantic["hits"]))
+    misses.append(("rag_cache_misses_total", {"cache": "semantic"}, semantic["misses"]))
+    # Only if already built: a scrape must not load the provider
+    embeddings = PROVIDERS.loaded_embeddings
+    if isinstance(embeddings, CachedEmbeddings):
+        cached = embeddings.stats()
+        hits.append(("rag_cache_hits_total", {"cache": "embeddings"}, cached["memory_hits"] + cached["disk_hits"]))
+        misses.append(("rag_cache_misses_total", {"cache": "embeddings"}, cached["misses"]))
+    yield "rag_cache_hits", "counter", "Cache hits.", hits
+    yield "rag_cache_misses", "counter", "Cache misses.", misses
+
+    flights = SINGLE_FLIGHT.stats()
+    yield "rag_single_flight_shared", "counter", "Requests that joined an identical in-flight computation.", [
+        ("rag_single_flight_shared_total", {}, flights["shared"]),
+    ]
+
+
+def collect_router():
+    from app.core.providers import PROVIDERS
+
+    router = PROVIDERS.router
+    if router is None:
+        return
+    stats = router.stats()
+    latency, errors, outcomes = [], [], []
+    for provider, kinds in stats["providers"].items():
+        for kind, health in kinds.items():
+            labels = {"provider": provider, "kind": kind}
+            if health["latency_ewma_ms"] is not None:
+                latency.append(("rag_llm_latency_ewma_seconds", labels, health["latency_ewma_ms"] / 1000))
+            errors.append(("rag_llm_error_rate", labels, health["error_rate"]))
+            for outcome in ("wins", "errors", "cancelled"):
+                outcomes.append(("rag_llm_calls_total", {**labels, "outcome": outcome}, health[outcome]))
+    yield "rag_llm_latency_ewma_seconds", "gauge", "Latency EWMA per LLM provider (stream: first chunk).", latency
+    yield "rag_llm_error_rate", "gauge", "Error-rate EWMA per LLM provider.", errors
+    yield "rag_llm_calls", "counter", "Routed LLM calls per provider by outcome.", outcomes
+    yield "rag_llm_routing", "counter", "Hedged requests sent, hedges that won, and failovers.", [
+        ("rag_llm_routing_total", {"event": "hedge_sent"}, stats["hedges"]),
+        ("rag_llm_routing_total", {"event": "hedge_won"}, stats["hedge_wins"]),
+        ("rag_llm_routing_total", {"event": "failover"}, stats["failovers"]),
+    ]
+
+
+REGISTRY.add_collector(collect_caches)
+REGISTRY.add_collector(collect_router)
@@ -0,0 +1,288 @@
+import threading
+import time
+from typing import Any, Callable, Dict
+
+from app.core.config import settings
+from app.core.embeddings import CachedEmbeddings
+
+
+def selected_provider() -> str:
+    """Provider picked by the settings: fake, gemini, vertex, azure or openai (the default)."""
+    if settings.USE_FAKE_PROVIDER:
+        return "fake"
+    if settings.USE_GEMINI_API and settings.GOOGLE_API_KEY:
+        return "gemini"
+    if settings.USE_GOOGLE_VERTEX and settings.GOOGLE_CLOUD_PROJECT:
+        return "vertex"
+    if settings.USE_AZURE and settings.AZURE_OPENAI_API_KEY:
+        return "azure"
+    return "openai"
+
+
+EMBEDDINGS_MODELS = {
+    "gemini": lambda: "models/embedding-001",
+    "vertex": lambda: settings.GOOGLE_VERTEX_EMBEDDING_MODEL,
+    "azure": lambda: str(settings.AZURE_OPENAI_EMBEDDING_DEPLOYMENT),
+    "openai": lambda: settings.OPENAI_EMBEDDINGS_NAME or "text-embedding-3-small",
+    "fake": lambda: f"fake-{settings.FAKE_EMBEDDINGS_DIM}",
+}
+
+
+def _import_gemini():
+    try:
+        import langchain_google_genai
+    except ImportError:
+        raise ImportError("langchain-google-genai is not installed. Run: pip install langchain-google-genai")
+    return langchain_google_genai
+
+
+def _import_vertex():
+    try:
+        import langchain_google_vertexai
+    except ImportError:
+        raise ImportError("langchain-google-vertexai is not installed. Run: pip install langchain-google-vertexai")
+    return langchain_google_vertexai
+
+
+def _openai_http_clients() -> Dict[str, Any]:
+    from app.core.clients import CLIENTS
+    return {"http_client": CLIENTS.http_client(), "http_async_client": CLIENTS.http_async_client()}
+
+
+def _gemini_llm():
+    print("🌟 Using Google Gemini API")
+    return _import_gemini().ChatGoogleGenerativeAI(
+        model=settings.GEMINI_MODEL,
+        google_api_key=settings.GOOGLE_API_KEY,
+    )
+
+
+def _vertex_llm():
+    print("🟡 Using Google Vertex AI")
+    return _import_vertex().ChatVertexAI(
+        model=settings.GOOGLE_VERTEX_MODEL,
+        project=settings.GOOGLE_CLOUD_PROJECT,
+        location=settings.GOOGLE_CLOUD_LOCATION,
+    )
+
+
+def _azure_llm():
+    from langchain_openai import AzureChatOpenAI
+    print("🔵 Using Azure OpenAI")
+    return AzureChatOpenAI(
+        azure_deployment=settings.AZURE_OPENAI_DEPLOYMENT_NAME,
+        azure_endpoint=settings.AZURE_OPENAI_ENDPOINT,
+        api_key=settings.AZURE_OPENAI_API_KEY,
+        api_version=settings.AZURE_OPENAI_API_VERSION,
+        **_openai_http_clients(),
+    )
+
+
+def _openai_llm():
+    from langchain.chat_models import init_chat_model
+    print("🟢 Using OpenAI")
+    return init_chat_model(
+        settings.OPENAI_MODEL_NAME or "gpt-4o-mini",
+        model_provider="openai",
+        api_key=settings.OPENAI_API_KEY,
+        **_openai_http_clients(),
+    )
+
+
+def _fake_llm():
+    from app.core.fakes import FakeChatModel
+    print("⚪ Using the fake provider")
+    return FakeChatModel(
+        latency_ms=settings.FAKE_LLM_LATENCY_MS,
+        token_latency_ms=settings.FAKE_LLM_TOKEN_LATENCY_MS,
+        jitter_ms=settings.FAKE_LATENCY_JITTER_MS,
+        answer_tokens=settings.FAKE_LLM_ANSWER_TOKENS,
+        seed=settings.FAKE_SEED,
+    )
+
+
+def _gemini_embeddings():
+    print("🌟 Using Google Gemini Embeddings")
+    return _import_gemini().GoogleGenerativeAIEmbeddings(
+        model=EMBEDDINGS_MODELS["gemini"](),
+        google_api_key=settings.GOOGLE_API_KEY,
+    )
+
+
+def _vertex_embeddings():
+    return _import_vertex().VertexAIEmbeddings(
+        model_name=EMBEDDINGS_MODELS["vertex"](),
+        project=settings.GOOGLE_CLOUD_PROJECT,
+        location=settings.GOOGLE_CLOUD_LOCATION,
+    )
+
+
+def _azure_embeddings():
+    from langchain_openai import AzureOpenAIEmbeddings
+    return AzureOpenAIEmbeddings(
+        azure_deployment=settings.AZURE_OPENAI_EMBEDDING_DEPLOYMENT,
+        azure_endpoint=settings.AZURE_OPENAI_ENDPOINT,
+        api_key=settings.AZURE_OPENAI_API_KEY,
+        api_version=settings.AZURE_OPENAI_API_VERSION,
+        **_openai_http_clients(),
+    )
+
+
+def _openai_embeddings():
+    from langchain_openai import OpenAIEmbeddings
+    return OpenAIEmbeddings(
+        model=EMBEDDINGS_MODELS["openai"](),
+        api_key=settings.OPENAI_API_KEY,
+        **_openai_http_clients(),
+    )
+
+
+def _fake_embeddings():
+    from app.core.fakes import FakeEmbeddings
+    return FakeEmbeddings(
+        dim=settings.FAKE_EMBEDDINGS_DIM,
+        latency_ms=settings.FAKE_EMBEDDINGS_LATENCY_MS,
+        jitter_ms=settings.FAKE_LATENCY_JITTER_MS,
+        seed=settings.FAKE_SEED,
+    )
+
+
+LLM_BUILDERS: Dict[str, Callable[[], Any]] = {
+    "gemini": _gemini_llm,
+    "vertex": _vertex_llm,
+    "azure": _azure_llm,
+    "openai": _openai_llm,
+    "fake": _fake_llm,
+}
+
+EMBEDDINGS_BUILDERS: Dict[str, Callable[[], Any]] = {
+    "gemini": _gemini_embeddings,
+    "vertex": _vertex_embeddings,
+    "azure": _azure_embeddings,
+    "openai": _openai_embeddings,
+    "fake": _fake_embeddings,
+}
+
+
+class ProviderRegistry:
+    """
+    Chat and embedding models of one provider, imported and built on first use.
+
+    Only the selected provider's LangChain integration is ever imported, and not
+    before a request needs it, which keeps it off the (Lambda) cold-start path.
+    With several LLM_PROVIDERS the chat model is a `HedgedChatModel` over all of them.
+    """
+
+    def __init__(self, provider: str):
+        self.provider = provider
+        self.embeddings_model = EMBEDDINGS_MODELS[provider]()
+        # OpenAI models embed queries and documents identically, so a batch of queries
+        # can be sent as one embed_documents call; Google models use per-kind task types.
+        self.symmetric_embeddings = provider in ("openai", "azure", "fake")
+        self._lock = threading.Lock()
+        self._llm = None
+        self._embeddings = None
+        self._cassette = None
+        self.router = None
+        self.load_seconds: Dict[str, float] = {}
+
+    def llm(self):
+        if self._llm is None:
+            with self._lock:
+                if self._llm is None:
+                    start = time.perf_counter()
+                    self._llm = self._recorded(self._build_llm, "llm")
+                    self.load_seconds["llm"] = time.perf_counter() - start
+        return self._llm
+
+    def embeddings(self):
+        if self._embeddings is None:
+            with self._lock:
+                if self._embeddings is None:
+                    start = time.perf_counter()
+                    embeddings = self._recorded(EMBEDDINGS_BUILDERS[self.provider], "embeddings")
+                    # Memoize embeddings so repeated queries and re-ingested chunks skip the provider.
+                    # Not with a cassette: cache hits would never be recorded, and replay would skip
+                    # the recorded latency.
+                    if settings.EMBEDDINGS_CACHE_ENABLED and settings.PROVIDER_CASSETTE_MODE == "off":
+                        embeddings = CachedEmbeddings(
+                            embeddings,
+                            provider=self.provider,
+                            model=self.embeddings_model,
+                            symmetric=self.symmetric_embeddings,
+                            max_entries=settings.EMBEDDINGS_CACHE_MAX_ENTRIES,
+                            max_bytes=settings.EMBEDDINGS_CACHE_MAX_BYTES,
+                            path=settings.EMBEDDINGS_CACHE_PATH,
+                        )
+                    self._embeddings = embeddings
+                    self.load_seconds["embeddings"] = time.perf_counter() - start
+        return self._embeddings
+
+    def _build_llm(self):
+        providers = list(dict.fromkeys(name for name in settings.LLM_PROVIDERS if name))
+        if len(providers) < 2:
+            return LLM_BUILDERS[providers[0] if providers else self.provider]()
+        unknown = [name for name in providers if name not in LLM_BUILDERS]
+        if unknown:
+            raise ValueError(f"Unknown LLM_PROVIDERS {unknown}; choose from {list(LLM_BUILDERS)}")
+        from app.core.router import HedgedChatModel
+        print(f"🔀 Routing LLM calls across {', '.join(providers)}")
+        self.router = HedgedChatModel(
+            models={name: LLM_BUILDERS[name]() for name in providers},
+            hedge=settings.LLM_HEDGE_ENABLED,
+            hedge_percentile=settings.LLM_HEDGE_PERCENTILE,
+            default_delay=settings.LLM_HEDGE_DEFAULT_DELAY_MS / 1000,
+            min_delay=settings.LLM_HEDGE_MIN_DELAY_MS / 1000,
+            min_samples=settings.LLM_ROUTER_MIN_SAMPLES,
+            error_penalty=settings.LLM_ROUTER_ERROR_PENALTY,
+            alpha=settings.LLM_ROUTER_EWMA_ALPHA,
+            window=settings.LLM_ROUTER_WINDOW,
+            probe_interval=settings.LLM_ROUTER_PROBE_INTERVAL_S,
+        )
+        return self.router
+
+    def _recorded(self, build: Callable[[], Any], kind: str):
+        """Build a model, wrapped for PROVIDER_CASSETTE_MODE (replay builds no provider model at all)."""
+        mode = settings.PROVIDER_CASSETTE_MODE
+        if mode == "off":
+            return build()
+        from app.core.cassette import Cassette, CassetteChatModel, CassetteEmbeddings
+        if self._cassette is None:
+            self._cassette = Cassette(
+                settings.PROVIDER_CASSETTE_PATH,
+                model=f"{self.provider}:{self.embeddings_model}",
+                latency_scale=settings.PROVIDER_CASSETTE_LATENCY_SCALE,
+            )
+            print(f"📼 Provider calls: {mode} ({settings.PROVIDER_CASSETTE_PATH})")
+        underlying = build() if mode == "record" else None
+        if kind == "llm":
+            return CassetteChatModel(cassette=self._cassette, underlying=underlying)
+        return CassetteEmbeddings(self._cassette, underlying, symmetric=self.symmetric_embeddings)
+
+    @property
+    def loaded_embeddings(self):
+        """The embeddings if already built, without building them."""
+        return self._embeddings
+
+    def stats(self) -> Dict:
+        return {
+            "provider": self.provider,
+            "llm_loaded": self._llm is not None,
+            "embeddings_loaded": self._embeddings is not None,
+            "load_seconds": dict(self.load_seconds),
+            "cassette": self._cassette.stats() if self._cassette is not None else None,
+            "router": self.router.stats() if self.router is not None else None,
+        }
+
+
+class ProviderAccessor:
+    """Stands in for the model `factory` returns, building it on first attribute access."""
+
+    def __init__(self, factory: Callable[[], Any]):
+        object.__setattr__(self, "_factory", factory)
+
+    def __getattribute__(self, name):
+        return getattr(object.__getattribute__(self, "_factory")(), name)
+
+
+PROVIDERS = ProviderRegistry(selected_provider())
@@ -0,0 +1,35 @@
+from typing import List
+
+import numpy as np
+
+
+def maximal_marginal_relevance(
+    query: np.ndarray, candidates: np.ndarray, k: int, lambda_mult: float = 0.5
+) -> List[int]:
+    """
+    Greedy MMR over a candidate matrix; returns the indices of up to `k` rows.
+
+    Each step picks the candidate maximizing
+    `lambda_mult * sim(query, c) - (1 - lambda_mult) * max(sim(c, selected))`,
+    so 1.0 ranks by relevance only and 0.0 by diversity only. Similarity to the
+    selected set is kept as a running maximum, one matrix-vector product per step.
+    """
+    candidates = np.asarray(candidates, dtype=np.float32)
+    if candidates.ndim != 2 or not len(candidates) or k <= 0:
+        return []
+    norms = np.linalg.norm(candidates, axis=1, keepdims=True)
+    candidates = candidates / np.where(norms == 0, 1.0, norms)
+    query = np.asarray(query, dtype=np.float32)
+    query = query / (np.linalg.norm(query) or 1.0)
+
+    relevance = candidates @ query
+    selected = [int(np.argmax(relevance))]
+    max_similarity = candidates @ candidates[selected[0]]
+
+    for _ in range(min(k, len(candidates)) - 1):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        np.maximum(max_similarity, candidates @ candidates[best], out=max_similarity)
+    return selected
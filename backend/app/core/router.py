@@ -0,0 +1,337 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+logger = logging.getLogger(__name__)
+
+# Latency is tracked separately for complete answers and for time to first streamed chunk
+GENERATE = "generate"
+STREAM = "stream"
+
+
+class ProviderHealth:
+    """Latency EWMA, recent latencies (for percentiles) and error-rate EWMA of one provider and call kind."""
+
+    def __init__(self, alpha: float = 0.2, window: int = 200):
+        self.alpha = alpha
+        self.latency_ewma: Optional[float] = None
+        self.last_seen: Optional[float] = None
+        self.error_rate = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.wins = 0
+        self.cancelled = 0
+        self._latencies: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def _observe(self, seconds: float, cap: Optional[float] = None) -> None:
+        self._latencies.append(seconds)
+        # The EWMA ranks providers; with hedging, anything slower than the hedge delay
+        # costs about the delay, so one stall doesn't demote a provider for many calls
+        sample = min(seconds, cap) if cap is not None else seconds
+        self.latency_ewma = sample if self.latency_ewma is None else (
+            self.alpha * sample + (1 - self.alpha) * self.latency_ewma
+        )
+        self.last_seen = time.monotonic()
+
+    def success(self, seconds: float, cap: Optional[float] = None) -> None:
+        with self._lock:
+            self.requests += 1
+            self._observe(seconds, cap)
+            self.error_rate *= 1 - self.alpha
+
+    def failure(self) -> None:
+        with self._lock:
+            self.requests += 1
+            self.errors += 1
+            self.error_rate = self.alpha + (1 - self.alpha) * self.error_rate
+            self.last_seen = time.monotonic()
+
+    def lost(self, seconds: float, cap: Optional[float] = None) -> None:
+        """A call cancelled after losing a race: it would have taken at least `seconds`."""
+        with self._lock:
+            self.requests += 1
+            self.cancelled += 1
+            # A lower bound only tells us something if it is above the current estimate
+            if self.latency_ewma is None or seconds > self.latency_ewma:
+                self._observe(seconds, cap)
+
+    def due_for_probe(self, interval: float, claim: bool = True) -> bool:
+        """
+        Whether a provider that got no traffic for `interval` seconds should get the next
+        call, so one that was demoted can be seen to recover. Claims the probe unless
+        `claim` is False.
+        """
+        with self._lock:
+            if self.last_seen is None or time.monotonic() - self.last_seen < interval:
+                return False
+            if claim:
+                self.last_seen = time.monotonic()
+            return True
+
+    @property
+    def samples(self) -> int:
+        return len(self._latencies)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        with self._lock:
+            ordered = sorted(self._latencies)
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+    def score(self, error_penalty: float) -> Optional[float]:
+        """Expected latency, inflated by the recent error rate (None until a latency was seen)."""
+        if self.latency_ewma is None:
+            return None
+        return self.latency_ewma * (1 + error_penalty * self.error_rate)
+
+    def stats(self) -> Dict:
+        p95 = self.percentile(95)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "wins": self.wins,
+            "cancelled": self.cancelled,
+            "error_rate": round(self.error_rate, 4),
+            "latency_ewma_ms": round(self.latency_ewma * 1000, 1) if self.latency_ewma is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+
+class HedgedChatModel(BaseChatModel):
+    """
+    Chat model routing each call across several providers' chat models.
+
+    Providers are ranked by latency EWMA, inflated by their error-rate EWMA; those
+    without samples yet come after, in configured order, and one that got no traffic
+    for `probe_interval` seconds is tried first once. A call goes to the best one;
+    if it has not answered (or, for streams, sent its first chunk) within its p95 for
+    that kind of call, the same request is sent to the next provider and whichever
+    answers first wins, the other being cancelled. A failing provider fails over to
+    the next one. Once a stream has started it stays on its provider.
+
+    The blocking `invoke`/`stream` APIs only fail over; hedging needs the async ones.
+    """
+
+    models: Dict[str, Any]
+    hedge: bool = True
+    hedge_percentile: float = 95.0
+    # Before a provider has `min_samples` latencies its hedge delay is `default_delay`
+    default_delay: float = 2.0
+    min_delay: float = 0.05
+    min_samples: int = 20
+    error_penalty: float = 10.0
+    alpha: float = 0.2
+    window: int = 200
+    probe_interval: float = 30.0
+
+    _health: Dict[Tuple[str, str], ProviderHealth] = PrivateAttr(default_factory=dict)
+    _counters: Dict[str, int] = PrivateAttr(default_factory=lambda: {"hedges": 0, "hedge_wins": 0, "failovers": 0})
+
+    def model_post_init(self, __context: Any) -> None:
+        super().model_post_init(__context)
+        self._health = {
+            (name, kind): ProviderHealth(self.alpha, self.window) for name in self.models for kind in (GENERATE, STREAM)
+        }
+
+    @property
+    def _llm_type(self) -> str:
+        return "hedged"
+
+    def health(self, name: str, kind: str) -> ProviderHealth:
+        return self._health[(name, kind)]
+
+    def ranked(self, kind: str, probe: bool = True) -> List[str]:
+        """
+        Providers in the order the next call tries them. With `probe` False (for
+        reporting) a provider due for a probe is still shown first but keeps its probe.
+        """
+        def key(indexed):
+            index, name = indexed
+            health = self.health(name, kind)
+            score = health.score(self.error_penalty)
+            return (score is None, score if score is not None else health.error_rate, index)
+        ranking = [name for _, name in sorted(enumerate(self.models), key=key)]
+        for name in ranking[1:]:
+            if self.health(name, kind).due_for_probe(self.probe_interval, claim=probe):
+                ranking.remove(name)
+                return [name, *ranking]
+        return ranking
+
+    def _cap(self, name: str, kind: str) -> Optional[float]:
+        return self.hedge_delay(name, kind) if self.hedge else None
+
+    def hedge_delay(self, name: str, kind: str) -> float:
+        health = self.health(name, kind)
+        if health.samples < self.min_samples:
+            return self.default_delay
+        return max(self.min_delay, health.percentile(self.hedge_percentile))
+
+    async def _race(self, kind: str, start_call) -> Tuple[str, Any, Any]:
+        """
+        Run `start_call(name)` (returning an awaitable) on the ranked providers, hedged
+        and with failover. Returns (winner, its result, its context); losers are cancelled.
+        """
+        candidates = iter(self.ranked(kind))
+        pending: Dict[asyncio.Future, Tuple[str, float, Any]] = {}
+        hedged = False
+        last_error: Optional[BaseException] = None
+
+        def launch() -> bool:
+            name = next(candidates, None)
+            if name is None:
+                return False
+            awaitable, context = start_call(name)
+            pending[asyncio.ensure_future(awaitable)] = (name, time.perf_counter(), context)
+            return True
+
+        launch()
+        primary = next(iter(pending.values()))
+        try:
+            while pending:
+                timeout = None
+                if self.hedge and not hedged and len(pending) == 1:
+                    name, started, _ = next(iter(pending.values()))
+                    timeout = max(0.0, started + self.hedge_delay(name, kind) - time.perf_counter())
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    if launch():
+                        self._counters["hedges"] += 1
+                    continue
+
+                winner = None
+                for task in done:
+                    name, started, context = pending.pop(task)
+                    health = self.health(name, kind)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        logger.warning("LLM provider %s failed: %s", name, e)
+                        health.failure()
+                        last_error = e
+                        continue
+                    if winner is None:
+                        health.success(time.perf_counter() - started, self._cap(name, kind))
+                        health.wins += 1
+                        winner = (name, result, context)
+                    else:
+                        # Finished in the same instant as the winner: count it, drop it
+                        health.success(time.perf_counter() - started, self._cap(name, kind))
+                        await _close(context)
+                if winner is not None:
+                    if winner[0] != primary[0]:
+                        self._counters["hedge_wins" if hedged else "failovers"] += 1
+                    return winner
+                if not pending:
+                    # Everything in flight failed: fail over to the next provider
+                    if not launch():
+                        break
+        finally:
+            for task, (name, started, context) in pending.items():
+                task.cancel()
+                self.health(name, kind).lost(time.perf_counter() - started, self._cap(name, kind))
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+                for _, _, context in pending.values():
+                    await _close(context)
+        raise last_error or RuntimeError("No LLM provider configured")
+
+    def _failover(self, kind: str, call):
+        """Blocking calls: try the ranked providers one after the other."""
+        last_error: Optional[BaseException] = None
+        for attempt, name in enumerate(self.ranked(kind)):
+            health = self.health(name, kind)
+            start = time.perf_counter()
+            try:
+                result = call(self.models[name])
+            except Exception as e:
+                logger.warning("LLM provider %s failed: %s", name, e)
+                health.failure()
+                last_error = e
+                continue
+            health.success(time.perf_counter() - start)
+            health.wins += 1
+            if attempt:
+                self._counters["failovers"] += 1
+            return result
+        raise last_error or RuntimeError("No LLM provider configured")
+
+    def _generate(
+        self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any
+    ) -> ChatResult:
+        message = self._failover(GENERATE, lambda model: model.invoke(messages, stop=stop, **kwargs))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any
+    ) -> ChatResult:
+        _, message, _ = await self._race(
+            GENERATE, lambda name: (self.models[name].ainvoke(messages, stop=stop, **kwargs), None)
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any
+    ) -> Iterator[ChatGenerationChunk]:
+        def first_chunk(model):
+            chunks = iter(model.stream(messages, stop=stop, **kwargs))
+            return next(chunks, None), chunks
+
+        first, chunks = self._failover(STREAM, first_chunk)
+        if first is None:
+            return
+        yield ChatGenerationChunk(message=first)
+        for chunk in chunks:
+            yield ChatGenerationChunk(message=chunk)
+
+    async def _astream(
+        self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        def start_stream(name: str):
+            chunks = self.models[name].astream(messages, stop=stop, **kwargs)
+            return _first(chunks), chunks
+
+        # The race is to the first chunk; the rest of the stream comes from the winner
+        _, first, chunks = await self._race(STREAM, start_stream)
+        try:
+            if first is None:
+                return
+            yield ChatGenerationChunk(message=first)
+            async for chunk in chunks:
+                yield ChatGenerationChunk(message=chunk)
+        finally:
+            await chunks.aclose()
+
+    def stats(self) -> Dict:
+        return {
+            **self._counters,
+            "ranking": self.ranked(GENERATE, probe=False),
+            "providers": {
+                name: {kind: self.health(name, kind).stats() for kind in (GENERATE, STREAM)} for name in self.models
+            },
+        }
+
+
+async def _first(chunks: AsyncIterator[Any]) -> Any:
+    """First chunk of a stream (None if it is empty)."""
+    async for chunk in chunks:
+        return chunk
+    return None
+
+
+async def _close(chunks: Optional[AsyncIterator[Any]]) -> None:
+    if chunks is not None:
+        try:
+            await chunks.aclose()
+        except Exception:
+            pass
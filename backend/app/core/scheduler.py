@@ -1,3 +1,5 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
@@ -9,8 +11,32 @@ from app.core.config import settings
 aio_scheduler = AsyncIOScheduler(timezone=timezone(settings.TIME_ZONE))
 
 
+def configure_blocking_executor() -> ThreadPoolExecutor:
+    # LangChain's async fallbacks (e.g. QdrantVectorStore.asimilarity_search_with_score)
+    # run the sync implementation in the loop's default executor, so bound it here.
+    executor = ThreadPoolExecutor(
+        max_workers=settings.BLOCKING_IO_MAX_WORKERS,
+        thread_name_prefix="blocking-io",
+    )
+    asyncio.get_running_loop().set_default_executor(executor)
+    return executor
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    executor = configure_blocking_executor()
     aio_scheduler.start()
+    # Imported here to avoid a circular import (jobs schedules onto aio_scheduler)
+    from app.core.jobs import resume_ingest_jobs
+    from app.core.warmup import in_lambda
+    # Mangum runs the lifespan on every invocation, and a frozen Lambda can't run jobs
+    # in the background: only long-running workers pick up abandoned jobs
+    if not in_lambda():
+        resume_ingest_jobs()
+        aio_scheduler.add_job(
+            resume_ingest_jobs, "interval", seconds=settings.INGEST_JOB_STALE_SECONDS,
+            id="resume-ingest-jobs", replace_existing=True,
+        )
     yield
     aio_scheduler.shutdown()
+    executor.shutdown(wait=False)
@@ -0,0 +1,153 @@
+import asyncio
+import json
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple, TypeVar
+
+from app.core.config import settings
+
+
+T = TypeVar("T")
+
+
+def flight_key(scope: str, query: str, params: Optional[Dict] = None) -> Tuple[str, str, str]:
+    """Key of a request: endpoint, query with case and whitespace normalized, and its other parameters."""
+    return scope, " ".join(query.split()).casefold(), json.dumps(params or {}, sort_keys=True, default=str)
+
+
+class _Call:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class _SharedStream:
+    """
+    One producer task draining `source`, any number of subscribers reading along.
+
+    Chunks are kept until the stream ends, so a subscriber that joins late first
+    replays what it missed. The producer is cancelled when its last subscriber leaves.
+    """
+
+    def __init__(self, source: AsyncIterator[Any], on_close: Callable[[], None]):
+        self.chunks: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self._on_close = on_close
+        self._changed = asyncio.Event()
+        self.task = asyncio.create_task(self._pump(source))
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _pump(self, source: AsyncIterator[Any]) -> None:
+        try:
+            async for chunk in source:
+                self.chunks.append(chunk)
+                self._notify()
+        except asyncio.CancelledError:
+            self.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._on_close()
+            self._notify()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        self.subscribers += 1
+        position = 0
+        try:
+            while True:
+                if position < len(self.chunks):
+                    position += 1
+                    yield self.chunks[position - 1]
+                    continue
+                if self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                await self._changed.wait()
+        finally:
+            self.subscribers -= 1
+            if not self.subscribers and not self.done:
+                # Nobody is reading anymore; newcomers start a fresh stream
+                self._on_close()
+                self.task.cancel()
+
+
+class SingleFlight:
+    """
+    Coalesce identical concurrent requests into one computation.
+
+    `do` runs one awaitable per key and hands its result (or exception) to every
+    caller that arrives while it is in flight. `stream` does the same for async
+    iterators and fans each chunk out to all subscribers. Nothing is kept once the
+    computation finishes; repeated questions are the semantic cache's job.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._streams: Dict[Hashable, _SharedStream] = {}
+        self.executed = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[T]]) -> T:
+        if not settings.SINGLE_FLIGHT_ENABLED:
+            return await factory()
+
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(factory()))
+            self._calls[key] = call
+
+            def forget(_: asyncio.Future) -> None:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+
+            call.task.add_done_callback(forget)
+            self.executed += 1
+        else:
+            self.shared += 1
+
+        call.waiters += 1
+        try:
+            # One caller giving up must not cancel the work for the others
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if not call.waiters and not call.task.done():
+                call.task.cancel()
+
+    async def stream(self, key: Hashable, factory: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        if not settings.SINGLE_FLIGHT_ENABLED:
+            async for chunk in factory():
+                yield chunk
+            return
+
+        shared = self._streams.get(key)
+        if shared is None:
+            def close() -> None:
+                if self._streams.get(key) is shared:
+                    del self._streams[key]
+
+            shared = _SharedStream(factory(), close)
+            self._streams[key] = shared
+            self.executed += 1
+        else:
+            self.shared += 1
+
+        async for chunk in shared.subscribe():
+            yield chunk
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": settings.SINGLE_FLIGHT_ENABLED,
+            "in_flight": len(self._calls) + len(self._streams),
+            "executed": self.executed,
+            "shared": self.shared,
+        }
+
+
+SINGLE_FLIGHT = SingleFlight()
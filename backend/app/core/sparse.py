@@ -0,0 +1,164 @@
+import logging
+import math
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Keep dosages, decimals and hyphenated names together: "5mg", "0.5", "covid-19", "t/d"
+_TOKEN = re.compile(r"[a-z0-9]+(?:[.\-/][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+class BM25Index:
+    """
+    Local BM25 inverted index over the chunks in the vector store, keyed by point ID.
+
+    Postings are kept in memory and scored with NumPy. When `path` is set, every
+    document's term frequencies are appended to a SQLite table, so the index is
+    reloaded on startup and other processes pick up new rows on their next search.
+    """
+
+    def __init__(self, path: Optional[str] = None, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._ids: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._lengths: List[int] = []
+        self._postings: Dict[str, Tuple[List[int], List[int]]] = {}
+        # term -> (doc positions, term frequencies) as arrays, rebuilt when postings grow
+        self._frozen: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._total_length = 0
+        self._last_row = 0
+
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            self._open(path)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _open(self, path: str) -> None:
+        try:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sparse_index ("
+                "row INTEGER PRIMARY KEY AUTOINCREMENT, point_id TEXT NOT NULL UNIQUE, "
+                "length INTEGER NOT NULL, terms TEXT NOT NULL)"
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.warning("Sparse index persistence disabled (%s): %s", path, e)
+            self._db = None
+            return
+        self.refresh()
+
+    def refresh(self) -> None:
+        """Load rows persisted since the last refresh (e.g. by another worker)."""
+        if self._db is None:
+            return
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT row, point_id, length, terms FROM sparse_index WHERE row > ? ORDER BY row",
+                (self._last_row,),
+            ).fetchall()
+            for row, point_id, length, terms in rows:
+                self._last_row = row
+                if point_id in self._positions:
+                    continue
+                frequencies = {}
+                for item in terms.split(" ") if terms else []:
+                    term, count = item.rsplit(":", 1)
+                    frequencies[term] = int(count)
+                self._add(point_id, length, frequencies)
+
+    def _add(self, point_id: str, length: int, frequencies: Dict[str, int]) -> None:
+        position = len(self._ids)
+        self._ids.append(point_id)
+        self._positions[point_id] = position
+        self._lengths.append(length)
+        self._total_length += length
+        for term, count in frequencies.items():
+            positions, counts = self._postings.setdefault(term, ([], []))
+            positions.append(position)
+            counts.append(count)
+            self._frozen.pop(term, None)
+
+    def add(self, ids: Sequence[str], texts: Sequence[str]) -> int:
+        """Index new chunks; IDs already in the index are ignored. Returns how many were added."""
+        rows = []
+        with self._lock:
+            for point_id, text in zip(ids, texts):
+                if point_id in self._positions:
+                    continue
+                tokens = tokenize(text)
+                frequencies = Counter(tokens)
+                self._add(point_id, len(tokens), frequencies)
+                rows.append((point_id, len(tokens), " ".join(f"{t}:{c}" for t, c in frequencies.items())))
+
+            if self._db is not None and rows:
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO sparse_index (point_id, length, terms) VALUES (?, ?, ?)", rows
+                )
+                self._db.commit()
+                self._last_row = self._db.execute("SELECT MAX(row) FROM sparse_index").fetchone()[0] or 0
+        return len(rows)
+
+    def _arrays(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        if term not in self._postings:
+            return None
+        if term not in self._frozen:
+            positions, counts = self._postings[term]
+            self._frozen[term] = (np.asarray(positions, dtype=np.int64), np.asarray(counts, dtype=np.float32))
+        return self._frozen[term]
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """Return up to `k` (point_id, bm25 score) pairs, best first."""
+        self.refresh()
+        terms = set(tokenize(query))
+        with self._lock:
+            n = len(self._ids)
+            if not n or not terms:
+                return []
+            lengths = np.asarray(self._lengths, dtype=np.float32)
+            average_length = self._total_length / n or 1.0
+            norm = self.k1 * (1 - self.b + self.b * lengths / average_length)
+
+            scores = np.zeros(n, dtype=np.float32)
+            for term in terms:
+                arrays = self._arrays(term)
+                if arrays is None:
+                    continue
+                positions, counts = arrays
+                idf = math.log(1 + (n - len(positions) + 0.5) / (len(positions) + 0.5))
+                np.add.at(scores, positions, idf * counts * (self.k1 + 1) / (counts + norm[positions]))
+
+            k = min(k, n)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(self._ids[i], float(scores[i])) for i in top if scores[i] > 0]
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse ranked ID lists: score(id) = sum over lists of 1 / (k + rank)."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, point_id in enumerate(ranking, start=1):
+            scores[point_id] = scores.get(point_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+SPARSE_INDEX = BM25Index(path=settings.SPARSE_INDEX_PATH)
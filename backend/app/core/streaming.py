@@ -0,0 +1,186 @@
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from app.core.config import settings
+
+
+# Keep proxies (nginx, API Gateway) from buffering the stream or caching it
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+
+def sse_event(event: str, data: Any) -> str:
+    """Frame one Server-Sent Event; the JSON payload is a single `data:` line."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def sse_error(status_code: int, detail: str) -> str:
+    payload: Dict[str, Any] = {"status_code": status_code, "detail": detail}
+    return sse_event("error", payload)
+
+
+class StreamStats:
+    """Frame and byte counters of one streaming connection (SSE response or websocket)."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.monotonic()
+        self.ended: Optional[float] = None
+        self.chunks = 0
+        self.frames = 0
+        self.bytes = 0
+
+    def record_frame(self, frame: str) -> None:
+        self.frames += 1
+        self.bytes += len(frame.encode("utf-8"))
+
+    def snapshot(self) -> Dict[str, Any]:
+        elapsed = (self.ended or time.monotonic()) - self.started
+        return {
+            "name": self.name,
+            "seconds": round(elapsed, 3),
+            "chunks": self.chunks,
+            "frames": self.frames,
+            "bytes": self.bytes,
+            "frames_per_second": round(self.frames / elapsed, 2) if elapsed else 0.0,
+            "bytes_per_second": round(self.bytes / elapsed, 2) if elapsed else 0.0,
+            "chunks_per_frame": round(self.chunks / self.frames, 2) if self.frames else 0.0,
+        }
+
+
+class StreamStatsRegistry:
+    """Counters of the open streaming connections plus totals of the closed ones."""
+
+    def __init__(self):
+        self._active: Dict[int, StreamStats] = {}
+        self.closed = 0
+        self.chunks = 0
+        self.frames = 0
+        self.bytes = 0
+
+    def open(self, name: str) -> StreamStats:
+        stats = StreamStats(name)
+        self._active[id(stats)] = stats
+        return stats
+
+    def close(self, stats: StreamStats) -> None:
+        if self._active.pop(id(stats), None) is None:
+            return
+        stats.ended = time.monotonic()
+        self.closed += 1
+        self.chunks += stats.chunks
+        self.frames += stats.frames
+        self.bytes += stats.bytes
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "coalesce_window_ms": settings.STREAM_COALESCE_WINDOW_MS,
+            "coalesce_max_bytes": settings.STREAM_COALESCE_MAX_BYTES,
+            "active": [stats.snapshot() for stats in list(self._active.values())],
+            "closed": {
+                "streams": self.closed,
+                "chunks": self.chunks,
+                "frames": self.frames,
+                "bytes": self.bytes,
+                "chunks_per_frame": round(self.chunks / self.frames, 2) if self.frames else 0.0,
+            },
+        }
+
+
+STREAM_STATS = StreamStatsRegistry()
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+_DONE = object()
+
+
+async def coalesce(
+    chunks: AsyncIterator[str],
+    window_ms: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    stats: Optional[StreamStats] = None,
+) -> AsyncIterator[str]:
+    """
+    Merge text chunks (often single tokens) into fewer, larger frames.
+
+    A frame is flushed `window_ms` after its first chunk arrived, once it holds
+    `max_bytes`, or when the source ends, so no chunk waits longer than the window.
+    The source is drained by a separate task so the window can expire between chunks.
+    A window of 0 passes chunks through unchanged.
+    """
+    window = (settings.STREAM_COALESCE_WINDOW_MS if window_ms is None else window_ms) / 1000
+    max_bytes = settings.STREAM_COALESCE_MAX_BYTES if max_bytes is None else max_bytes
+
+    if window <= 0:
+        async for chunk in chunks:
+            if not chunk:
+                continue
+            if stats is not None:
+                stats.chunks += 1
+            yield chunk
+        return
+
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def pump() -> None:
+        try:
+            async for chunk in chunks:
+                queue.put_nowait(chunk)
+            queue.put_nowait(_DONE)
+        except Exception as e:
+            queue.put_nowait(_Failure(e))
+
+    pump_task = asyncio.create_task(pump())
+    buffer: List[str] = []
+    size = 0
+    deadline = 0.0
+    try:
+        while True:
+            try:
+                timeout = max(0.0, deadline - loop.time()) if buffer else None
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                yield "".join(buffer)
+                buffer, size = [], 0
+                continue
+
+            if item is _DONE:
+                break
+            if isinstance(item, _Failure):
+                raise item.error
+            if not item:
+                continue
+            if stats is not None:
+                stats.chunks += 1
+            if not buffer:
+                deadline = loop.time() + window
+            buffer.append(item)
+            size += len(item)
+            if size >= max_bytes:
+                yield "".join(buffer)
+                buffer, size = [], 0
+
+        if buffer:
+            yield "".join(buffer)
+    finally:
+        # Stops the provider stream too when the consumer goes away
+        pump_task.cancel()
+
+
+async def track_frames(frames: AsyncIterator[str], stats: StreamStats) -> AsyncIterator[str]:
+    """Count the frames of a streaming response and retire its stats when it ends."""
+    try:
+        async for frame in frames:
+            stats.record_frame(frame)
+            yield frame
+    finally:
+        STREAM_STATS.close(stats)
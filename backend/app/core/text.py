@@ -0,0 +1,111 @@
+import logging
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import tiktoken
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Sentence ends followed by whitespace; fragments shorter than _MIN_SENTENCE_CHARS
+# (e.g. "Fig. 2.", "vs.") are glued back onto the previous sentence.
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_MIN_SENTENCE_CHARS = 25
+
+# Chunk payload keys written at ingest time
+TOKEN_COUNT_KEY = "token_count"
+SENTENCE_TOKENS_KEY = "sentence_tokens"
+
+
+def clean_text(text: str) -> str:
+    """Remove soft hyphens and non-breaking spaces and normalize whitespace."""
+    cleaned = text.replace('\u00ad', '').replace('\xa0', ' ')
+    return ' '.join(cleaned.split())
+
+
+def split_sentences(text: str) -> List[str]:
+    sentences: List[str] = []
+    for part in _SENTENCE_END.split(text):
+        part = part.strip()
+        if not part:
+            continue
+        if sentences and (len(part) < _MIN_SENTENCE_CHARS or len(sentences[-1]) < _MIN_SENTENCE_CHARS):
+            sentences[-1] = f"{sentences[-1]} {part}"
+        else:
+            sentences.append(part)
+    return sentences
+
+
+@lru_cache(maxsize=1)
+def get_encoding() -> Optional[tiktoken.Encoding]:
+    model = settings.OPENAI_MODEL_NAME or "gpt-4o-mini"
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            # Non-OpenAI models: cl100k_base is a close enough proxy for budgeting
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # The BPE files are downloaded on first use; estimate offline instead
+        logger.warning("tiktoken unavailable, estimating token counts: %s", e)
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def count_tokens(text: str) -> int:
+    encoding = get_encoding()
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def token_metadata(text: str) -> Dict:
+    """Token counts of a chunk and of each of its sentences, stored in the chunk payload."""
+    cleaned = clean_text(text)
+    return {
+        TOKEN_COUNT_KEY: count_tokens(cleaned),
+        SENTENCE_TOKENS_KEY: [count_tokens(sentence) for sentence in split_sentences(cleaned)],
+    }
+
+
+def pack_contexts(
+    contexts: Sequence[str], metadata: Sequence[Dict], budget: int
+) -> List[Tuple[int, str, int]]:
+    """
+    Fill a prompt token budget greedily with contexts ordered best first.
+
+    Uses the token counts stored at ingest time (estimating only for chunks ingested
+    before they existed), so nothing is tokenized here. The first context that does not
+    fit is cut at a sentence boundary and packing stops. Returns (index, text, tokens)
+    for every kept context; the best context's first sentence is always kept.
+    """
+    packed = []
+    remaining = budget
+    for index, (text, meta) in enumerate(zip(contexts, metadata)):
+        tokens = meta.get(TOKEN_COUNT_KEY) or estimate_tokens(text)
+        if tokens <= remaining:
+            packed.append((index, text, tokens))
+            remaining -= tokens
+            continue
+
+        sentences = split_sentences(text)
+        sentence_tokens = meta.get(SENTENCE_TOKENS_KEY)
+        if not sentence_tokens or len(sentence_tokens) != len(sentences):
+            sentence_tokens = [estimate_tokens(sentence) for sentence in sentences]
+
+        kept, used = [], 0
+        for sentence, count in zip(sentences, sentence_tokens):
+            if used + count > remaining and (kept or packed):
+                break
+            kept.append(sentence)
+            used += count
+        if kept:
+            packed.append((index, ' '.join(kept), used))
+        break
+    return packed
@@ -0,0 +1,398 @@
+import json
+import os
+import threading
+import uuid
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.runnables.config import run_in_executor
+from langchain_core.vectorstores import VectorStore
+
+
+VECTORS_FILE = "vectors.f32"
+PAYLOADS_FILE = "payloads.jsonl"
+META_FILE = "meta.json"
+
+# Rows reserved up front and each time the vector file has to grow
+_MIN_CAPACITY = 1024
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    In-process vector store for single-node deployments and tests.
+
+    Unit-normalized embeddings live in a memory-mapped float32 matrix
+    (`vectors.f32`), so a search is one matrix-vector product plus an
+    argpartition, and scores are cosine similarities like a Qdrant COSINE
+    collection. Page content and metadata are appended to `payloads.jsonl`, one
+    line per upserted or deleted row. Reloading a directory replays that log and
+    maps the matrix again without re-embedding anything.
+
+    Upserting an existing ID overwrites its row. Rows of deleted points are
+    reclaimed by `compact`, which runs when a directory is opened and before the
+    matrix would have to grow: it writes new files and switches to them by
+    replacing `meta.json`, so a crash leaves either the old or the new files in use.
+    """
+
+    def __init__(self, embedding: Embeddings, path: Optional[str] = None):
+        self._embeddings = embedding
+        self.path = path
+        self._lock = threading.RLock()
+
+        self._dim: Optional[int] = None
+        self._capacity = 0
+        self._count = 0
+        self._vectors: Optional[np.ndarray] = None
+        self._valid = np.zeros(0, dtype=bool)
+        self._ids: List[Optional[str]] = []
+        self._payloads: List[Optional[Tuple[str, Dict]]] = []
+        self._rows: Dict[str, int] = {}
+        self._log = None
+        # Bumped by each compaction, which writes the vector file and log under new names
+        self._generation = 0
+        self._vectors_name = VECTORS_FILE
+        self._payloads_name = PAYLOADS_FILE
+
+        if path:
+            os.makedirs(path, exist_ok=True)
+            self._load()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embeddings
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _write_meta(self) -> None:
+        meta = {
+            "dim": self._dim,
+            "generation": self._generation,
+            "vectors": self._vectors_name,
+            "payloads": self._payloads_name,
+        }
+        tmp_path = self._file(META_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._file(META_FILE))
+
+    def _load(self) -> None:
+        meta_path = self._file(META_FILE)
+        if not os.path.exists(meta_path):
+            return
+        with open(meta_path) as f:
+            meta = json.load(f)
+        self._dim = meta["dim"]
+        self._generation = meta.get("generation", 0)
+        self._vectors_name = meta.get("vectors", VECTORS_FILE)
+        self._payloads_name = meta.get("payloads", PAYLOADS_FILE)
+
+        records = []
+        torn = False
+        try:
+            with open(self._file(self._payloads_name), encoding="utf-8") as f:
+                for line in f:
+                    # A torn last line means the process died mid-write; that row never became valid
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        torn = True
+                        break
+        except FileNotFoundError:
+            # The process died before logging its first row: no point ever became visible
+            pass
+
+        count = max((record["row"] + 1 for record in records), default=0)
+        self._map(max(count, _MIN_CAPACITY))
+        self._count = count
+        for record in records:
+            if record.get("deleted"):
+                self._forget(record["id"])
+            else:
+                self._remember(record["row"], record["id"], record["page_content"], record["metadata"])
+        # Also rewrites a torn log, which later appends would otherwise extend
+        self.compact(force=torn)
+
+    def _map(self, capacity: int) -> None:
+        """(Re)map the vector file with room for `capacity` rows."""
+        path = self._file(self._vectors_name) if self.path else None
+        if path is None:
+            vectors = np.zeros((capacity, self._dim), dtype=np.float32)
+            if self._vectors is not None:
+                vectors[:self._count] = self._vectors[:self._count]
+        else:
+            if self._vectors is not None:
+                self._vectors.flush()
+                self._vectors = None
+            with open(path, "ab") as f:
+                f.truncate(max(os.path.getsize(path), capacity * self._dim * 4))
+            vectors = np.memmap(path, dtype=np.float32, mode="r+", shape=(capacity, self._dim))
+
+        valid = np.zeros(capacity, dtype=bool)
+        valid[:len(self._valid)] = self._valid
+        self._vectors, self._valid, self._capacity = vectors, valid, capacity
+        missing = capacity - len(self._ids)
+        self._ids.extend([None] * missing)
+        self._payloads.extend([None] * missing)
+
+    def _remember(self, row: int, point_id: str, page_content: str, metadata: Dict) -> None:
+        self._forget(point_id)
+        self._ids[row] = point_id
+        self._payloads[row] = (page_content, metadata)
+        self._rows[point_id] = row
+        self._valid[row] = True
+
+    def _forget(self, point_id: str) -> None:
+        row = self._rows.pop(point_id, None)
+        if row is not None:
+            self._valid[row] = False
+            self._ids[row] = None
+            self._payloads[row] = None
+
+    def _append_log(self, records: List[Dict]) -> None:
+        if not self.path:
+            return
+        if self._log is None:
+            self._log = open(self._file(self._payloads_name), "a", encoding="utf-8")
+        self._log.write("".join(json.dumps(record) + "\n" for record in records))
+        self._log.flush()
+
+    @staticmethod
+    def _normalize(vectors: Any) -> np.ndarray:
+        matrix = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def upsert_vectors(self, ids: Sequence[str], documents: Sequence[Document], vectors: Sequence[List[float]]) -> None:
+        """Store documents with precomputed embeddings; existing IDs are replaced."""
+        if not ids:
+            return
+        matrix = self._normalize(vectors)
+        with self._lock:
+            if self._dim is None:
+                self._dim = matrix.shape[1]
+                if self.path:
+                    self._write_meta()
+                self._map(_MIN_CAPACITY)
+            elif matrix.shape[1] != self._dim:
+                raise ValueError(f"Expected {self._dim}-dimensional vectors, got {matrix.shape[1]}")
+
+            ids = [str(point_id) for point_id in ids]
+            if self._count + len(ids) > self._capacity:
+                # Reclaim deleted rows before growing the matrix
+                self.compact()
+
+            # Existing IDs keep their row; new ones (once each) go after the last row
+            rows = []
+            added: Dict[str, int] = {}
+            for point_id in ids:
+                row = self._rows.get(point_id, added.get(point_id))
+                if row is None:
+                    row = added[point_id] = self._count + len(added)
+                rows.append(row)
+            if self._count + len(added) > self._capacity:
+                self._map(max(self._capacity * 2, self._count + len(added)))
+
+            # Write vectors before payloads: a new row only becomes visible once its payload is logged
+            self._vectors[rows] = matrix
+            if isinstance(self._vectors, np.memmap):
+                self._vectors.flush()
+            self._count += len(added)
+
+            records = [
+                {"row": row, "id": point_id, "page_content": doc.page_content, "metadata": doc.metadata}
+                for row, point_id, doc in zip(rows, ids, documents)
+            ]
+            self._append_log(records)
+            for record in records:
+                self._remember(record["row"], record["id"], record["page_content"], record["metadata"])
+
+    def compact(self, force: bool = False) -> None:
+        """Move live rows to the front of new files, dropping the rows of deleted points."""
+        with self._lock:
+            if self._vectors is None or (not force and len(self._rows) == self._count):
+                return
+            live = sorted(self._rows.values())
+            vectors = np.array(self._vectors[live])
+            points = [(self._ids[row], *self._payloads[row]) for row in live]
+            capacity = self._capacity
+
+            if self._log is not None:
+                self._log.close()
+                self._log = None
+            old_files = (self._vectors_name, self._payloads_name)
+            self._vectors = None
+            self._valid = np.zeros(0, dtype=bool)
+            self._ids, self._payloads, self._rows = [], [], {}
+            if self.path:
+                self._generation += 1
+                self._vectors_name = f"vectors.{self._generation}.f32"
+                self._payloads_name = f"payloads.{self._generation}.jsonl"
+                for name in (self._vectors_name, self._payloads_name):
+                    if os.path.exists(self._file(name)):
+                        # Left over by a compaction that died before switching
+                        os.remove(self._file(name))
+
+            self._map(capacity)
+            self._vectors[:len(live)] = vectors
+            if isinstance(self._vectors, np.memmap):
+                self._vectors.flush()
+            self._count = len(live)
+            self._append_log([
+                {"row": row, "id": point_id, "page_content": page_content, "metadata": metadata}
+                for row, (point_id, page_content, metadata) in enumerate(points)
+            ])
+            for row, (point_id, page_content, metadata) in enumerate(points):
+                self._remember(row, point_id, page_content, metadata)
+
+            if self.path:
+                if self._log is not None:
+                    os.fsync(self._log.fileno())
+                self._write_meta()
+                for name in old_files:
+                    try:
+                        os.remove(self._file(name))
+                    except OSError:
+                        pass
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[Dict]] = None,
+        *,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = [str(i) for i in ids] if ids else [str(uuid.uuid4()) for _ in texts]
+        vectors = self._embeddings.embed_documents(texts)
+        documents = [Document(page_content=text, metadata=metadata) for text, metadata in zip(texts, metadatas)]
+        self.upsert_vectors(ids, documents, vectors)
+        return ids
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[Dict]] = None,
+        *,
+        ids: Optional[List[str]] = None,
+        path: Optional[str] = None,
+        **kwargs: Any,
+    ) -> "NumpyVectorStore":
+        store = cls(embedding, path=path)
+        store.add_texts(texts, metadatas, ids=ids)
+        return store
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if not ids:
+            return False
+        with self._lock:
+            ids = [str(point_id) for point_id in ids if str(point_id) in self._rows]
+            self._append_log([{"row": self._rows[point_id], "id": point_id, "deleted": True} for point_id in ids])
+            for point_id in ids:
+                self._forget(point_id)
+        return True
+
+    def _document(self, row: int) -> Document:
+        page_content, metadata = self._payloads[row]
+        return Document(page_content=page_content, metadata={**metadata, "_id": self._ids[row]}, id=self._ids[row])
+
+    def get_by_ids(self, ids: Sequence[str], /) -> List[Document]:
+        with self._lock:
+            return [self._document(self._rows[str(i)]) for i in ids if str(i) in self._rows]
+
+    def get_vectors(self, ids: Sequence[str]) -> Dict[str, List[float]]:
+        """Stored (unit-normalized) vectors by point ID; unknown IDs are left out."""
+        with self._lock:
+            return {str(i): self._vectors[self._rows[str(i)]].tolist() for i in ids if str(i) in self._rows}
+
+    def existing_ids(self, ids: Sequence[str]) -> Set[str]:
+        with self._lock:
+            return {str(i) for i in ids if str(i) in self._rows}
+
+    def iter_chunks(self) -> Iterator[Tuple[str, str]]:
+        """Yield (point_id, page_content) for every stored chunk."""
+        with self._lock:
+            items = [(point_id, self._payloads[row][0]) for point_id, row in self._rows.items()]
+        yield from items
+
+    def similarity_search_with_score_by_vector(
+        self, embedding: List[float], k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        query = self._normalize(embedding)[0]
+        with self._lock:
+            if self._vectors is None or not self._rows:
+                return []
+            if query.shape[0] != self._dim:
+                raise ValueError(f"Expected a {self._dim}-dimensional query, got {query.shape[0]}")
+            scores = self._vectors[:self._count] @ query
+            scores[~self._valid[:self._count]] = -np.inf
+
+            k = min(k, len(self._rows))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(self._document(int(row)), float(scores[row])) for row in top]
+
+    def similarity_search_with_score_by_vectors(
+        self, embeddings: List[List[float]], k: int = 4
+    ) -> List[List[Tuple[Document, float]]]:
+        """Top-k for many queries at once with a single matrix product."""
+        queries = self._normalize(embeddings)
+        with self._lock:
+            if self._vectors is None or not self._rows:
+                return [[] for _ in range(len(queries))]
+            if queries.shape[1] != self._dim:
+                raise ValueError(f"Expected {self._dim}-dimensional queries, got {queries.shape[1]}")
+            scores = queries @ self._vectors[:self._count].T
+            scores[:, ~self._valid[:self._count]] = -np.inf
+
+            k = min(k, len(self._rows))
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            top = np.take_along_axis(top, np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1), axis=1)
+            return [
+                [(self._document(int(row)), float(row_scores[row])) for row in rows]
+                for rows, row_scores in zip(top, scores)
+            ]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self._embeddings.embed_query(query), k)
+
+    async def asimilarity_search_with_score(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        embedding = await self._embeddings.aembed_query(query)
+        return await run_in_executor(None, self.similarity_search_with_score_by_vector, embedding, k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    async def asimilarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in await self.asimilarity_search_with_score(query, k)]
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        return self._cosine_relevance_score_fn
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "points_count": len(self._rows),
+                "rows": self._count,
+                "capacity": self._capacity,
+                "dim": self._dim,
+                "memory_bytes": self._vectors.nbytes if self._vectors is not None else 0,
+                "persistent": bool(self.path),
+            }
@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict
+
+from langchain_core.runnables.config import run_in_executor
+
+from app.core.bot import get_vector_store
+from app.core.clients import CLIENTS
+from app.core.config import settings
+from app.core.providers import PROVIDERS
+
+logger = logging.getLogger(__name__)
+
+
+# EventBridge schedules and the serverless-plugin-warmup convention
+WARMUP_SOURCES = {"aws.events", "serverless-plugin-warmup"}
+
+_state = {"preloaded": False, "invocations": 0}
+
+
+def in_lambda() -> bool:
+    return "AWS_LAMBDA_FUNCTION_NAME" in os.environ
+
+
+def is_warmup_event(event: Any) -> bool:
+    """Scheduled pings: `{"warmup": true}` or an EventBridge/warmup-plugin event without an HTTP request."""
+    if not isinstance(event, dict) or "requestContext" in event:
+        return False
+    return event.get("warmup") is True or event.get("source") in WARMUP_SOURCES
+
+
+def build_clients() -> Dict[str, float]:
+    """Import and construct the models, the vector store and the pooled clients. No network calls."""
+    timings = {}
+    for name, build in (
+        ("embeddings", PROVIDERS.embeddings),
+        ("llm", PROVIDERS.llm),
+        ("vector_store", get_vector_store),
+    ):
+        start = time.perf_counter()
+        build()
+        timings[name] = time.perf_counter() - start
+    return timings
+
+
+async def warm_connections() -> Dict[str, float]:
+    """
+    Open (or refresh) the keep-alive connections to Qdrant and the provider with one
+    cheap request each, so the next query skips DNS, TCP and TLS setup. Failures are
+    logged and skipped: the request path opens its own connections anyway.
+    """
+    timings = {}
+
+    async def ping(name: str, call) -> None:
+        start = time.perf_counter()
+        try:
+            await call()
+            timings[name] = time.perf_counter() - start
+        except Exception as e:
+            logger.warning("Warm-up of %s connections failed: %s", name, e)
+
+    if settings.VECTOR_STORE_BACKEND == "qdrant":
+        await ping("qdrant", lambda: run_in_executor(
+            None, CLIENTS.qdrant().get_collection, settings.QDRANT_COLLECTION_NAME
+        ))
+
+    # OpenAI/Azure: the async SDK client shares its pool with the embeddings (same host).
+    # The Google providers manage their own transports.
+    client = getattr(PROVIDERS.llm(), "root_async_client", None)
+    if client is not None:
+        await ping("provider", lambda: client.with_options(
+            max_retries=0, timeout=settings.WARMUP_TIMEOUT
+        ).models.list())
+    return timings
+
+
+def run(coroutine):
+    # Mangum runs every invocation on this same loop, so warmed async connections stay usable
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+def ensure_built() -> Dict[str, float]:
+    if _state["preloaded"]:
+        return {}
+    try:
+        timings = build_clients()
+        _state["preloaded"] = True
+        return timings
+    except Exception as e:
+        logger.warning("Preloading failed, continuing lazily: %s", e)
+        return {}
+
+
+def preload() -> Dict[str, Any]:
+    """Lambda INIT phase: build everything the first request needs and open its connections."""
+    start = time.perf_counter()
+    report: Dict[str, Any] = {"build": ensure_built()}
+    if _state["preloaded"]:
+        report["connect"] = run(warm_connections())
+    report["seconds"] = time.perf_counter() - start
+    print(f"🔥 Preloaded in {report['seconds']:.2f}s: {report}")
+    return report
+
+
+def handle_warmup(event: Dict) -> Dict[str, Any]:
+    """Answer a warm-up ping without the RAG pipeline, refreshing the pooled connections."""
+    cold_start = not _state["invocations"]
+    _state["invocations"] += 1
+    start = time.perf_counter()
+    ensure_built()
+    connect = run(warm_connections()) if _state["preloaded"] else {}
+    return {
+        "warmup": True,
+        "cold_start": cold_start,
+        "connect": connect,
+        "seconds": time.perf_counter() - start,
+        "clients": CLIENTS.stats(),
+    }
+
+
+def count_invocation() -> bool:
+    """Record a regular invocation; returns whether it was this container's first one."""
+    cold_start = not _state["invocations"]
+    _state["invocations"] += 1
+    return cold_start
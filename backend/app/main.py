@@ -1,11 +1,14 @@
 import uvicorn
-from fastapi import FastAPI, status
+from fastapi import FastAPI, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from mangum import Mangum
 
 from app.routes import api_router
 from app.core.config import settings
+from app.core.metrics import REGISTRY
 from app.core.scheduler import lifespan
+from app.core.warmup import count_invocation, handle_warmup, in_lambda, is_warmup_event, preload
 from app.views import query as query_view
 
 
@@ -37,7 +40,34 @@ async def health_check():
     return {"message": "live"}
 
 
-handler = Mangum(app)
+@app.get("/metrics", response_class=PlainTextResponse, status_code=status.HTTP_200_OK)
+async def metrics():
+    """Per-stage latency histograms, token counts and cache hit rates in the Prometheus text format."""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Metrics are disabled")
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+mangum_handler = Mangum(app)
+
+
+def handler(event, context):
+    """
+    Lambda entry point. Scheduled warm-up pings ({"warmup": true} or an EventBridge
+    schedule) only refresh the pooled connections; everything else goes to the app.
+    Responses carry an x-cold-start header for latency reports.
+    """
+    if is_warmup_event(event):
+        return handle_warmup(event)
+    cold_start = count_invocation()
+    response = mangum_handler(event, context)
+    response.setdefault("headers", {})["x-cold-start"] = str(cold_start).lower()
+    return response
+
+
+# Runs during the Lambda INIT phase, before the first request is routed to this container
+if in_lambda() and settings.LAMBDA_PRELOAD:
+    preload()
 
 
 if __name__ == "__main__":
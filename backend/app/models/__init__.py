@@ -1,2 +1,3 @@
 from app.models.base import *
 from app.models.users import *
+from app.models.ingest import *
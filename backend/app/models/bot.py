@@ -1,4 +1,4 @@
-from typing import Optional, Text
+from typing import Literal, Optional, Text
 
 from sqlmodel import Field, SQLModel
 
@@ -6,3 +6,10 @@ from sqlmodel import Field, SQLModel
 class UserQuery(SQLModel):
     prompt: Text
     collection: Optional[Text] = Field(None, description="Collection to query")
+
+
+class ChatSocketMessage(SQLModel):
+    """Client frame of the multiplexed /chat/rag/ws protocol."""
+    type: Literal["prompt", "cancel", "stats"] = "prompt"
+    id: Optional[Text] = Field(None, description="Client-chosen request ID, echoed on every server frame")
+    prompt: Optional[Text] = None
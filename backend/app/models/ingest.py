@@ -0,0 +1,72 @@
+import uuid
+from datetime import datetime
+from typing import Optional
+
+from sqlmodel import Field, SQLModel
+from sqlalchemy import Column, JSON, func
+
+
+INGEST_JOB_PENDING = "pending"
+INGEST_JOB_RUNNING = "running"
+INGEST_JOB_COMPLETED = "completed"
+INGEST_JOB_FAILED = "failed"
+
+
+# Shared properties
+class IngestJobBase(SQLModel):
+    filename: str = Field(max_length=255, nullable=False)
+    status: str = Field(default=INGEST_JOB_PENDING, max_length=32, index=True)
+    bytes_total: int = 0
+    bytes_processed: int = 0
+    chunks_new: int = 0
+    chunks_skipped: int = 0
+    chunks_per_second: float = 0.0
+    attempts: int = 0
+    error: Optional[str] = Field(default=None, max_length=2048, nullable=True)
+    started_at: Optional[datetime] = Field(default=None, nullable=True)
+    finished_at: Optional[datetime] = Field(default=None, nullable=True)
+
+
+# Properties to receive on job creation
+class IngestJobCreate(SQLModel):
+    filename: str = Field(max_length=255)
+    file_path: str = Field(max_length=1024)
+    file_type: str = Field(max_length=16)
+    bytes_total: int = 0
+    chunk_size: int = 500
+    chunk_overlap: int = 100
+    embed_batch_size: Optional[int] = None
+    embed_concurrency: Optional[int] = None
+
+
+class IngestJob(IngestJobBase, table=True):
+    __tablename__ = "ingest_job"
+
+    id: uuid.UUID = Field(
+        default_factory=uuid.uuid4,
+        primary_key=True, nullable=False
+    )
+    file_path: str = Field(max_length=1024, nullable=False)
+    file_type: str = Field(max_length=16, nullable=False)
+    chunk_size: int = 500
+    chunk_overlap: int = 100
+    embed_batch_size: Optional[int] = Field(default=None, nullable=True)
+    embed_concurrency: Optional[int] = Field(default=None, nullable=True)
+    stats: Optional[dict] = Field(default=None, sa_column=Column(JSON, nullable=True))
+    # Worker running the job and when it last said so (see app.core.jobs)
+    owner: Optional[str] = Field(default=None, max_length=128, nullable=True)
+    heartbeat_at: Optional[datetime] = Field(default=None, nullable=True)
+    created_at: datetime = Field(default_factory=func.now)
+    updated_at: datetime = Field(
+        default_factory=func.now,
+        sa_column_kwargs={"onupdate": func.now()}
+    )
+
+
+# Properties to return via API
+class IngestJobPublic(IngestJobBase):
+    id: uuid.UUID
+    progress: float = Field(default=0.0, description="Fraction of the file processed (0-1)")
+    stats: Optional[dict] = None
+    created_at: datetime
+    updated_at: datetime
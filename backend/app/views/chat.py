@@ -1,16 +1,24 @@
+import asyncio
+import json
+import logging
 import time
-from typing import Any, Iterator
+from typing import Any, Dict, Optional
 
-from fastapi import APIRouter, WebSocket, status
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, status
 from fastapi import HTTPException
 from fastapi.responses import StreamingResponse, JSONResponse
-from langchain_core.messages import BaseMessageChunk, message_to_dict
+from starlette.websockets import WebSocketState
 
 from app.core.bot import (
-    retrieve_and_generate, generate_chunks, generate_text_chunks, 
-    SYSTEM_PROMPT, retrieve_and_generate_sync
+    agenerate_text_chunks, SYSTEM_PROMPT, aretrieve_and_generate, aretrieve_and_generate_sync, EMBEDDINGS
 )
-from app.models.bot import UserQuery
+from app.core.cache import SEMANTIC_CACHE
+from app.core.config import settings
+from app.core.singleflight import SINGLE_FLIGHT, flight_key
+from app.core.streaming import STREAM_STATS, StreamStats, coalesce, track_frames
+from app.models.bot import ChatSocketMessage, UserQuery
+
+logger = logging.getLogger(__name__)
 
 
 router = APIRouter(
@@ -40,9 +48,18 @@ async def retrieval_augmented_generation(query: UserQuery) -> Any:
     """
     Do RAG & Stream.
     """
-    stream = retrieve_and_generate(prompt=query.prompt)
+    stats = STREAM_STATS.open("chat/rag/stream")
+    frames = coalesce(shared_answer_chunks(query.prompt), stats=stats)
+
+    return StreamingResponse(track_frames(frames, stats), media_type="text/event-stream")
+
 
-    return StreamingResponse(generate_text_chunks(stream), media_type="text/event-stream")
+@router.get("/stream-stats", response_model=Any)
+async def stream_stats() -> Any:
+    """
+    Frame counters of the open streaming connections (SSE and websocket) and totals of the closed ones.
+    """
+    return STREAM_STATS.snapshot()
 
 
 @router.post("/rag/sync", response_model=Any)
@@ -50,25 +67,162 @@ async def retrieval_augmented_generation(query: UserQuery) -> Any:
     """
     Do RAG.
     """
-    message = retrieve_and_generate_sync(prompt=query.prompt)
+    # Identical prompts sent at the same time share one answer
+    content = await SINGLE_FLIGHT.do(flight_key("chat/rag/sync", query.prompt), lambda: answer_content(query.prompt))
+    return JSONResponse(status_code=status.HTTP_200_OK, content=content)
+
+
+async def answer_content(prompt: str) -> Any:
+    if not settings.SEMANTIC_CACHE_ENABLED:
+        message = await aretrieve_and_generate_sync(prompt=prompt)
+        return message.content
+
+    query_embedding = await EMBEDDINGS.aembed_query(prompt)
+    params = {"endpoint": "chat/rag/sync"}
+    generation = SEMANTIC_CACHE.generation
+    content = SEMANTIC_CACHE.lookup(query_embedding, params)
+    if content is None:
+        message = await aretrieve_and_generate_sync(prompt=prompt)
+        content = message.content
+        SEMANTIC_CACHE.store(query_embedding, params, content, generation)
+    return content
+
 
-    return JSONResponse(status_code=status.HTTP_200_OK, content=message.content)
+async def answer_chunks(prompt: str):
+    stream = await aretrieve_and_generate(prompt=prompt)
+    async for text in agenerate_text_chunks(stream):
+        yield text
+
+
+def shared_answer_chunks(prompt: str):
+    """Answer text chunks; concurrent streams of the same prompt (SSE or websocket) share one generation."""
+    return SINGLE_FLIGHT.stream(flight_key("chat/rag/stream", prompt), lambda: answer_chunks(prompt))
+
+
+async def stream_answer(send, request_id: Optional[str], prompt: str, stats: Optional[StreamStats] = None) -> None:
+    """Stream one answer over the socket; legacy (ID-less) requests get bare text frames."""
+    async for text in coalesce(shared_answer_chunks(prompt), stats=stats):
+        if request_id is None:
+            await send(text)
+        else:
+            await send(json.dumps({"type": "token", "id": request_id, "text": text}))
+    if request_id is None:
+        await send("[END]")
+    else:
+        await send(json.dumps({"type": "end", "id": request_id}))
 
 
 @router.websocket("/rag/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await websocket.accept()
-    while True:
-        user_prompt = await websocket.receive_text()
+    """
+    Multiplexed RAG chat.
 
-        stream = retrieve_and_generate(prompt=user_prompt)
+    Client frames are JSON `ChatSocketMessage`s:
+    - `{"type": "prompt", "id": "1", "prompt": "..."}` starts a generation
+    - `{"type": "cancel", "id": "1"}` stops it (and the provider's token stream)
+    - `{"type": "stats"}` asks for this connection's frame counters
 
-        async def generate_text_chunks_socket(stream: Iterator[BaseMessageChunk]):
-            for chunk in stream:
-                res = message_to_dict(chunk)['data']['content']
-                await websocket.send_text(f"{res}")
-            await websocket.send_text(f"[END]")
-        await generate_text_chunks_socket(stream)
+    Server frames echo the ID: `token` (with `text`, coalesced over
+    STREAM_COALESCE_WINDOW_MS), `end`, `cancelled`, `stats` and `error` (with `detail`). Several prompts can run at once, up to CHAT_WS_MAX_CONCURRENT.
+    A plain-text frame (or a prompt without ID) is answered the old way: one after
+    the other, with bare text chunks (or an `Error: ...` line) followed by `[END]`.
+    """
+    await websocket.accept()
+    send_lock = asyncio.Lock()
+    tasks: Dict[Optional[str], asyncio.Task] = {}
+    legacy_prompts: asyncio.Queue = asyncio.Queue()
+    legacy_worker: Optional[asyncio.Task] = None
+    stats = STREAM_STATS.open("chat/rag/ws")
+
+    async def send(text: str) -> None:
+        # Frames of concurrent generations must not interleave mid-send
+        async with send_lock:
+            await websocket.send_text(text)
+            stats.record_frame(text)
+
+    async def send_frame(frame_type: str, request_id: Optional[str], **fields) -> None:
+        await send(json.dumps({"type": frame_type, "id": request_id, **fields}))
+
+    async def send_error(request_id: Optional[str], detail: str) -> None:
+        if request_id is None:
+            # Legacy clients read plain text until [END]
+            await send(f"Error: {detail}")
+            await send("[END]")
+        else:
+            await send_frame("error", request_id, detail=detail)
+
+    async def run(request_id: Optional[str], prompt: str) -> None:
+        try:
+            await stream_answer(send, request_id, prompt, stats)
+        except asyncio.CancelledError:
+            if request_id is not None and websocket.client_state == WebSocketState.CONNECTED:
+                try:
+                    await send_frame("cancelled", request_id)
+                except Exception:
+                    pass
+            raise
+        except WebSocketDisconnect:
+            pass
+        except Exception as e:
+            logger.exception("Error in websocket generation: %s", e)
+            await send_error(request_id, str(e))
+        finally:
+            tasks.pop(request_id, None)
+
+    async def run_legacy() -> None:
+        # ID-less prompts are answered in order, one at a time, as before multiplexing
+        while True:
+            prompt = await legacy_prompts.get()
+            if not prompt or not prompt.strip():
+                await send_error(None, "prompt is required and cannot be empty")
+            else:
+                await run(None, prompt)
+
+    try:
+        while True:
+            raw = await websocket.receive_text()
+            try:
+                message = ChatSocketMessage.model_validate_json(raw)
+            except ValueError:
+                # Legacy protocol: the whole frame is the prompt
+                message = ChatSocketMessage(prompt=raw)
+
+            if message.type == "cancel":
+                task = tasks.get(message.id)
+                if task is not None:
+                    task.cancel()
+                else:
+                    await send_frame("error", message.id, detail="No generation in flight with this id")
+                continue
+
+            if message.type == "stats":
+                await send_frame("stats", message.id, **stats.snapshot())
+                continue
+
+            if message.id is None:
+                # Answered in order, errors included, so legacy clients can match them up
+                legacy_prompts.put_nowait(message.prompt)
+                if legacy_worker is None:
+                    legacy_worker = asyncio.create_task(run_legacy())
+            elif not message.prompt or not message.prompt.strip():
+                await send_frame("error", message.id, detail="prompt is required and cannot be empty")
+            elif message.id in tasks:
+                await send_frame("error", message.id, detail="A generation with this id is already in flight")
+            elif len(tasks) >= settings.CHAT_WS_MAX_CONCURRENT:
+                await send_frame("error", message.id, detail="Too many generations in flight on this connection")
+            else:
+                tasks[message.id] = asyncio.create_task(run(message.id, message.prompt))
+
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # Nobody is listening anymore: stop paying for tokens
+        running = list(tasks.values()) + ([legacy_worker] if legacy_worker is not None else [])
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+        STREAM_STATS.close(stats)
 
 
 @router.websocket("/echo")
@@ -1,16 +1,27 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, status
 from typing import List, Optional
 import json
-import csv
-import io
-from pydantic import BaseModel
+import os
+import shutil
+import uuid
+from pydantic import BaseModel, Field
 
-from langchain_community.document_loaders import TextLoader, JSONLoader, CSVLoader
 from langchain_core.documents import Document
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_core.runnables.config import run_in_executor
 
-from app.core.bot import VECTOR_STORE, EMBEDDINGS
+from app.controllers.ingest_jobs import create_ingest_job, get_ingest_job, to_public
+from app.core.bot import VECTOR_STORE
+from app.core.cache import SEMANTIC_CACHE
+from app.core.clients import CLIENTS
 from app.core.config import settings
+from app.core.db import SessionDep
+from app.core.ingestion import (
+    IngestResult, ingest_documents, iter_file_documents, make_text_splitter, rebuild_sparse_index
+)
+from app.core.metrics import record_error
+from app.core.sparse import SPARSE_INDEX
+from app.core.jobs import schedule_ingest_job
+from app.models.ingest import IngestJobCreate, IngestJobPublic
 
 
 router = APIRouter(prefix="/ingest", tags=["ingest"])
@@ -19,7 +30,10 @@ router = APIRouter(prefix="/ingest", tags=["ingest"])
 class IngestResponse(BaseModel):
     message: str
     documents_processed: int
+    chunks_new: int = 0
+    chunks_skipped: int = 0
     collection_name: str
+    stats: Optional[dict] = Field(default=None, description="Throughput and per-stage timings")
 
 
 class IngestTextRequest(BaseModel):
@@ -27,21 +41,8 @@ class IngestTextRequest(BaseModel):
     metadatas: Optional[List[dict]] = None
 
 
-@router.post("/upload-file", response_model=IngestResponse, status_code=status.HTTP_201_CREATED)
-async def upload_file(
-    file: UploadFile = File(...),
-    chunk_size: int = 500,
-    chunk_overlap: int = 100
-):
-    """
-    Upload and ingest a file (TXT, JSON, CSV) into the vector store.
-    Optimized chunking for better retrieval scores.
-    
-    - **file**: The file to upload (supported formats: .txt, .json, .csv)
-    - **chunk_size**: Size of text chunks for splitting (default: 500, optimized for medical text)
-    - **chunk_overlap**: Overlap between chunks (default: 100, ensures context continuity)
-    """
-    
+def get_file_extension(file: UploadFile) -> str:
+    """Validate the upload's filename and return its (supported) extension."""
     if not file.filename:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -56,94 +57,48 @@ async def upload_file(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Unsupported file format: {file_extension}. Supported formats: txt, json, csv"
         )
+    return file_extension
+
+
+@router.post("/upload-file", response_model=IngestResponse, status_code=status.HTTP_201_CREATED)
+async def upload_file(
+    file: UploadFile = File(...),
+    chunk_size: int = 500,
+    chunk_overlap: int = 100,
+    embed_batch_size: Optional[int] = None,
+    embed_concurrency: Optional[int] = None
+):
+    """
+    Upload and ingest a file (TXT, JSON, CSV) into the vector store.
+    Optimized chunking for better retrieval scores.
+    
+    - **file**: The file to upload (supported formats: .txt, .json, .csv)
+    - **chunk_size**: Size of text chunks for splitting (default: 500, optimized for medical text)
+    - **chunk_overlap**: Overlap between chunks (default: 100, ensures context continuity)
+    - **embed_batch_size**: Chunks per embedding call (default: INGEST_EMBED_BATCH_SIZE)
+    - **embed_concurrency**: Embedding calls in flight at once (default: INGEST_EMBED_CONCURRENCY)
+    """
+    
+    file_extension = get_file_extension(file)
+    result = IngestResult()
     
     try:
-        # Read file content
-        content = await file.read()
-        content_str = content.decode('utf-8')
-        
-        # Parse documents based on file type
-        documents = []
-        
-        if file_extension == 'txt':
-            # For text files, create a single document
-            documents.append(Document(
-                page_content=content_str,
-                metadata={"source": file.filename}
-            ))
-        
-        elif file_extension == 'json':
-            # For JSON files, parse as list of objects
-            json_data = json.loads(content_str)
-            
-            # Handle both single object and array of objects
-            if isinstance(json_data, dict):
-                json_data = [json_data]
-            
-            for idx, item in enumerate(json_data):
-                # Try to find a content field or stringify the whole object
-                if 'content' in item:
-                    text = item['content']
-                elif 'text' in item:
-                    text = item['text']
-                elif 'question' in item and 'answer' in item:
-                    text = f"Question: {item['question']}\nAnswer: {item['answer']}"
-                else:
-                    text = json.dumps(item)
-                
-                metadata = {k: v for k, v in item.items() if k not in ['content', 'text']}
-                metadata['source'] = file.filename
-                metadata['index'] = idx
-                
-                documents.append(Document(
-                    page_content=text,
-                    metadata=metadata
-                ))
+        # Parse lazily from the spooled upload and store in fixed-size windows,
+        # so memory is bounded by the window size rather than the file size
+        documents = iter_file_documents(file.file, file_extension, file.filename)
+        text_splitter = make_text_splitter(chunk_size, chunk_overlap)
         
-        elif file_extension == 'csv':
-            # For CSV files, parse each row
-            csv_reader = csv.DictReader(io.StringIO(content_str))
-            
-            for idx, row in enumerate(csv_reader):
-                # Try to find a content field or combine all fields
-                if 'content' in row:
-                    text = row['content']
-                elif 'text' in row:
-                    text = row['text']
-                elif 'question' in row and 'answer' in row:
-                    text = f"Question: {row['question']}\nAnswer: {row['answer']}"
-                else:
-                    # Combine all fields
-                    text = '\n'.join([f"{k}: {v}" for k, v in row.items()])
-                
-                metadata = {k: v for k, v in row.items() if k not in ['content', 'text']}
-                metadata['source'] = file.filename
-                metadata['index'] = idx
-                
-                documents.append(Document(
-                    page_content=text,
-                    metadata=metadata
-                ))
-        
-        # Split documents into chunks with better strategy for medical text
-        # Using smaller chunks and separators optimized for medical text
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            length_function=len,
-            separators=["\n\n", "\n", ". ", "? ", "! ", "; ", ", ", " ", ""],  # Better splitting
-            keep_separator=True,  # Keep punctuation for context
+        await ingest_documents(
+            documents, text_splitter, batch_size=embed_batch_size, concurrency=embed_concurrency, result=result
         )
         
-        split_docs = text_splitter.split_documents(documents)
-        
-        # Add documents to vector store
-        VECTOR_STORE.add_documents(split_docs)
-        
         return IngestResponse(
             message=f"Successfully ingested {file.filename}",
-            documents_processed=len(split_docs),
-            collection_name=settings.QDRANT_COLLECTION_NAME
+            documents_processed=result.total,
+            chunks_new=result.new,
+            chunks_skipped=result.skipped,
+            collection_name=settings.QDRANT_COLLECTION_NAME,
+            stats=result.stats()
         )
     
     except json.JSONDecodeError:
@@ -152,17 +107,24 @@ async def upload_file(
             detail="Invalid JSON format"
         )
     except Exception as e:
+        record_error("ingest")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error processing file: {str(e)}"
         )
+    finally:
+        if result.new:
+            # Cached answers may be stale now that the collection changed, even partly
+            SEMANTIC_CACHE.invalidate()
 
 
 @router.post("/upload-texts", response_model=IngestResponse, status_code=status.HTTP_201_CREATED)
 async def upload_texts(
     request: IngestTextRequest,
     chunk_size: int = 500,
-    chunk_overlap: int = 100
+    chunk_overlap: int = 100,
+    embed_batch_size: Optional[int] = None,
+    embed_concurrency: Optional[int] = None
 ):
     """
     Ingest a list of text strings directly into the vector store.
@@ -172,6 +134,8 @@ async def upload_texts(
     - **metadatas**: Optional list of metadata dictionaries (one per text)
     - **chunk_size**: Size of text chunks for splitting (default: 500, optimized for medical text)
     - **chunk_overlap**: Overlap between chunks (default: 100, ensures context continuity)
+    - **embed_batch_size**: Chunks per embedding call (default: INGEST_EMBED_BATCH_SIZE)
+    - **embed_concurrency**: Embedding calls in flight at once (default: INGEST_EMBED_CONCURRENCY)
     """
     
     if not request.texts:
@@ -180,45 +144,133 @@ async def upload_texts(
             detail="No texts provided"
         )
     
+    result = IngestResult()
     try:
         # Create documents from texts
-        documents = []
-        for idx, text in enumerate(request.texts):
-            metadata = {}
-            if request.metadatas and idx < len(request.metadatas):
-                metadata = request.metadatas[idx]
-            metadata['index'] = idx
-            
-            documents.append(Document(
-                page_content=text,
-                metadata=metadata
-            ))
-        
-        # Split documents into chunks with better strategy for medical text
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            length_function=len,
-            separators=["\n\n", "\n", ". ", "? ", "! ", "; ", ", ", " ", ""],
-            keep_separator=True,
-        )
+        def iter_documents():
+            for idx, text in enumerate(request.texts):
+                metadata = {}
+                if request.metadatas and idx < len(request.metadatas):
+                    metadata = request.metadatas[idx]
+                metadata['index'] = idx
+                
+                yield Document(
+                    page_content=text,
+                    metadata=metadata
+                )
         
-        split_docs = text_splitter.split_documents(documents)
+        text_splitter = make_text_splitter(chunk_size, chunk_overlap)
         
-        # Add documents to vector store
-        VECTOR_STORE.add_documents(split_docs)
+        await ingest_documents(
+            iter_documents(), text_splitter, batch_size=embed_batch_size, concurrency=embed_concurrency, result=result
+        )
         
         return IngestResponse(
             message="Successfully ingested texts",
-            documents_processed=len(split_docs),
-            collection_name=settings.QDRANT_COLLECTION_NAME
+            documents_processed=result.total,
+            chunks_new=result.new,
+            chunks_skipped=result.skipped,
+            collection_name=settings.QDRANT_COLLECTION_NAME,
+            stats=result.stats()
         )
     
     except Exception as e:
+        record_error("ingest")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error processing texts: {str(e)}"
         )
+    finally:
+        if result.new:
+            # Cached answers may be stale now that the collection changed, even partly
+            SEMANTIC_CACHE.invalidate()
+
+
+def save_upload(file: UploadFile, path: str) -> int:
+    """Copy the spooled upload to `path` in fixed-size blocks; returns the size in bytes."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    file.file.seek(0)
+    with open(path, "wb") as out:
+        shutil.copyfileobj(file.file, out, length=1024 * 1024)
+    return os.path.getsize(path)
+
+
+@router.post("/jobs", response_model=IngestJobPublic, status_code=status.HTTP_202_ACCEPTED)
+async def submit_ingest_job(
+    session: SessionDep,
+    file: UploadFile = File(...),
+    chunk_size: int = 500,
+    chunk_overlap: int = 100,
+    embed_batch_size: Optional[int] = None,
+    embed_concurrency: Optional[int] = None
+):
+    """
+    Upload a file (TXT, JSON, CSV) and ingest it in the background.
+    Returns a job immediately; poll `/ingest/jobs/{id}` for progress.
+    Jobs left unfinished by a restart are resumed on startup.
+    
+    Accepts the same parameters as `/ingest/upload-file`.
+    """
+    
+    file_extension = get_file_extension(file)
+    
+    try:
+        path = os.path.join(settings.INGEST_JOBS_DIR, f"{uuid.uuid4()}.{file_extension}")
+        size = await run_in_executor(None, save_upload, file, path)
+        
+        job = create_ingest_job(session=session, job_create=IngestJobCreate(
+            filename=file.filename,
+            file_path=path,
+            file_type=file_extension,
+            bytes_total=size,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            embed_batch_size=embed_batch_size,
+            embed_concurrency=embed_concurrency,
+        ))
+        schedule_ingest_job(job.id)
+        
+        return to_public(job)
+    
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error creating ingest job: {str(e)}"
+        )
+
+
+@router.get("/jobs/{job_id}", response_model=IngestJobPublic, status_code=status.HTTP_200_OK)
+async def get_ingest_job_status(session: SessionDep, job_id: uuid.UUID):
+    """
+    Get progress, throughput and errors of a background ingest job.
+    """
+    job = get_ingest_job(session=session, job_id=job_id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Ingest job not found"
+        )
+    return to_public(job)
+
+
+@router.post("/sparse-index/rebuild", status_code=status.HTTP_200_OK)
+async def rebuild_sparse_index_endpoint():
+    """
+    Add every chunk already stored in the collection to the BM25 index used by
+    hybrid retrieval. Chunks that are already indexed are skipped.
+    """
+    try:
+        added = await run_in_executor(None, rebuild_sparse_index)
+        return {
+            "collection_name": settings.QDRANT_COLLECTION_NAME,
+            "chunks_added": added,
+            "chunks_indexed": len(SPARSE_INDEX),
+        }
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error rebuilding sparse index: {str(e)}"
+        )
 
 
 @router.delete("/clear-collection", status_code=status.HTTP_200_OK)
@@ -249,21 +301,28 @@ async def get_collection_info():
     Get information about the current collection.
     """
     try:
-        # Get collection info from Qdrant client
-        from qdrant_client import QdrantClient
-        
-        client = QdrantClient(
-            url=settings.QDRANT_URL,
-            api_key=settings.QDRANT_API_KEY
+        if settings.VECTOR_STORE_BACKEND == "numpy":
+            stats = VECTOR_STORE.stats()
+            return {
+                "collection_name": settings.QDRANT_COLLECTION_NAME,
+                "vectors_count": stats["points_count"],
+                "points_count": stats["points_count"],
+                "status": "green",
+                "backend": stats,
+                "clients": CLIENTS.stats(),
+            }
+
+        # Shared client (and connection pool) of the vector store
+        collection_info = await run_in_executor(
+            None, CLIENTS.qdrant().get_collection, settings.QDRANT_COLLECTION_NAME
         )
         
-        collection_info = client.get_collection(settings.QDRANT_COLLECTION_NAME)
-        
         return {
             "collection_name": settings.QDRANT_COLLECTION_NAME,
             "vectors_count": collection_info.vectors_count,
             "points_count": collection_info.points_count,
-            "status": collection_info.status
+            "status": collection_info.status,
+            "clients": CLIENTS.stats(),
         }
     except Exception as e:
         raise HTTPException(
@@ -1,9 +1,30 @@
-from fastapi import APIRouter, HTTPException, status
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict
+from fastapi import APIRouter, HTTPException, Response, status
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, model_validator
+from typing import Any, Awaitable, Callable, List, Literal, Optional, Dict, Tuple
+import asyncio
+import logging
+import time
 
-from app.core.bot import VECTOR_STORE, retrieve, generate_sync, LLM
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.runnables.config import run_in_executor
+
+from app.core.bot import (
+    VECTOR_STORE, EMBEDDINGS, aembed_queries, agenerate, agenerate_sync, agenerate_text_chunks, aget_vectors,
+    asearch_by_vector, asearch_by_vector_with_vectors, asearch_by_vectors, LLM
+)
+from app.core.cache import SEMANTIC_CACHE
 from app.core.config import settings
+from app.core.context import compress_contexts
+from app.core.rerank import maximal_marginal_relevance
+from app.core.text import TOKEN_COUNT_KEY, clean_text, pack_contexts
+from app.core.sparse import SPARSE_INDEX, reciprocal_rank_fusion
+from app.core.metrics import record_error, record_request, record_timings, record_tokens, server_timing
+from app.core.singleflight import SINGLE_FLIGHT, flight_key
+from app.core.streaming import SSE_HEADERS, STREAM_STATS, coalesce, sse_error, sse_event, track_frames
+
+logger = logging.getLogger(__name__)
 
 
 router = APIRouter(prefix="/query", tags=["query"])
@@ -13,18 +34,71 @@ class QueryRequest(BaseModel):
     query: str = Field(..., description="The user's question")
     top_k: int = Field(default=5, description="Number of context snippets to retrieve")
     use_query_expansion: bool = Field(default=False, description="Expand query with medical terms")
-    score_threshold: float = Field(default=0.0, description="Minimum similarity score (0-1)")
+    expansion_mode: Literal["sequential", "parallel"] = Field(
+        default="sequential",
+        description="parallel retrieves on the original query while expanding, then merges both result sets"
+    )
+    expansion_budget_ms: Optional[int] = Field(
+        default=None, ge=0,
+        description="Parallel mode: max wait for the expansion (default: QUERY_EXPANSION_BUDGET_MS)"
+    )
+    score_threshold: float = Field(
+        default=0.0, description="Minimum similarity score (0-1) of dense results (hybrid: of the dense candidates)"
+    )
     summarize_context: bool = Field(default=True, description="Use AI to summarize contexts before answering")
+    use_mmr: bool = Field(default=False, description="Re-rank candidates with maximal marginal relevance for diversity")
+    mmr_lambda: float = Field(
+        default=0.5, ge=0.0, le=1.0, description="MMR trade-off: 1.0 ranks by relevance only, 0.0 by diversity only"
+    )
+    fetch_k: Optional[int] = Field(default=None, ge=1, description="Candidates retrieved before filtering (default: 2 * top_k)")
+    context_token_budget: Optional[int] = Field(
+        default=None, ge=1, description="Max prompt tokens of context (default: PROMPT_CONTEXT_TOKEN_BUDGET)"
+    )
+    summarize_method: Literal["llm", "extractive"] = Field(
+        default="llm",
+        description="llm (one summarization call) or extractive (keep the sentences closest to the query, no LLM call)"
+    )
+    retrieval_mode: Literal["dense", "sparse", "hybrid"] = Field(
+        default="dense",
+        description="dense (embeddings), sparse (BM25) or hybrid (both, fused with reciprocal rank fusion)"
+    )
+    use_cache: bool = Field(default=True, description="Serve semantically similar questions from the answer cache")
+
+    @model_validator(mode="after")
+    def check_score_threshold(self) -> "QueryRequest":
+        # BM25 scores are unbounded and not comparable to a similarity threshold
+        if self.retrieval_mode == "sparse" and self.score_threshold > 0:
+            raise ValueError("score_threshold is not supported with sparse retrieval")
+        return self
 
 
 class QueryResponse(BaseModel):
     answer: str = Field(..., description="The generated answer")
     contexts: List[str] = Field(..., description="List of context snippets (summarized if enabled)")
-    scores: List[float] = Field(..., description="Similarity scores for each context")
+    scores: List[float] = Field(
+        ...,
+        description="Score of each context: vector similarity (dense), BM25 (sparse) or reciprocal rank fusion (hybrid)"
+    )
     metadata: List[Dict] = Field(default=[], description="Metadata for each context (e.g., source, book name)")
+    timings: Optional[Dict[str, float]] = Field(default=None, description="Seconds spent in each pipeline stage")
+
 
+class BatchQueryRequest(BaseModel):
+    queries: List[QueryRequest] = Field(..., min_length=1, description="Questions to answer")
+    concurrency: Optional[int] = Field(
+        default=None, ge=1, description="Max questions generating at once (default: QUERY_BATCH_CONCURRENCY)"
+    )
+    ordered: bool = Field(default=False, description="Stream results in request order instead of as they complete")
 
-def expand_medical_query(query: str, llm) -> str:
+
+class BatchQueryResult(BaseModel):
+    index: int = Field(..., description="Position of the question in the batch")
+    status_code: int = Field(..., description="HTTP status the single /query call would have returned")
+    response: Optional[QueryResponse] = None
+    error: Optional[str] = None
+
+
+async def expand_medical_query(query: str, llm) -> str:
     """
     Expand the query with medical terminology and synonyms to improve retrieval.
     """
@@ -35,22 +109,71 @@ Original question: {query}
 Expanded query with medical terms:"""
     
     try:
-        response = llm.invoke(expansion_prompt)
+        response = await llm.ainvoke(expansion_prompt)
         expanded = response.content if hasattr(response, 'content') else str(response)
         # Combine original and expanded
         return f"{query} {expanded.strip()}"
     except Exception as e:
-        print(f"Query expansion failed: {e}")
+        logger.warning("Query expansion failed: %s", e)
         return query
 
 
-def summarize_contexts(query: str, contexts: List[str], llm) -> List[str]:
+def parse_summaries(summary_text: str, contexts: List[str]) -> List[str]:
+    """
+    Parse the numbered "Context N: ..." summaries returned by the LLM.
+    Falls back to the original contexts if the count does not match.
+    """
+    summarized = []
+    lines = summary_text.strip().split('\n')
+    current_summary = []
+    
+    for line in lines:
+        # Check if this is a new context marker
+        if line.strip().startswith('Context ') and ':' in line:
+            # Save previous summary if exists
+            if current_summary:
+                summary = ' '.join(current_summary).strip()
+                # Clean markdown and formatting
+                summary = summary.replace('*', '').replace('•', '').replace('-', '')
+                summary = ' '.join(summary.split())
+                summarized.append(summary)
+                current_summary = []
+            
+            # Start new summary (skip the "Context N:" part)
+            content_after_colon = line.split(':', 1)[1] if ':' in line else ''
+            if content_after_colon.strip():
+                current_summary.append(content_after_colon.strip())
+        else:
+            # Continue current summary
+            if line.strip():
+                current_summary.append(line.strip())
+    
+    # Add the last summary
+    if current_summary:
+        summary = ' '.join(current_summary).strip()
+        summary = summary.replace('*', '').replace('•', '').replace('-', '')
+        summary = ' '.join(summary.split())
+        summarized.append(summary)
+    
+    # If parsing failed or we got wrong number of summaries, fallback to original
+    if len(summarized) != len(contexts):
+        return contexts
+        
+    return summarized
+
+
+async def summarize_contexts(
+    query: str, contexts: List[str], llm, token_counts: Optional[List[int]] = None
+) -> List[str]:
     """
     Use AI to intelligently summarize and condense contexts while keeping relevant information.
     Optimized to process all contexts in a single LLM call for better performance.
     """
     # Skip if all contexts are already short
-    if all(len(c) < 200 for c in contexts):
+    if token_counts is not None:
+        if all(count < settings.SUMMARIZE_MIN_CONTEXT_TOKENS for count in token_counts):
+            return contexts
+    elif all(len(c) < 200 for c in contexts):
         return contexts
     
     # Build a single prompt with all contexts numbered
@@ -69,68 +192,457 @@ Context 2: [summary]
 ..."""
     
     try:
-        response = llm.invoke(summarization_prompt)
+        response = await llm.ainvoke(summarization_prompt)
         summary_text = response.content if hasattr(response, 'content') else str(response)
+        return parse_summaries(summary_text, contexts)
         
-        # Parse the numbered summaries
-        summarized = []
-        lines = summary_text.strip().split('\n')
-        current_summary = []
+    except Exception as e:
+        logger.warning("Summarization failed: %s", e)
+        return contexts  # Fallback to original
+
+
+def clean_results(results: List[Tuple[Document, float]]) -> Tuple[List[str], List[float], List[Dict]]:
+    """
+    Clean unicode escape sequences, normalize whitespace and de-duplicate contexts.
+    """
+    cleaned_contexts = []
+    seen = set()
+    cleaned_scores = []
+    cleaned_metadata = []
+    
+    for doc, score in results:
+        # Remove unicode soft hyphens and other special chars, normalize whitespace
+        cleaned = clean_text(doc.page_content)
+        # Deduplicate
+        if cleaned not in seen and cleaned.strip():
+            seen.add(cleaned)
+            cleaned_contexts.append(cleaned)
+            cleaned_scores.append(float(score))
+            cleaned_metadata.append(doc.metadata)
+    
+    return cleaned_contexts, cleaned_scores, cleaned_metadata
+
+
+async def dense_search(
+    search_query: str,
+    k: int,
+    query_embedding: Optional[List[float]] = None,
+) -> List[Tuple[Document, float]]:
+    """Dense vector search; pass `query_embedding` when the query was already embedded."""
+    if query_embedding is not None:
+        return await asearch_by_vector(query_embedding, k=k)
+    return await VECTOR_STORE.asimilarity_search_with_score(search_query, k=k)
+
+
+async def fetch_documents(ids: List[str]) -> Dict[str, Document]:
+    """Load stored chunks by point ID."""
+    if not ids:
+        return {}
+    docs = await VECTOR_STORE.aget_by_ids(ids)
+    return {str(doc.metadata.get("_id")): doc for doc in docs}
+
+
+async def sparse_search(search_query: str, k: int) -> List[Tuple[Document, float]]:
+    """BM25 search over the local sparse index; scores are BM25 scores."""
+    hits = await run_in_executor(None, SPARSE_INDEX.search, search_query, k)
+    docs = await fetch_documents([point_id for point_id, _ in hits])
+    return [(docs[point_id], score) for point_id, score in hits if point_id in docs]
+
+
+async def hybrid_search(
+    search_query: str,
+    k: int,
+    score_threshold: float,
+    query_embedding: Optional[List[float]] = None,
+    prefetched: Optional[List[Tuple[Document, float]]] = None,
+) -> List[Tuple[Document, float]]:
+    """
+    Run dense and BM25 search concurrently and fuse them with reciprocal rank fusion.
+    `score_threshold` applies to the dense candidates; returned scores are RRF scores.
+    """
+    if prefetched is not None:
+        dense = prefetched
+        sparse_hits = await run_in_executor(None, SPARSE_INDEX.search, search_query, k)
+    else:
+        dense, sparse_hits = await asyncio.gather(
+            dense_search(search_query, k, query_embedding),
+            run_in_executor(None, SPARSE_INDEX.search, search_query, k),
+        )
+    docs = {
+        str(doc.metadata.get("_id")): doc
+        for doc, score in sorted(dense, key=lambda x: x[1], reverse=True)
+        if score >= score_threshold
+    }
+    fused = reciprocal_rank_fusion(
+        [list(docs), [point_id for point_id, _ in sparse_hits]], k=settings.HYBRID_RRF_K
+    )[:k]
+    
+    # Lexical-only hits still need their payloads
+    docs.update(await fetch_documents([point_id for point_id, _ in fused if point_id not in docs]))
+    return [(docs[point_id], score) for point_id, score in fused if point_id in docs]
+
+
+async def mmr_rerank(
+    search_query: str,
+    results: List[Tuple[Document, float]],
+    top_k: int,
+    lambda_mult: float,
+    query_embedding: Optional[List[float]] = None,
+    vectors: Optional[Dict[str, List[float]]] = None,
+) -> List[Tuple[Document, float]]:
+    """
+    Re-rank candidates with maximal marginal relevance so near-duplicate chunks
+    (e.g. neighbours sharing the chunk overlap) don't crowd out other contexts.
+    Vectors missing from `vectors` are fetched from the vector store by ID.
+    """
+    if len(results) <= 1:
+        return results[:top_k]
+    if query_embedding is None:
+        query_embedding = await EMBEDDINGS.aembed_query(search_query)
+    
+    ids = [str(doc.metadata.get("_id")) for doc, _ in results]
+    vectors = dict(vectors or {})
+    missing = [point_id for point_id in ids if point_id not in vectors]
+    if missing:
+        vectors.update(await aget_vectors(missing))
+    
+    # Candidates without a stored vector are kept out of the diversity pool
+    candidates = [i for i, point_id in enumerate(ids) if point_id in vectors]
+    if len(candidates) <= 1:
+        return results[:top_k]
+    selected = maximal_marginal_relevance(
+        np.asarray(query_embedding), np.asarray([vectors[ids[i]] for i in candidates]), top_k, lambda_mult
+    )
+    return [results[candidates[i]] for i in selected]
+
+
+def retrieval_k(top_k: int, fetch_k: Optional[int] = None) -> int:
+    """Candidates retrieved before filtering: `fetch_k`, by default 2 * top_k, never fewer than top_k."""
+    return max(fetch_k or top_k * 2, top_k)
+
+
+async def retrieve_contexts(
+    search_query: str,
+    top_k: int,
+    score_threshold: float,
+    query_embedding: Optional[List[float]] = None,
+    retrieval_mode: str = "dense",
+    prefetched: Optional[List[Tuple[Document, float]]] = None,
+    fetch_k: Optional[int] = None,
+    mmr_lambda: Optional[float] = None,
+    timings: Optional[Dict[str, float]] = None,
+) -> List[Tuple[Document, float]]:
+    """
+    Retrieve, threshold and rank documents for a search query without blocking the event loop.
+    Pass `query_embedding` when the search query was already embedded to skip re-embedding it,
+    or `prefetched` dense results (e.g. from a batch search) to skip the dense search.
+    `fetch_k` candidates are retrieved (default: 2 * top_k); with `mmr_lambda` set the top_k
+    are picked by maximal marginal relevance instead of score alone.
+    The embedding, search and rerank stages are timed into `timings`.
+    """
+    timings = timings if timings is not None else {}
+    # Increase top_k for better recall, we'll filter later
+    candidates_k = retrieval_k(top_k, fetch_k)
+    vectors = None
+    
+    needs_embedding = (retrieval_mode != "sparse" and prefetched is None) or mmr_lambda is not None
+    if query_embedding is None and needs_embedding:
+        query_embedding = await timed(EMBEDDINGS.aembed_query(search_query), timings, "embedding")
+    
+    if retrieval_mode == "sparse":
+        filtered_results = await timed(sparse_search(search_query, candidates_k), timings, "search")
+    elif retrieval_mode == "hybrid":
+        filtered_results = await timed(
+            hybrid_search(search_query, candidates_k, score_threshold, query_embedding, prefetched),
+            timings, "search"
+        )
+    else:
+        # Retrieve relevant documents with scores (and vectors, for MMR)
+        retrieved_docs_with_scores = prefetched
+        if retrieved_docs_with_scores is None and mmr_lambda is not None:
+            retrieved_docs_with_scores, vectors = await timed(
+                asearch_by_vector_with_vectors(query_embedding, candidates_k), timings, "search"
+            )
+        elif retrieved_docs_with_scores is None:
+            retrieved_docs_with_scores = await timed(
+                dense_search(search_query, candidates_k, query_embedding), timings, "search"
+            )
         
-        for line in lines:
-            # Check if this is a new context marker
-            if line.strip().startswith('Context ') and ':' in line:
-                # Save previous summary if exists
-                if current_summary:
-                    summary = ' '.join(current_summary).strip()
-                    # Clean markdown and formatting
-                    summary = summary.replace('*', '').replace('•', '').replace('-', '')
-                    summary = ' '.join(summary.split())
-                    summarized.append(summary)
-                    current_summary = []
-                
-                # Start new summary (skip the "Context N:" part)
-                content_after_colon = line.split(':', 1)[1] if ':' in line else ''
-                if content_after_colon.strip():
-                    current_summary.append(content_after_colon.strip())
-            else:
-                # Continue current summary
-                if line.strip():
-                    current_summary.append(line.strip())
+        # Filter by score threshold and sort by score (higher is better for most embeddings)
+        # Note: Qdrant returns scores where higher is better
+        filtered_results = [
+            (doc, score) for doc, score in retrieved_docs_with_scores
+            if score >= score_threshold
+        ]
         
-        # Add the last summary
-        if current_summary:
-            summary = ' '.join(current_summary).strip()
-            summary = summary.replace('*', '').replace('•', '').replace('-', '')
-            summary = ' '.join(summary.split())
-            summarized.append(summary)
+        # Sort by score descending
+        filtered_results.sort(key=lambda x: x[1], reverse=True)
+    
+    if mmr_lambda is not None:
+        return await timed(
+            mmr_rerank(search_query, filtered_results, top_k, mmr_lambda, query_embedding, vectors),
+            timings, "rerank"
+        )
+    return filtered_results[:top_k]
+
+
+async def retrieve_for_request(
+    req: QueryRequest,
+    search_query: str,
+    top_k: int,
+    query_embedding: Optional[List[float]] = None,
+    prefetched: Optional[List[Tuple[Document, float]]] = None,
+    timings: Optional[Dict[str, float]] = None,
+) -> List[Tuple[Document, float]]:
+    """`retrieve_contexts` with the retrieval options of a `QueryRequest`."""
+    return await retrieve_contexts(
+        search_query,
+        top_k,
+        req.score_threshold,
+        query_embedding,
+        req.retrieval_mode,
+        prefetched,
+        fetch_k=req.fetch_k,
+        mmr_lambda=req.mmr_lambda if req.use_mmr else None,
+        timings=timings,
+    )
+
+
+def cache_params(req: QueryRequest) -> Dict:
+    """Request parameters that must match for a cached answer to be reused."""
+    return req.model_dump(exclude={"query", "use_cache"})
+
+
+async def timed(awaitable, timings: Dict[str, float], stage: str):
+    """
+    Await `awaitable`, adding its duration in seconds to `stage` (a stage run several
+    times, e.g. searches for the original and the expanded query, adds up).
+    """
+    start = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+
+def merge_results(
+    *result_sets: List[Tuple[Document, float]], top_k: int
+) -> List[Tuple[Document, float]]:
+    """Union of several ranked result sets, keeping each chunk's best score."""
+    best: Dict[str, Tuple[Document, float]] = {}
+    for results in result_sets:
+        for doc, score in results:
+            key = str(doc.metadata.get("_id") or doc.page_content)
+            if key not in best or score > best[key][1]:
+                best[key] = (doc, score)
+    return sorted(best.values(), key=lambda x: x[1], reverse=True)[:top_k]
+
+
+async def expand_and_retrieve_parallel(
+    req: QueryRequest,
+    top_k: int,
+    timings: Dict[str, float],
+    query_embedding: Optional[List[float]] = None,
+    prefetched: Optional[List[Tuple[Document, float]]] = None,
+) -> List[Tuple[Document, float]]:
+    """
+    Retrieve on the original query while the expansion LLM call runs, then retrieve on
+    the expanded query and merge. If the expansion misses its latency budget it is
+    cancelled and the original-query results are used alone.
+    """
+    budget_ms = req.expansion_budget_ms if req.expansion_budget_ms is not None else settings.QUERY_EXPANSION_BUDGET_MS
+    start = time.perf_counter()
+    expansion = asyncio.ensure_future(timed(expand_medical_query(req.query, LLM), timings, "expansion"))
+    try:
+        original = await timed(
+            retrieve_for_request(req, req.query, top_k, query_embedding, prefetched, timings),
+            timings, "retrieval_original"
+        )
+    except BaseException:
+        expansion.cancel()
+        raise
+    
+    remaining = budget_ms / 1000 - (time.perf_counter() - start)
+    try:
+        expanded_query = await asyncio.wait_for(expansion, timeout=max(0.0, remaining))
+    except asyncio.TimeoutError:
+        logger.warning("Query expansion exceeded its %s ms budget, using original query results", budget_ms)
+        expanded_query = None
+    
+    results = original
+    # expand_medical_query returns the original query when the LLM call fails
+    if expanded_query and expanded_query != req.query:
+        expanded = await timed(
+            retrieve_for_request(req, expanded_query, top_k, timings=timings),
+            timings, "retrieval_expanded"
+        )
+        results = merge_results(original, expanded, top_k=top_k)
+    
+    # How much shorter the stage was than running the same calls back to back
+    timings["retrieval_stage"] = time.perf_counter() - start
+    timings["parallel_saved"] = max(0.0, sum(
+        timings.get(stage, 0.0) for stage in ("expansion", "retrieval_original", "retrieval_expanded")
+    ) - timings["retrieval_stage"])
+    return results
+
+
+def effective_top_k(req: QueryRequest) -> int:
+    # Ensure top_k is positive
+    return max(1, req.top_k) if req.top_k else 5
+
+
+async def retrieve_stage(
+    req: QueryRequest,
+    timings: Dict[str, float],
+    query_embedding: Optional[List[float]] = None,
+    prefetched: Optional[List[Tuple[Document, float]]] = None,
+) -> Tuple[List[str], List[float], List[Dict], List[int]]:
+    """
+    Expand (optionally), retrieve, clean and pack contexts into the prompt token budget.
+    Returns contexts, scores, metadata and token counts, best first; raises 404 if nothing matched.
+    """
+    top_k = effective_top_k(req)
+    
+    if req.use_query_expansion and req.expansion_mode == "parallel":
+        filtered_results = await expand_and_retrieve_parallel(req, top_k, timings, query_embedding, prefetched)
+    else:
+        # Query expansion (optional)
+        search_query = req.query
         
-        # If parsing failed or we got wrong number of summaries, fallback to original
-        if len(summarized) != len(contexts):
-            return contexts
-            
-        return summarized
+        if req.use_query_expansion:
+            search_query = await timed(expand_medical_query(req.query, LLM), timings, "expansion")
+            # The precomputed embedding and results belong to the original query only
+            query_embedding = None
+            prefetched = None
         
-    except Exception as e:
-        print(f"Summarization failed: {e}")
-        return contexts  # Fallback to original
+        filtered_results = await timed(
+            retrieve_for_request(req, search_query, top_k, query_embedding, prefetched, timings),
+            timings, "retrieval"
+        )
+    
+    if not filtered_results:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No documents found with similarity score >= {req.score_threshold}"
+        )
+    
+    contexts, final_scores, final_metadata = clean_results(filtered_results)
+    
+    # Keep the prompt within the context token budget, best contexts first
+    packed = pack_contexts(contexts, final_metadata, req.context_token_budget or settings.PROMPT_CONTEXT_TOKEN_BUDGET)
+    return (
+        [text for _, text, _ in packed],
+        [final_scores[index] for index, _, _ in packed],
+        [final_metadata[index] for index, _, _ in packed],
+        [tokens for _, _, tokens in packed],
+    )
+
+
+async def summarize_stage(
+    req: QueryRequest,
+    contexts: List[str],
+    token_counts: List[int],
+    timings: Dict[str, float],
+    question_embedding: Optional[List[float]] = None,
+) -> List[str]:
+    """AI Context Summarization (optional); returns the contexts unchanged when disabled."""
+    if not req.summarize_context:
+        return contexts
+    if req.summarize_method == "extractive":
+        return await timed(
+            compress_contexts(
+                req.query, contexts, settings.CONTEXT_COMPRESSION_RATIO, settings.CONTEXT_COMPRESSION_MAX_CHARS,
+                question_embedding,
+            ),
+            timings, "summarize"
+        )
+    return await timed(summarize_contexts(req.query, contexts, LLM, token_counts), timings, "summarize")
+
+
+def generation_state(req: QueryRequest, contexts: List[str], token_counts: List[int]) -> Dict:
+    return {
+        'question': req.query,  # Use original query for answer generation
+        # Packed token counts are upper bounds for (shorter) summaries too
+        'context': [
+            Document(page_content=ctx, metadata={TOKEN_COUNT_KEY: tokens})
+            for ctx, tokens in zip(contexts, token_counts)
+        ],
+        'answer': '',
+        # Already packed to this budget in retrieve_stage; repacking with the global one would cut them
+        'token_budget': req.context_token_budget,
+    }
+
+
+def final_answer(answer: str) -> str:
+    # Ensure answer is a string and not empty
+    if not answer or answer.strip() == "":
+        return "I don't have enough information to answer this question."
+    return answer.strip()
+
+
+async def run_query(
+    req: QueryRequest,
+    query_embedding: Optional[List[float]] = None,
+    prefetched: Optional[List[Tuple[Document, float]]] = None,
+    pipeline: str = "query",
+    timings: Optional[Dict[str, float]] = None,
+    start: Optional[float] = None,
+) -> QueryResponse:
+    """
+    Run the full RAG pipeline (expand, retrieve, summarize, generate) for a single request.
+    Every stage is awaited, so many requests can be in flight on one worker. Pass the
+    `timings` and `start` of work done before (e.g. embedding the query for the cache).
+    """
+    timings = timings if timings is not None else {}
+    start = start if start is not None else time.perf_counter()
+    
+    contexts, final_scores, final_metadata, token_counts = await retrieve_stage(
+        req, timings, query_embedding, prefetched
+    )
+    
+    # Use summarized contexts for answer generation AND response; the question's own
+    # embedding stays valid here even if retrieval used an expanded query
+    contexts = await summarize_stage(req, contexts, token_counts, timings, query_embedding)
+    
+    # Generate answer using RAG
+    message = await timed(agenerate_sync(generation_state(req, contexts, token_counts)), timings, "generate")
+    answer = message.content if hasattr(message, 'content') else str(message)
+    
+    timings["total"] = time.perf_counter() - start
+    record_timings(pipeline, timings)
+    record_tokens(pipeline, context=sum(token_counts), usage=getattr(message, "usage_metadata", None))
+    record_request(pipeline)
+    return QueryResponse(
+        answer=final_answer(answer),
+        contexts=contexts,
+        scores=final_scores,
+        metadata=final_metadata,
+        timings=timings
+    )
 
 
 @router.post("", response_model=QueryResponse, status_code=status.HTTP_200_OK)
-async def query_endpoint(req: QueryRequest):
+async def query_endpoint(req: QueryRequest, response: Response):
     """
     Query endpoint for RAG evaluation with enhanced retrieval.
     
     - **query**: The user's medical question (required)
     - **top_k**: Number of context snippets to retrieve (default: 5)
     - **use_query_expansion**: Expand query with medical terminology (default: False)
-    - **score_threshold**: Minimum similarity score to include results (default: 0.0)
+    - **expansion_mode**: sequential, or parallel to retrieve on the original query while expanding (default: sequential)
+    - **expansion_budget_ms**: Parallel mode: how long to wait for the expansion before answering without it
+    - **score_threshold**: Minimum similarity score to include results (default: 0.0; dense and hybrid only)
     - **summarize_context**: Use AI to intelligently condense contexts (default: False)
+    - **context_token_budget**: Max prompt tokens of context, filled best score first (default: PROMPT_CONTEXT_TOKEN_BUDGET)
+    - **summarize_method**: llm summarization call, or local extractive compression (default: llm)
+    - **retrieval_mode**: dense, sparse (BM25) or hybrid with rank fusion (default: dense)
+    - **use_mmr**, **mmr_lambda**, **fetch_k**: Pick top_k diverse contexts out of fetch_k candidates
     
     Returns:
     - **answer**: The generated answer
     - **contexts**: List of relevant context snippets (original)
     - **scores**: Similarity scores for each context
+    - **timings**: Seconds per stage; parallel_saved is the wall-clock saved by overlapping expansion and retrieval
     - **expanded_query**: Expanded query if query expansion was used
     - **summarized_contexts**: AI-condensed contexts if summarization was used
     - **original_context_length**: Total characters in original contexts
@@ -143,118 +655,310 @@ async def query_endpoint(req: QueryRequest):
             detail="query is required and cannot be empty"
         )
     
-    # Ensure top_k is positive
-    top_k = max(1, req.top_k) if req.top_k else 5
+    try:
+        # Identical questions asked at the same time share one pipeline run
+        result = await SINGLE_FLIGHT.do(
+            flight_key("query", req.query, req.model_dump(exclude={"query"})), lambda: answer_query(req)
+        )
+        if result.timings:
+            response.headers["Server-Timing"] = server_timing(result.timings)
+        return result
     
-    # Increase top_k for better recall, we'll filter later
-    retrieval_k = top_k * 2
+    except HTTPException:
+        raise
+    except Exception as e:
+        # Log the error but return a proper response
+        logger.exception("Error processing query: %s", e)
+        record_error("query")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error processing query: {str(e)}"
+        )
+
+
+async def shared_stage(
+    key: Tuple, timings: Dict[str, float], stage: Callable[[Dict[str, float]], Awaitable[Any]]
+) -> Any:
+    """Run a pipeline stage once for identical concurrent requests; each caller still gets the stage timings."""
+    async def run():
+        stage_timings: Dict[str, float] = {}
+        return await stage(stage_timings), stage_timings
     
+    result, stage_timings = await SINGLE_FLIGHT.do(key, run)
+    timings.update(stage_timings)
+    return result
+
+
+async def answer_query(req: QueryRequest) -> QueryResponse:
+    if not (settings.SEMANTIC_CACHE_ENABLED and req.use_cache):
+        return await run_query(req)
+    
+    # Semantic cache: near-identical questions with the same parameters reuse the stored answer
+    start = time.perf_counter()
+    timings: Dict[str, float] = {}
+    query_embedding = await timed(EMBEDDINGS.aembed_query(req.query), timings, "embedding")
+    params = cache_params(req)
+    generation = SEMANTIC_CACHE.generation
+    cached = SEMANTIC_CACHE.lookup(query_embedding, params)
+    if cached is not None:
+        record_timings("query", timings)
+        record_request("query", "cache_hit")
+        return QueryResponse(**cached)
+    
+    response = await run_query(req, query_embedding, timings=timings, start=start)
+    SEMANTIC_CACHE.store(query_embedding, params, response.model_dump(exclude={"timings"}), generation)
+    return response
+
+
+async def stream_cached(response: QueryResponse):
+    yield sse_event("contexts", response.model_dump(include={"contexts", "scores", "metadata"}))
+    yield sse_event("token", {"text": response.answer})
+    yield sse_event("done", {"answer": response.answer, "timings": {}, "cached": True})
+
+
+@router.post("/stream", status_code=status.HTTP_200_OK)
+async def query_stream_endpoint(req: QueryRequest):
+    """
+    Streaming variant of the query endpoint, as Server-Sent Events.
+    
+    Takes the same body as `/query`. Events, each with a JSON `data` line:
+    - **contexts**: `contexts`, `scores` and `metadata` as soon as retrieval finishes; sent again
+      with the condensed contexts when summarization is enabled (the last one wins)
+    - **token**: `text` of the answer chunks received from the LLM, coalesced over
+      STREAM_COALESCE_WINDOW_MS
+    - **done**: the final `answer`, per-stage `timings` (seconds) and the `stream` frame counters
+    - **error**: `status_code` and `detail` if the pipeline fails after streaming started
+    
+    Validation and retrieval errors (e.g. no documents found) are returned as regular HTTP errors.
+    """
+    if not req.query or req.query.strip() == "":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="query is required and cannot be empty"
+        )
+    
+    timings: Dict[str, float] = {}
+    start = time.perf_counter()
+    query_embedding = None
+    generation = SEMANTIC_CACHE.generation
+    # Identical concurrent streams share retrieval, summarization and the LLM token stream
+    key = flight_key("query/stream", req.query, req.model_dump(exclude={"query"}))
     try:
-        # Query expansion (optional)
-        search_query = req.query
-        expanded_query = None
+        if uses_cache(req):
+            query_embedding = await timed(EMBEDDINGS.aembed_query(req.query), timings, "embedding")
+            cached = SEMANTIC_CACHE.lookup(query_embedding, cache_params(req))
+            if cached is not None:
+                record_timings("query_stream", timings)
+                record_request("query_stream", "cache_hit")
+                return StreamingResponse(
+                    stream_cached(QueryResponse(**cached)), media_type="text/event-stream", headers=SSE_HEADERS
+                )
         
-        if req.use_query_expansion:
-            expanded_query = expand_medical_query(req.query, LLM)
-            search_query = expanded_query
-        
-        # Retrieve relevant documents with scores
-        retrieved_docs_with_scores = VECTOR_STORE.similarity_search_with_score(
-            search_query, 
-            k=retrieval_k
+        contexts, scores, metadata, token_counts = await shared_stage(
+            (*key, "retrieve"), timings, lambda stage_timings: retrieve_stage(req, stage_timings, query_embedding)
         )
-        
-        # Filter by score threshold and sort by score (higher is better for most embeddings)
-        # Note: Qdrant returns scores where higher is better
-        filtered_results = [
-            (doc, score) for doc, score in retrieved_docs_with_scores
-            if score >= req.score_threshold
-        ]
-        
-        # Sort by score descending and take top_k
-        filtered_results.sort(key=lambda x: x[1], reverse=True)
-        filtered_results = filtered_results[:top_k]
-        
-        if not filtered_results:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"No documents found with similarity score >= {req.score_threshold}"
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error processing query: %s", e)
+        record_error("query_stream")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error processing query: {str(e)}"
+        )
+    
+    # Only the stages finished before the body starts fit in the header
+    headers = {**SSE_HEADERS, "Server-Timing": server_timing(timings)}
+    stats = STREAM_STATS.open("query/stream")
+
+    async def answer_chunks(summarized: List[str]):
+        parts = []
+        async for text in agenerate_text_chunks(agenerate(generation_state(req, summarized, token_counts))):
+            parts.append(text)
+            yield text
+        # Once per shared stream, not once per subscriber
+        if query_embedding is not None:
+            response = QueryResponse(
+                answer=final_answer("".join(parts)), contexts=summarized, scores=scores, metadata=metadata
             )
-        
-        # Extract documents and scores
-        retrieved_docs = [doc for doc, score in filtered_results]
-        scores = [float(score) for doc, score in filtered_results]
-        
-        # Extract metadata from documents
-        metadata_list = [doc.metadata for doc in retrieved_docs]
-        
-        # Extract context snippets as plain strings, clean and deduplicate
-        raw_contexts = [doc.page_content for doc in retrieved_docs]
-        
-        # Clean unicode escape sequences and normalize whitespace
-        cleaned_contexts = []
-        seen = set()
-        cleaned_scores = []
-        cleaned_metadata = []
-        
-        for idx, ctx in enumerate(raw_contexts):
-            # Remove unicode soft hyphens and other special chars
-            cleaned = ctx.replace('\u00ad', '').replace('\xa0', ' ')
-            # Normalize whitespace
-            cleaned = ' '.join(cleaned.split())
-            # Deduplicate
-            if cleaned not in seen and cleaned.strip():
-                seen.add(cleaned)
-                cleaned_contexts.append(cleaned)
-                cleaned_scores.append(scores[idx])
-                cleaned_metadata.append(metadata_list[idx])
-        
-        contexts = cleaned_contexts
-        final_scores = cleaned_scores
-        final_metadata = cleaned_metadata
-        
-        # AI Context Summarization (optional)
-        contexts_for_answer = contexts  # Default to original contexts
-        
-        if req.summarize_context:
-            summarized_contexts = summarize_contexts(req.query, contexts, LLM)
+            SEMANTIC_CACHE.store(
+                query_embedding, cache_params(req), response.model_dump(exclude={"timings"}), generation
+            )
+
+    async def stream():
+        yield sse_event("contexts", {"contexts": contexts, "scores": scores, "metadata": metadata})
+        timings["first_event"] = time.perf_counter() - start
+        try:
+            summarized = await shared_stage(
+                (*key, "summarize"),
+                timings,
+                lambda stage_timings: summarize_stage(req, contexts, token_counts, stage_timings, query_embedding),
+            )
+            if summarized != contexts:
+                yield sse_event("contexts", {"contexts": summarized, "scores": scores, "metadata": metadata})
             
-            # Use summarized contexts for answer generation AND response
-            contexts_for_answer = summarized_contexts
-            contexts = summarized_contexts  # Replace contexts with summarized version
+            parts = []
+            generate_start = time.perf_counter()
+            chunks = SINGLE_FLIGHT.stream((*key, "generate"), lambda: answer_chunks(summarized))
+            async for text in coalesce(chunks, stats=stats):
+                if not parts:
+                    timings["first_token"] = time.perf_counter() - start
+                parts.append(text)
+                yield sse_event("token", {"text": text})
+            timings["generate"] = time.perf_counter() - generate_start
+            timings["total"] = time.perf_counter() - start
+            record_timings("query_stream", timings)
+            record_tokens("query_stream", context=sum(token_counts))
+            record_request("query_stream")
             
-            # Create documents with summarized content
-            from langchain_core.documents import Document
-            retrieved_docs = [Document(page_content=ctx, metadata={}) for ctx in summarized_contexts]
-        
-        # Generate answer using RAG
-        state = {
-            'question': req.query,  # Use original query for answer generation
-            'context': retrieved_docs,
-            'answer': ''
-        }
+            yield sse_event(
+                "done",
+                {"answer": final_answer("".join(parts)), "timings": timings, "cached": False, "stream": stats.snapshot()},
+            )
         
-        # Generate answer synchronously
-        message = generate_sync(state)
-        answer = message.content if hasattr(message, 'content') else str(message)
+        except Exception as e:
+            logger.exception("Error streaming query: %s", e)
+            record_error("query_stream")
+            yield sse_error(status.HTTP_500_INTERNAL_SERVER_ERROR, f"Error processing query: {str(e)}")
+    
+    return StreamingResponse(track_frames(stream(), stats), media_type="text/event-stream", headers=headers)
+
+
+def uses_cache(req: QueryRequest) -> bool:
+    return settings.SEMANTIC_CACHE_ENABLED and req.use_cache
+
+
+def uses_dense_prefetch(req: QueryRequest) -> bool:
+    """Whether the request's dense search can run on the original query's embedding."""
+    return not req.use_query_expansion and req.retrieval_mode != "sparse"
+
+
+async def answer_batch_item(
+    index: int,
+    req: QueryRequest,
+    query_embedding: Optional[List[float]],
+    prefetched: Optional[List[Tuple[Document, float]]],
+    semaphore: asyncio.Semaphore,
+    generation: int,
+) -> BatchQueryResult:
+    """Answer one question of a batch, reporting failures in the result instead of raising."""
+    try:
+        async with semaphore:
+            response = await run_query(req, query_embedding, prefetched, pipeline="query_batch")
+        if uses_cache(req):
+            SEMANTIC_CACHE.store(
+                query_embedding, cache_params(req), response.model_dump(exclude={"timings"}), generation
+            )
+        return BatchQueryResult(index=index, status_code=status.HTTP_200_OK, response=response)
+    except HTTPException as e:
+        return BatchQueryResult(index=index, status_code=e.status_code, error=str(e.detail))
+    except Exception as e:
+        logger.exception("Error processing batch query %s: %s", index, e)
+        record_error("query_batch")
+        return BatchQueryResult(
+            index=index,
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            error=f"Error processing query: {str(e)}"
+        )
+
+
+async def resolved(result: BatchQueryResult) -> BatchQueryResult:
+    return result
+
+
+@router.post("/batch", status_code=status.HTTP_200_OK)
+async def batch_query_endpoint(batch: BatchQueryRequest):
+    """
+    Answer many questions in one call, streamed back as NDJSON (one `BatchQueryResult` per line).
+    
+    - **queries**: List of `/query` request bodies (required)
+    - **concurrency**: Max questions in the generation stage at once (default: QUERY_BATCH_CONCURRENCY)
+    - **ordered**: Stream results in request order; by default they are streamed as they complete
+    
+    All questions are embedded in a single embeddings call and searched with a single
+    batched vector search. Questions using query expansion or sparse retrieval search on
+    their own. A failing question yields a line with its status code and error, and does
+    not affect the rest of the batch.
+    """
+    queries = batch.queries
+    if len(queries) > settings.QUERY_BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A batch can hold at most {settings.QUERY_BATCH_MAX_SIZE} queries"
+        )
+    
+    results: Dict[int, BatchQueryResult] = {}
+    for index, req in enumerate(queries):
+        if not req.query or req.query.strip() == "":
+            results[index] = BatchQueryResult(
+                index=index,
+                status_code=status.HTTP_400_BAD_REQUEST,
+                error="query is required and cannot be empty"
+            )
+    
+    generation = SEMANTIC_CACHE.generation
+    try:
+        # One embeddings call for every question that needs its embedding
+        to_embed = [
+            index for index, req in enumerate(queries)
+            if index not in results and (uses_cache(req) or uses_dense_prefetch(req))
+        ]
+        embeddings = dict(zip(to_embed, await aembed_queries([queries[index].query for index in to_embed])))
         
-        # Ensure answer is a string and not empty
-        if not answer or answer.strip() == "":
-            answer = "I don't have enough information to answer this question."
+        for index in to_embed:
+            req = queries[index]
+            if uses_cache(req):
+                cached = SEMANTIC_CACHE.lookup(embeddings[index], cache_params(req))
+                if cached is not None:
+                    record_request("query_batch", "cache_hit")
+                    results[index] = BatchQueryResult(
+                        index=index, status_code=status.HTTP_200_OK, response=QueryResponse(**cached)
+                    )
         
-        return QueryResponse(
-            answer=answer.strip(),
-            contexts=contexts,
-            scores=final_scores,
-            metadata=final_metadata
+        # One batched vector search for the remaining dense and hybrid questions
+        to_search = [index for index in to_embed if index not in results and uses_dense_prefetch(queries[index])]
+        hits = await asearch_by_vectors(
+            [embeddings[index] for index in to_search],
+            [retrieval_k(effective_top_k(queries[index]), queries[index].fetch_k) for index in to_search],
         )
+        prefetched = dict(zip(to_search, hits))
     
-    except HTTPException:
-        raise
     except Exception as e:
-        # Log the error but return a proper response
-        print(f"Error processing query: {str(e)}")
+        logger.exception("Error processing batch query: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error processing query: {str(e)}"
+            detail=f"Error processing batch query: {str(e)}"
         )
+    
+    semaphore = asyncio.Semaphore(batch.concurrency or settings.QUERY_BATCH_CONCURRENCY)
+    
+    async def stream():
+        tasks = [
+            asyncio.ensure_future(
+                resolved(results[index]) if index in results
+                else answer_batch_item(
+                    index, req, embeddings.get(index), prefetched.get(index), semaphore, generation
+                )
+            )
+            for index, req in enumerate(queries)
+        ]
+        try:
+            for task in (tasks if batch.ordered else asyncio.as_completed(tasks)):
+                result = await task
+                yield result.model_dump_json() + "\n"
+        finally:
+            # Client went away: stop generating answers nobody will read
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@router.get("/cache-stats", status_code=status.HTTP_200_OK)
+async def cache_stats():
+    """
+    Hit/miss counters and size of the semantic answer cache, and how many in-flight
+    computations identical concurrent requests shared.
+    """
+    return {**SEMANTIC_CACHE.stats(), "single_flight": SINGLE_FLIGHT.stats()}
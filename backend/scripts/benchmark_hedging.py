@@ -0,0 +1,137 @@
+"""
+Tail latency of hedged LLM routing, measured with local fake providers.
+
+Two `FakeChatModel`s stand in for the providers: a fast primary whose calls are
+occasionally very slow (--slow-rate, --slow-ms) or fail (--error-rate), and a
+slightly slower but steady secondary. The same questions are answered by:
+
+- single:   the primary alone
+- failover: a `HedgedChatModel` over both, hedging disabled
+- hedged:   a `HedgedChatModel` over both, hedging after the primary's p95
+
+and the p50/p95/p99 latency (time to first chunk with --stream), errors and the
+router's counters are printed per setup. No network calls are made.
+
+Usage (from the backend folder):
+    python -m scripts.benchmark_hedging --requests 500 --slow-rate 0.05 --slow-ms 2000
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from typing import Dict, List
+
+# The app's settings are not needed: only the models are used
+from app.core.fakes import FakeChatModel
+from app.core.router import HedgedChatModel
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def providers(args) -> Dict[str, FakeChatModel]:
+    common = {"token_latency_ms": args.token_latency_ms, "answer_tokens": args.answer_tokens, "jitter_ms": args.jitter_ms}
+    return {
+        "primary": FakeChatModel(
+            latency_ms=args.primary_latency_ms, slow_rate=args.slow_rate, slow_ms=args.slow_ms,
+            error_rate=args.error_rate, seed=1, **common
+        ),
+        "secondary": FakeChatModel(latency_ms=args.secondary_latency_ms, seed=2, **common),
+    }
+
+
+async def measure(model, questions: List[str], concurrency: int, stream: bool) -> Dict:
+    latencies: List[float] = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(question: str) -> None:
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                if stream:
+                    async for _ in model.astream(question):
+                        latencies.append(time.perf_counter() - start)
+                        break
+                else:
+                    await model.ainvoke(question)
+                    latencies.append(time.perf_counter() - start)
+            except Exception:
+                errors += 1
+
+    await asyncio.gather(*(one(question) for question in questions))
+    return {
+        "requests": len(questions),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1) if latencies else None,
+    }
+
+
+async def run(args) -> Dict:
+    questions = [f"Question {index}: what is the recommended dose?" for index in range(args.requests)]
+    warmup = [f"Warm-up {index}: what is the recommended dose?" for index in range(args.warmup)]
+    results = {}
+    for setup in ("single", "failover", "hedged"):
+        models = providers(args)
+        if setup == "single":
+            model = models["primary"]
+        else:
+            model = HedgedChatModel(
+                models=models,
+                hedge=setup == "hedged",
+                hedge_percentile=args.hedge_percentile,
+                min_samples=args.min_samples,
+            )
+        # Fill the latency windows the hedge delay is computed from
+        await measure(model, warmup, args.concurrency, args.stream)
+        row = await measure(model, questions, args.concurrency, args.stream)
+        if isinstance(model, HedgedChatModel):
+            stats = model.stats()
+            row.update({key: stats[key] for key in ("hedges", "hedge_wins", "failovers")})
+        results[setup] = row
+    return results
+
+
+def main(args) -> int:
+    results = asyncio.run(run(args))
+    metric = "first chunk" if args.stream else "answer"
+    print(f"{args.requests} requests, latency to {metric}\n", file=sys.stderr)
+    print(f"{'setup':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7} {'hedges':>7} {'won':>5}", file=sys.stderr)
+    for setup, row in results.items():
+        print(
+            f"{setup:>10} {row['p50_ms'] or float('nan'):>9.1f} {row['p95_ms'] or float('nan'):>9.1f} "
+            f"{row['p99_ms'] or float('nan'):>9.1f} {row['errors']:>7} {row.get('hedges', '-'):>7} "
+            f"{row.get('hedge_wins', '-'):>5}",
+            file=sys.stderr,
+        )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": {k: v for k, v in vars(args).items() if k != "output"}, "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=50, help="Unmeasured requests run first")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--stream", action="store_true", help="Measure time to first chunk of astream")
+    parser.add_argument("--primary-latency-ms", type=float, default=100.0)
+    parser.add_argument("--secondary-latency-ms", type=float, default=150.0)
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--token-latency-ms", type=float, default=2.0)
+    parser.add_argument("--answer-tokens", type=int, default=20)
+    parser.add_argument("--slow-rate", type=float, default=0.05, help="Share of primary calls that stall")
+    parser.add_argument("--slow-ms", type=float, default=2000.0, help="Extra latency of a stalled call")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of primary calls that fail")
+    parser.add_argument("--hedge-percentile", type=float, default=95.0)
+    parser.add_argument("--min-samples", type=int, default=20)
+    parser.add_argument("--output", help="Also write the results as JSON here")
+    sys.exit(main(parser.parse_args()))
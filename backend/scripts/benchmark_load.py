@@ -0,0 +1,419 @@
+"""
+Offline load benchmark of the whole backend, with no paid API calls.
+
+Starts the real app under uvicorn in a subprocess with the fake provider
+(USE_FAKE_PROVIDER: deterministic LLM and embeddings with configurable latency
+and jitter) and a throwaway vector store (the in-process numpy store, or Qdrant's
+in-memory local mode), seeds it with a generated corpus, then drives each
+scenario at every concurrency level, closed-loop:
+
+- query:       POST /api/v1/query
+- chat_stream: POST /api/v1/chat/rag/stream (time to first byte = first token)
+- chat_ws:     /api/v1/chat/rag/ws, one connection per concurrent client
+- ingest:      POST /api/v1/ingest/upload-file with a fresh generated .txt file
+
+Results (p50/p95/p99 latency, throughput, errors and the server's peak RSS) are
+written as JSON, so two versions can be compared with --compare.
+
+Usage (from the backend folder):
+    python -m scripts.benchmark_load --levels 1 10 50 --requests 200 --output after.json
+    python -m scripts.benchmark_load --output after.json --compare before.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+SCENARIOS = ["query", "chat_stream", "chat_ws", "ingest"]
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The app needs a full Settings object at import time; provide harmless defaults.
+SETTINGS_DEFAULTS = {
+    "PROJECT_NAME": "load-benchmark",
+    "FIRST_SUPERUSER": "admin@example.com",
+    "FIRST_SUPERUSER_PASSWORD": "load-benchmark",
+    "FIRST_SUPERUSER_FIRST_NAME": "Load",
+    "FIRST_SUPERUSER_LAST_NAME": "Benchmark",
+    "JWT_USER": "jwt@example.com",
+    "JWT_USER_PASSWORD": "load-benchmark",
+    "JWT_USER_FIRST_NAME": "Load",
+    "JWT_USER_LAST_NAME": "Benchmark",
+    "TIME_ZONE": "UTC",
+    "QDRANT_COLLECTION_NAME": "load_benchmark",
+    "QDRANT_API_KEY": "load-benchmark",
+}
+
+VOCABULARY = (
+    "aspirin ibuprofen paracetamol hypertension diabetes insulin asthma inhaler fever infection "
+    "antibiotic dose tablet daily adults children kidney liver heart blood pressure glucose "
+    "cholesterol statin vaccine allergy symptom treatment therapy chronic acute pain nausea "
+    "migraine stroke cancer screening diagnosis risk patient clinical guideline first-line"
+).split()
+
+
+def sentence(rng: random.Random) -> str:
+    words = [rng.choice(VOCABULARY) for _ in range(rng.randint(8, 16))]
+    return " ".join(words).capitalize() + "."
+
+
+def document(rng: random.Random, paragraphs: int) -> str:
+    return "\n\n".join(
+        " ".join(sentence(rng) for _ in range(rng.randint(3, 6))) for _ in range(paragraphs)
+    )
+
+
+def question(rng: random.Random) -> str:
+    return "What is the " + " ".join(rng.choice(VOCABULARY) for _ in range(6)) + "?"
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(values: List[float]) -> Optional[Dict[str, float]]:
+    if not values:
+        return None
+    return {
+        "p50": round(percentile(values, 50) * 1000, 2),
+        "p95": round(percentile(values, 95) * 1000, 2),
+        "p99": round(percentile(values, 99) * 1000, 2),
+        "max": round(max(values) * 1000, 2),
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Server:
+    """The app under uvicorn in a child process, so its RSS is measured on its own."""
+
+    def __init__(self, args, workdir: str):
+        self.port = free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        env = {**os.environ}
+        for key, value in SETTINGS_DEFAULTS.items():
+            env.setdefault(key, value)
+        env.update({
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(workdir, 'app.db')}",
+            "USE_FAKE_PROVIDER": "true",
+            "FAKE_LLM_LATENCY_MS": str(args.llm_latency_ms),
+            "FAKE_LLM_TOKEN_LATENCY_MS": str(args.token_latency_ms),
+            "FAKE_LLM_ANSWER_TOKENS": str(args.answer_tokens),
+            "FAKE_EMBEDDINGS_LATENCY_MS": str(args.embed_latency_ms),
+            "FAKE_LATENCY_JITTER_MS": str(args.jitter_ms),
+            "FAKE_SEED": str(args.seed),
+            "SPARSE_INDEX_PATH": os.path.join(workdir, "sparse_index.sqlite"),
+            "EMBEDDINGS_CACHE_PATH": os.path.join(workdir, "embeddings_cache.sqlite"),
+            "EMBEDDINGS_CACHE_ENABLED": str(args.caches).lower(),
+            "SEMANTIC_CACHE_ENABLED": str(args.caches).lower(),
+        })
+        if args.vector_store == "numpy":
+            env.update({"VECTOR_STORE_BACKEND": "numpy", "NUMPY_VECTOR_STORE_PATH": os.path.join(workdir, "vectors")})
+        else:
+            env.update({"VECTOR_STORE_BACKEND": "qdrant", "QDRANT_URL": ":memory:"})
+        env.setdefault("QDRANT_URL", "http://localhost:6333")
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app",
+             "--host", "127.0.0.1", "--port", str(self.port), "--log-level", "warning"],
+            cwd=BACKEND_DIR,
+            env=env,
+            stdout=subprocess.DEVNULL,
+        )
+
+    async def wait_ready(self, timeout: float = 60.0) -> None:
+        deadline = time.monotonic() + timeout
+        async with httpx.AsyncClient(base_url=self.base_url) as client:
+            while time.monotonic() < deadline:
+                if self.process.poll() is not None:
+                    raise RuntimeError(f"Server exited with status {self.process.returncode}")
+                try:
+                    if (await client.get("/health-check")).status_code == 200:
+                        return
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.1)
+        raise RuntimeError("Server did not become ready")
+
+    def _status(self, field: str) -> Optional[float]:
+        try:
+            with open(f"/proc/{self.process.pid}/status") as f:
+                for line in f:
+                    if line.startswith(field + ":"):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            return None
+        return None
+
+    def reset_peak_rss(self) -> None:
+        # Linux: writing 5 to clear_refs resets VmHWM, so each scenario gets its own peak
+        try:
+            with open(f"/proc/{self.process.pid}/clear_refs", "w") as f:
+                f.write("5")
+        except OSError:
+            pass
+
+    def peak_rss_mb(self) -> Optional[float]:
+        peak = self._status("VmHWM")
+        return round(peak, 1) if peak is not None else None
+
+    def stop(self) -> Optional[float]:
+        """Stop the server; returns its lifetime peak RSS where only the OS can tell (non-Linux)."""
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        try:
+            import resource
+            peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+            # Kilobytes on Linux, bytes on macOS
+            return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+        except ImportError:
+            return None
+
+
+async def query_once(client: httpx.AsyncClient, rng: random.Random, sample: Dict) -> None:
+    response = await client.post("/api/v1/query", json={"query": question(rng)})
+    response.raise_for_status()
+
+
+async def chat_stream_once(client: httpx.AsyncClient, rng: random.Random, sample: Dict) -> None:
+    start = time.perf_counter()
+    async with client.stream("POST", "/api/v1/chat/rag/stream", json={"prompt": question(rng)}) as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_raw():
+            if chunk and "first_token" not in sample:
+                sample["first_token"] = time.perf_counter() - start
+
+
+def ingest_once(paragraphs: int):
+    async def once(client: httpx.AsyncClient, rng: random.Random, sample: Dict) -> None:
+        text = document(rng, paragraphs).encode("utf-8")
+        response = await client.post(
+            "/api/v1/ingest/upload-file", files={"file": (f"doc-{rng.random():.12f}.txt", text, "text/plain")}
+        )
+        response.raise_for_status()
+    return once
+
+
+def chat_ws_once(base_url: str):
+    from websockets.asyncio.client import connect
+
+    ws_url = base_url.replace("http://", "ws://", 1) + "/api/v1/chat/rag/ws"
+    connections: Dict[int, object] = {}
+
+    async def once(client: httpx.AsyncClient, rng: random.Random, sample: Dict) -> None:
+        # One socket per concurrent client, reused across its requests like a chat UI
+        worker = sample["worker"]
+        if worker not in connections:
+            connections[worker] = await connect(ws_url, max_size=None)
+        socket_ = connections[worker]
+        request_id = str(sample["index"])
+        start = time.perf_counter()
+        await socket_.send(json.dumps({"type": "prompt", "id": request_id, "prompt": question(rng)}))
+        while True:
+            frame = json.loads(await socket_.recv())
+            if frame.get("id") != request_id:
+                continue
+            if frame["type"] == "token" and "first_token" not in sample:
+                sample["first_token"] = time.perf_counter() - start
+            elif frame["type"] == "end":
+                return
+            elif frame["type"] in ("error", "cancelled"):
+                raise RuntimeError(frame.get("detail", frame["type"]))
+
+    async def close() -> None:
+        await asyncio.gather(*(socket_.close() for socket_ in connections.values()), return_exceptions=True)
+        connections.clear()
+
+    once.close = close
+    return once
+
+
+async def run_level(client: httpx.AsyncClient, once, concurrency: int, requests: int, seed: int) -> Dict:
+    latencies: List[float] = []
+    first_tokens: List[float] = []
+    errors: List[str] = []
+    counter = iter(range(requests))
+
+    async def worker(worker_id: int) -> None:
+        for index in counter:
+            # A fresh question per request: caches and single-flight sharing don't hide the work
+            rng = random.Random(f"{seed}:{concurrency}:{index}")
+            sample = {"worker": worker_id, "index": index}
+            start = time.perf_counter()
+            try:
+                await once(client, rng, sample)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+                continue
+            latencies.append(time.perf_counter() - start)
+            if "first_token" in sample:
+                first_tokens.append(sample["first_token"])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(worker_id) for worker_id in range(concurrency)))
+    wall = time.perf_counter() - start
+    if hasattr(once, "close"):
+        await once.close()
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "throughput_rps": round(len(latencies) / wall, 2),
+        "latency_ms": summarize(latencies),
+        "first_token_ms": summarize(first_tokens),
+    }
+
+
+async def seed_corpus(client: httpx.AsyncClient, documents: int, paragraphs: int, seed: int) -> float:
+    rng = random.Random(f"{seed}:corpus")
+    corpus = "\n\n".join(document(rng, paragraphs) for _ in range(documents)).encode("utf-8")
+    start = time.perf_counter()
+    response = await client.post(
+        "/api/v1/ingest/upload-file", files={"file": ("corpus.txt", corpus, "text/plain")}
+    )
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def benchmark(args) -> Dict:
+    with tempfile.TemporaryDirectory(prefix="benchmark-load-") as workdir:
+        server = Server(args, workdir)
+        results = []
+        try:
+            await server.wait_ready()
+            limits = httpx.Limits(max_connections=max(args.levels) + 10, max_keepalive_connections=max(args.levels))
+            async with httpx.AsyncClient(base_url=server.base_url, limits=limits, timeout=args.timeout) as client:
+                seed_seconds = await seed_corpus(client, args.corpus_docs, args.paragraphs, args.seed)
+                for scenario in args.scenarios:
+                    once = {
+                        "query": lambda: query_once,
+                        "chat_stream": lambda: chat_stream_once,
+                        "chat_ws": lambda: chat_ws_once(server.base_url),
+                        "ingest": lambda: ingest_once(args.paragraphs),
+                    }[scenario]
+                    # Warm-up request, so imports and first connections don't skew the first level
+                    await run_level(client, once(), 1, 1, args.seed + 1)
+                    for level in args.levels:
+                        server.reset_peak_rss()
+                        row = await run_level(client, once(), level, args.requests, args.seed)
+                        row = {"scenario": scenario, **row, "peak_rss_mb": server.peak_rss_mb()}
+                        results.append(row)
+                        print(format_row(row), file=sys.stderr)
+        finally:
+            lifetime_peak = server.stop()
+
+    return {
+        "meta": {
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+            "seed_corpus_seconds": round(seed_seconds, 3),
+            "server_peak_rss_mb": lifetime_peak,
+        },
+        "results": results,
+    }
+
+
+HEADER = f"{'scenario':>12} {'conc':>5} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ttft p50':>9} {'errors':>7} {'rss MB':>8}"
+
+
+def format_row(row: Dict) -> str:
+    latency = row["latency_ms"] or {}
+    first_token = row["first_token_ms"] or {}
+    return (
+        f"{row['scenario']:>12} {row['concurrency']:>5} {row['throughput_rps']:>9.1f} "
+        f"{latency.get('p50', float('nan')):>9.1f} {latency.get('p95', float('nan')):>9.1f} "
+        f"{latency.get('p99', float('nan')):>9.1f} {first_token.get('p50', float('nan')):>9.1f} "
+        f"{row['errors']:>7} {row['peak_rss_mb'] or float('nan'):>8.1f}"
+    )
+
+
+def compare(report: Dict, baseline: Dict) -> None:
+    """Print throughput and p95 changes against a previous report, per scenario and level."""
+    previous = {(row["scenario"], row["concurrency"]): row for row in baseline["results"]}
+    print(f"\nvs {baseline['meta'].get('git_commit') or 'baseline'}:", file=sys.stderr)
+    print(f"{'scenario':>12} {'conc':>5} {'req/s':>10} {'p95':>10} {'rss':>10}", file=sys.stderr)
+
+    def change(new, old) -> str:
+        if not new or not old:
+            return "n/a"
+        return f"{(new - old) / old * 100:+.1f}%"
+
+    for row in report["results"]:
+        old = previous.get((row["scenario"], row["concurrency"]))
+        if old is None:
+            continue
+        print(
+            f"{row['scenario']:>12} {row['concurrency']:>5} "
+            f"{change(row['throughput_rps'], old['throughput_rps']):>10} "
+            f"{change((row['latency_ms'] or {}).get('p95'), (old['latency_ms'] or {}).get('p95')):>10} "
+            f"{change(row['peak_rss_mb'], old['peak_rss_mb']):>10}",
+            file=sys.stderr,
+        )
+
+
+def main(args) -> int:
+    print(HEADER, file=sys.stderr)
+    report = asyncio.run(benchmark(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(report, json.load(f))
+    return 1 if any(row["errors"] for row in report["results"]) else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 10, 50], help="Concurrent clients")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per scenario and level")
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0, help="Fake LLM time to first token")
+    parser.add_argument("--token-latency-ms", type=float, default=5.0, help="Fake LLM time per further token")
+    parser.add_argument("--answer-tokens", type=int, default=40)
+    parser.add_argument("--embed-latency-ms", type=float, default=20.0, help="Fake embeddings time per call")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform ± jitter on every fake latency")
+    parser.add_argument("--vector-store", choices=["numpy", "qdrant-memory"], default="numpy")
+    parser.add_argument("--corpus-docs", type=int, default=200, help="Documents ingested before the scenarios")
+    parser.add_argument("--paragraphs", type=int, default=3, help="Paragraphs per generated document")
+    parser.add_argument("--caches", action=argparse.BooleanOptionalAction, default=True,
+                        help="Embedding and semantic caches (questions are unique either way)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout (seconds)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="Previous JSON report to print changes against")
+    sys.exit(main(parser.parse_args()))
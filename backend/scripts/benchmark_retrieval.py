@@ -0,0 +1,78 @@
+"""
+Recall and latency benchmark for the dense, sparse (BM25) and hybrid retrieval modes.
+
+Runs every question of a JSONL dataset through `retrieve_contexts` against the
+configured vector store and sparse index. Each line holds a question and a short
+answer string; a question counts as recalled when any of the top-k contexts
+contains the answer (case-insensitive).
+
+    {"question": "What dose of aspirin is used for prevention?", "answer": "81 mg"}
+
+Usage (from the backend folder, with the usual .env):
+    python -m scripts.benchmark_retrieval data/questions.jsonl --top-k 5
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from app.views.query import retrieve_contexts
+
+MODES = ["dense", "sparse", "hybrid"]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def load_dataset(path: str):
+    with open(path, encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+    return [(row["question"], row["answer"]) for row in rows]
+
+
+async def run_mode(mode: str, dataset, top_k: int, score_threshold: float) -> dict:
+    hits = 0
+    latencies = []
+    for question, answer in dataset:
+        start = time.perf_counter()
+        results = await retrieve_contexts(question, top_k, score_threshold, retrieval_mode=mode)
+        latencies.append(time.perf_counter() - start)
+        if any(answer.lower() in doc.page_content.lower() for doc, _ in results):
+            hits += 1
+    return {
+        "mode": mode,
+        "recall": hits / len(dataset),
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+    }
+
+
+async def main(path: str, modes, top_k: int, score_threshold: float) -> int:
+    dataset = load_dataset(path)
+    if not dataset:
+        print(f"No questions in {path}")
+        return 1
+
+    # Warm up clients and caches so they don't skew the first mode.
+    await retrieve_contexts(dataset[0][0], top_k, score_threshold, retrieval_mode="hybrid")
+    results = [await run_mode(mode, dataset, top_k, score_threshold) for mode in modes]
+
+    print(f"{len(dataset)} questions, top_k={top_k}\n")
+    print(f"{'mode':>8} {f'recall@{top_k}':>10} {'p50 (ms)':>10} {'p95 (ms)':>10}")
+    for row in results:
+        print(f"{row['mode']:>8} {row['recall']:>10.3f} {row['p50_ms']:>10.1f} {row['p95_ms']:>10.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("dataset", help="JSONL file of {\"question\", \"answer\"} rows")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=MODES)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--score-threshold", type=float, default=0.0)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.dataset, args.modes, args.top_k, args.score_threshold)))
@@ -0,0 +1,94 @@
+"""
+Cold-start benchmark: import time of the app and latency of its first requests.
+
+Every run starts a fresh interpreter (like a Lambda cold start), imports
+`app.main`, then sends requests through the in-process ASGI app:
+- the first request to `--path` (default /health-check, no provider needed)
+- the time to build the configured provider's chat and embedding models (imports
+  included, no API calls)
+
+Runs are summarized as median and max. With --max-import-ms / --max-first-request-ms
+the script exits with status 1 when the median exceeds the budget, so it can guard
+cold-start regressions in CI.
+
+Usage (from the backend folder, with the usual .env):
+    python -m scripts.benchmark_startup --runs 5 --max-import-ms 1500
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Executed in a fresh interpreter per run; prints one JSON line of timings (seconds)
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+
+from fastapi.testclient import TestClient
+client = TestClient(app.main.app)
+request_start = time.perf_counter()
+response = client.request(sys.argv[1], sys.argv[2], json=json.loads(sys.argv[3]) if sys.argv[3] else None)
+first_request = time.perf_counter() - request_start
+
+from app.core.providers import PROVIDERS
+providers_start = time.perf_counter()
+PROVIDERS.llm()
+PROVIDERS.embeddings()
+providers = time.perf_counter() - providers_start
+
+print(json.dumps({
+    "import": imported - start,
+    "first_request": first_request,
+    "providers": providers,
+    "status_code": response.status_code,
+}))
+"""
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_probe(method: str, path: str, body: str) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE, method, path, body],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "probe failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(args) -> int:
+    runs = [run_probe(args.method, args.path, args.body) for _ in range(args.runs)]
+    statuses = {run["status_code"] for run in runs}
+
+    print(f"{args.runs} cold starts, first request {args.method} {args.path} -> {sorted(statuses)}\n")
+    print(f"{'stage':>16} {'median (ms)':>12} {'max (ms)':>10}")
+    medians = {}
+    for stage in ("import", "first_request", "providers"):
+        values = [run[stage] * 1000 for run in runs]
+        medians[stage] = statistics.median(values)
+        print(f"{stage:>16} {medians[stage]:>12.1f} {max(values):>10.1f}")
+
+    failed = False
+    for stage, budget in (("import", args.max_import_ms), ("first_request", args.max_first_request_ms)):
+        if budget is not None and medians[stage] > budget:
+            print(f"\n{stage} median {medians[stage]:.1f} ms exceeds the {budget:.1f} ms budget")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--method", default="GET")
+    parser.add_argument("--path", default="/health-check")
+    parser.add_argument("--body", default="", help="JSON request body")
+    parser.add_argument("--max-import-ms", type=float, default=None)
+    parser.add_argument("--max-first-request-ms", type=float, default=None)
+    sys.exit(main(parser.parse_args()))
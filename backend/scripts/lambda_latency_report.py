@@ -0,0 +1,101 @@
+"""
+Cold/warm latency report for the Lambda handler, with and without INIT preloading.
+
+Each sample simulates one Lambda container in a fresh interpreter: `app.main` is
+imported with AWS_LAMBDA_FUNCTION_NAME set (the INIT phase, where LAMBDA_PRELOAD
+builds clients and opens connections), then `app.main.handler` is invoked with API
+Gateway v2 events: the first request (cold), a warm-up ping, and `--warm` more
+requests (warm). Real providers and Qdrant from the usual .env are used.
+
+Usage (from the backend folder):
+    python -m scripts.lambda_latency_report --samples 3 --warm 5
+    python -m scripts.lambda_latency_report --method GET --path /api/v1/ingest/collection-info
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Executed in a fresh interpreter per sample; prints one JSON line of timings (seconds)
+PROBE = """
+import json, sys, time
+method, path, body, warm = sys.argv[1], sys.argv[2], sys.argv[3], int(sys.argv[4])
+
+start = time.perf_counter()
+import app.main
+init = time.perf_counter() - start
+
+def invoke():
+    event = {
+        "version": "2.0",
+        "routeKey": "$default",
+        "rawPath": path,
+        "rawQueryString": "",
+        "headers": {"content-type": "application/json", "host": "localhost"},
+        "requestContext": {"http": {"method": method, "path": path, "sourceIp": "127.0.0.1", "protocol": "HTTP/1.1"}},
+        "body": body,
+        "isBase64Encoded": False,
+    }
+    start = time.perf_counter()
+    response = app.main.handler(event, None)
+    return time.perf_counter() - start, response
+
+cold, response = invoke()
+start = time.perf_counter()
+app.main.handler({"warmup": True}, None)
+ping = time.perf_counter() - start
+warm_latencies = [invoke()[0] for _ in range(warm)]
+
+print(json.dumps({
+    "init": init,
+    "cold": cold,
+    "ping": ping,
+    "warm": warm_latencies,
+    "status_code": response["statusCode"],
+    "cold_start_header": response["headers"].get("x-cold-start"),
+}))
+"""
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_sample(preload: bool, args) -> dict:
+    env = {**os.environ, "AWS_LAMBDA_FUNCTION_NAME": "latency-report", "LAMBDA_PRELOAD": str(preload).lower()}
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE, args.method, args.path, args.body, str(args.warm)],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "probe failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(args) -> int:
+    print(f"{args.method} {args.path}, {args.samples} containers per mode, {args.warm} warm requests each\n")
+    print(f"{'mode':>8} {'init (ms)':>10} {'cold (ms)':>10} {'init+cold':>10} {'ping (ms)':>10} {'warm p50':>10} {'status':>7}")
+    for preload in (False, True):
+        samples = [run_sample(preload, args) for _ in range(args.samples)]
+        init = statistics.median(sample["init"] for sample in samples) * 1000
+        cold = statistics.median(sample["cold"] for sample in samples) * 1000
+        ping = statistics.median(sample["ping"] for sample in samples) * 1000
+        warm = [latency for sample in samples for latency in sample["warm"]]
+        warm_p50 = statistics.median(warm) * 1000 if warm else float("nan")
+        statuses = ",".join(sorted({str(sample["status_code"]) for sample in samples}))
+        mode = "preload" if preload else "lazy"
+        print(f"{mode:>8} {init:>10.1f} {cold:>10.1f} {init + cold:>10.1f} {ping:>10.1f} {warm_p50:>10.1f} {statuses:>7}")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=3)
+    parser.add_argument("--warm", type=int, default=5)
+    parser.add_argument("--method", default="POST")
+    parser.add_argument("--path", default="/query")
+    parser.add_argument("--body", default=json.dumps({"query": "What is aspirin used for?"}))
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,139 @@
+"""
+Concurrency load test for the /query pipeline.
+
+Runs the real FastAPI app in-process (no network) with fake LLM and vector store
+objects that sleep for a fixed latency. If any pipeline stage blocks the event loop,
+p99 grows linearly with the number of concurrent requests; with the async pipeline
+it stays roughly flat.
+
+Usage (from the backend folder):
+    python -m scripts.load_test_query --levels 1 10 50 200 --latency-ms 50
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# The app needs a full Settings object at import time; provide harmless defaults.
+for key, value in {
+    "PROJECT_NAME": "load-test",
+    "SQLALCHEMY_DATABASE_URI": "sqlite://",
+    "FIRST_SUPERUSER": "admin@example.com",
+    "FIRST_SUPERUSER_PASSWORD": "load-test",
+    "FIRST_SUPERUSER_FIRST_NAME": "Load",
+    "FIRST_SUPERUSER_LAST_NAME": "Test",
+    "JWT_USER": "jwt@example.com",
+    "JWT_USER_PASSWORD": "load-test",
+    "JWT_USER_FIRST_NAME": "Load",
+    "JWT_USER_LAST_NAME": "Test",
+    "TIME_ZONE": "UTC",
+    "QDRANT_COLLECTION_NAME": "load_test",
+    "QDRANT_API_KEY": "load-test",
+    "QDRANT_URL": "http://localhost:6333",
+    "OPENAI_API_KEY": "sk-load-test",
+}.items():
+    os.environ.setdefault(key, value)
+
+import httpx
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessage
+
+from app.core import bot
+from app.main import app
+from app.views import query as query_view
+
+
+class FakeLLM:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def invoke(self, *args, **kwargs):
+        time.sleep(self.latency)
+        return AIMessage(content="Fake answer.")
+
+    async def ainvoke(self, *args, **kwargs):
+        await asyncio.sleep(self.latency)
+        return AIMessage(content="Fake answer.")
+
+
+class FakeVectorStore:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.results = [
+            (Document(page_content=f"Fake context {i}.", metadata={"source": "fake"}), 1.0 - i / 10)
+            for i in range(10)
+        ]
+
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        time.sleep(self.latency)
+        return self.results[:k]
+
+    async def asimilarity_search_with_score(self, query, k=4, **kwargs):
+        await asyncio.sleep(self.latency)
+        return self.results[:k]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def run_level(client: httpx.AsyncClient, concurrency: int) -> dict:
+    payload = {
+        "query": "What is the first-line treatment for hypertension?",
+        "summarize_context": False,
+        "use_cache": False,
+    }
+
+    async def one():
+        start = time.perf_counter()
+        response = await client.post("/query", json=payload)
+        response.raise_for_status()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(one() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+    return {
+        "concurrency": concurrency,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "throughput_rps": concurrency / wall,
+    }
+
+
+async def main(levels, latency: float, max_growth: float) -> int:
+    llm = FakeLLM(latency)
+    query_view.LLM = llm
+    query_view.VECTOR_STORE = FakeVectorStore(latency)
+    bot.LLM = llm
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://load-test") as client:
+        # Warm up imports and route compilation so they don't skew the first level.
+        await run_level(client, 1)
+        results = [await run_level(client, level) for level in levels]
+
+    print(f"{'concurrency':>12} {'p50 (ms)':>10} {'p99 (ms)':>10} {'req/s':>10}")
+    for row in results:
+        print(f"{row['concurrency']:>12} {row['p50_ms']:>10.1f} {row['p99_ms']:>10.1f} {row['throughput_rps']:>10.1f}")
+
+    growth = results[-1]["p99_ms"] / results[0]["p99_ms"]
+    load_growth = results[-1]["concurrency"] / results[0]["concurrency"]
+    print(f"\np99 grew {growth:.1f}x while concurrency grew {load_growth:.0f}x")
+    if growth > max_growth:
+        print(f"FAIL: p99 growth exceeds {max_growth}x, something is blocking the event loop")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 10, 50, 100, 200])
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Latency of each fake provider call")
+    parser.add_argument("--max-growth", type=float, default=3.0, help="Allowed p99 growth from lowest to highest level")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.levels, args.latency_ms / 1000, args.max_growth)))
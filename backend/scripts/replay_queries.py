@@ -0,0 +1,141 @@
+"""
+Replay a query log through /query against recorded provider calls.
+
+First run the log once with `--mode record` (real providers, the usual .env): every
+LLM and embeddings call is saved to the provider cassette (PROVIDER_CASSETTE_PATH).
+Later runs with `--mode replay` build no provider model and make no provider calls;
+each call is served from the cassette after its recorded latency times
+`--latency-scale`. With `--latency-scale 0` the measured latency is only this
+backend's own work (plus the vector store), which is what --profile is for.
+
+The log is JSONL, one `/query` request body per line ({"query": "..."} at least);
+lines that are not JSON objects are taken as the question itself.
+
+Usage (from the backend folder, with the usual .env):
+    python -m scripts.replay_queries queries.jsonl --mode record
+    python -m scripts.replay_queries queries.jsonl --latency-scale 0 --profile replay.prof
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+
+def load_log(path: str) -> List[Dict]:
+    bodies = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                body = json.loads(line)
+            except ValueError:
+                body = None
+            bodies.append(body if isinstance(body, dict) else {"query": line})
+    return bodies
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+async def replay(bodies: List[Dict], concurrency: int) -> Dict:
+    import httpx
+    from app.main import app
+
+    latencies: List[float] = []
+    stages: Dict[str, List[float]] = {}
+    errors: List[str] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(client: httpx.AsyncClient, body: Dict) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post("/query", json=body)
+            elapsed = time.perf_counter() - start
+        if response.status_code != 200:
+            errors.append(f"{response.status_code}: {response.text[:200]}")
+            return
+        latencies.append(elapsed)
+        for stage, seconds in (response.json().get("timings") or {}).items():
+            stages.setdefault(stage, []).append(seconds)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://replay", timeout=None) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(client, body) for body in bodies))
+        wall = time.perf_counter() - start
+
+    from app.core.providers import PROVIDERS
+    return {
+        "requests": len(bodies),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else None,
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies) * 1000, 2),
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p95": round(percentile(latencies, 95) * 1000, 2),
+            "p99": round(percentile(latencies, 99) * 1000, 2),
+        } if latencies else None,
+        "stage_mean_ms": {stage: round(statistics.mean(values) * 1000, 2) for stage, values in stages.items()},
+        "cassette": PROVIDERS.stats()["cassette"],
+    }
+
+
+def main(args) -> int:
+    # Read by the settings when the app is imported below
+    os.environ["PROVIDER_CASSETTE_MODE"] = args.mode
+    os.environ["PROVIDER_CASSETTE_LATENCY_SCALE"] = str(args.latency_scale)
+    if args.cassette:
+        os.environ["PROVIDER_CASSETTE_PATH"] = args.cassette
+    if not args.semantic_cache:
+        # Repeated questions in the log would otherwise skip the pipeline
+        os.environ["SEMANTIC_CACHE_ENABLED"] = "false"
+    # Every embeddings call must reach the cassette (the provider layer also skips this cache)
+    os.environ["EMBEDDINGS_CACHE_ENABLED"] = "false"
+
+    bodies = load_log(args.log)
+    if not bodies:
+        print(f"No queries in {args.log}")
+        return 1
+
+    if args.profile:
+        import cProfile
+        import pstats
+        profiler = cProfile.Profile()
+        report = profiler.runcall(asyncio.run, replay(bodies, args.concurrency))
+        profiler.dump_stats(args.profile)
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(args.profile_top)
+    else:
+        report = asyncio.run(replay(bodies, args.concurrency))
+
+    report = {"mode": args.mode, "latency_scale": args.latency_scale, "concurrency": args.concurrency, **report}
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    print(output)
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("log", help="JSONL file of /query request bodies")
+    parser.add_argument("--mode", choices=["record", "replay"], default="replay")
+    parser.add_argument("--cassette", help="Cassette file (default: PROVIDER_CASSETTE_PATH)")
+    parser.add_argument("--latency-scale", type=float, default=1.0,
+                        help="Replayed provider latency = recorded x this (0: none)")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--semantic-cache", action="store_true", help="Keep the semantic answer cache on")
+    parser.add_argument("--profile", help="Write a cProfile dump of the run here (and print the top functions)")
+    parser.add_argument("--profile-top", type=int, default=25)
+    parser.add_argument("--output", help="Also write the JSON report here")
+    sys.exit(main(parser.parse_args()))
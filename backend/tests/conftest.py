@@ -0,0 +1,25 @@
+import os
+import tempfile
+
+# Required settings, so the app modules import without a .env file; no test talks to these services
+_DEFAULTS = {
+    "PROJECT_NAME": "ragbot-tests",
+    "SQLALCHEMY_DATABASE_URI": "sqlite://",
+    "FIRST_SUPERUSER": "admin@example.com",
+    "FIRST_SUPERUSER_PASSWORD": "password",
+    "FIRST_SUPERUSER_FIRST_NAME": "Admin",
+    "FIRST_SUPERUSER_LAST_NAME": "User",
+    "JWT_USER": "user@example.com",
+    "JWT_USER_PASSWORD": "password",
+    "JWT_USER_FIRST_NAME": "Test",
+    "JWT_USER_LAST_NAME": "User",
+    "TIME_ZONE": "UTC",
+    "QDRANT_COLLECTION_NAME": "tests",
+    "QDRANT_API_KEY": "test",
+    "QDRANT_URL": ":memory:",
+    "USE_FAKE_PROVIDER": "true",
+    # Module-level indexes must not write next to the sources
+    "SPARSE_INDEX_PATH": os.path.join(tempfile.mkdtemp(prefix="ragbot-tests-"), "sparse_index.sqlite"),
+}
+for key, value in _DEFAULTS.items():
+    os.environ.setdefault(key, value)
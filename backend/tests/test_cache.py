@@ -0,0 +1,60 @@
+from app.core.cache import SemanticCache
+
+EMBEDDING = [1.0, 0.0, 0.0]
+PARAMS = {"top_k": 5}
+
+
+def test_lookup_matches_similar_query_with_same_params():
+    cache = SemanticCache(threshold=0.9)
+    cache.store(EMBEDDING, PARAMS, "answer")
+    assert cache.lookup([0.99, 0.05, 0.0], PARAMS) == "answer"
+    assert cache.lookup([0.0, 1.0, 0.0], PARAMS) is None
+    assert cache.lookup(EMBEDDING, {"top_k": 3}) is None
+
+
+def test_store_after_invalidate_is_dropped():
+    cache = SemanticCache()
+    generation = cache.generation
+    # Documents are ingested while the answer is being computed
+    cache.invalidate()
+    cache.store(EMBEDDING, PARAMS, "stale", generation)
+    assert cache.lookup(EMBEDDING, PARAMS) is None
+    assert cache.stats()["stale_stores"] == 1
+
+    cache.store(EMBEDDING, PARAMS, "fresh", cache.generation)
+    assert cache.lookup(EMBEDDING, PARAMS) == "fresh"
+
+
+def test_lru_entry_is_evicted_when_full():
+    cache = SemanticCache(max_entries=2)
+    cache.store([1.0, 0.0, 0.0], PARAMS, "a")
+    cache.store([0.0, 1.0, 0.0], PARAMS, "b")
+    cache.lookup([1.0, 0.0, 0.0], PARAMS)
+    cache.store([0.0, 0.0, 1.0], PARAMS, "c")
+    assert cache.lookup([0.0, 1.0, 0.0], PARAMS) is None
+    assert cache.lookup([1.0, 0.0, 0.0], PARAMS) == "a"
+
+
+def test_entries_survive_reload(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = SemanticCache(path=path)
+    cache.store(EMBEDDING, PARAMS, {"answer": "x"}, cache.generation)
+    cache.flush()
+    assert SemanticCache(path=path).lookup(EMBEDDING, PARAMS) == {"answer": "x"}
+
+
+def test_invalidation_reaches_other_workers_sharing_the_file(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    worker_a = SemanticCache(path=path)
+    worker_b = SemanticCache(path=path)
+    worker_b.store(EMBEDDING, PARAMS, "old", worker_b.generation)
+    worker_b.flush()
+    generation_b = worker_b.generation
+
+    worker_a.invalidate()
+    worker_a.flush()
+    assert worker_b.lookup(EMBEDDING, PARAMS) is None
+    # An answer worker B computed before the invalidation is not stored either
+    worker_b.store(EMBEDDING, PARAMS, "racy", generation_b)
+    worker_b.flush()
+    assert SemanticCache(path=path).lookup(EMBEDDING, PARAMS) is None
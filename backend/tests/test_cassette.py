@@ -0,0 +1,39 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from app.core.cassette import Cassette, CassetteChatModel, CassetteEmbeddings, CassetteMiss
+from app.core.fakes import FakeChatModel, FakeEmbeddings
+
+MESSAGES = [HumanMessage(content="What does aspirin treat?")]
+
+
+def test_chat_and_embeddings_replay_what_was_recorded(tmp_path):
+    path = str(tmp_path / "cassette.sqlite")
+    recorder = Cassette(path, model="fake")
+    llm = CassetteChatModel(cassette=recorder, underlying=FakeChatModel(latency_ms=0, token_latency_ms=0))
+    embeddings = CassetteEmbeddings(recorder, FakeEmbeddings(dim=16, latency_ms=0))
+    recorded_answer = llm.invoke(MESSAGES).content
+    recorded_chunks = [chunk.content for chunk in llm.stream(MESSAGES + [HumanMessage(content="stream")])]
+    recorded_vectors = embeddings.embed_documents(["aspirin", "fever"])
+
+    player = Cassette(path, model="fake", latency_scale=0.0)
+    llm = CassetteChatModel(cassette=player)
+    embeddings = CassetteEmbeddings(player)
+    assert llm.invoke(MESSAGES).content == recorded_answer
+    assert [chunk.content for chunk in llm.stream(MESSAGES + [HumanMessage(content="stream")])] == recorded_chunks
+    # Replayed batches don't have to match the recorded ones
+    replayed = asyncio.run(embeddings.aembed_documents(["fever", "aspirin"]))
+    assert replayed[0] == pytest.approx(recorded_vectors[1], abs=1e-6)
+    assert replayed[1] == pytest.approx(recorded_vectors[0], abs=1e-6)
+    assert player.stats()["misses"] == 0
+
+
+def test_unrecorded_call_is_a_miss(tmp_path):
+    player = Cassette(str(tmp_path / "cassette.sqlite"), model="fake", latency_scale=0.0)
+    with pytest.raises(CassetteMiss):
+        CassetteChatModel(cassette=player).invoke(MESSAGES)
+    with pytest.raises(CassetteMiss):
+        CassetteEmbeddings(player).embed_query("aspirin")
+    assert player.stats()["misses"] == 2
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from app.core.rerank import maximal_marginal_relevance
+from app.core.sparse import reciprocal_rank_fusion
+
+
+def test_rrf_rewards_ids_ranked_in_both_lists():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "b", "d"]], k=60)
+    ids = [point_id for point_id, _ in fused]
+    assert ids[:2] == ["b", "c"] or ids[:2] == ["c", "b"]
+    assert set(ids) == {"a", "b", "c", "d"}
+    scores = dict(fused)
+    assert scores["b"] == pytest.approx(1 / 62 + 1 / 62)
+    assert scores["a"] == pytest.approx(1 / 61)
+
+
+def test_rrf_is_sorted_by_score():
+    fused = reciprocal_rank_fusion([["a", "b"], ["b"]], k=1)
+    assert fused == [("b", pytest.approx(1 / 3 + 1 / 2)), ("a", pytest.approx(1 / 2))]
+
+
+def test_mmr_relevance_only_ranks_by_similarity():
+    query = np.array([1.0, 0.0])
+    candidates = np.array([[0.5, 0.5], [1.0, 0.0], [0.0, 1.0]])
+    assert maximal_marginal_relevance(query, candidates, k=3, lambda_mult=1.0) == [1, 0, 2]
+
+
+def test_mmr_skips_near_duplicates():
+    query = np.array([1.0, 0.2])
+    # Rows 0 and 1 are the same direction; row 2 is less relevant but different
+    candidates = np.array([[1.0, 0.1], [1.0, 0.1], [0.6, 0.8]])
+    assert maximal_marginal_relevance(query, candidates, k=2, lambda_mult=0.5) == [0, 2]
+
+
+def test_mmr_handles_empty_and_small_k():
+    assert maximal_marginal_relevance(np.array([1.0]), np.zeros((0, 1)), k=3) == []
+    assert maximal_marginal_relevance(np.array([1.0, 0.0]), np.eye(2), k=0) == []
+    assert maximal_marginal_relevance(np.array([1.0, 0.0]), np.eye(2), k=5) == [0, 1]
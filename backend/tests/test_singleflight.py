@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+from app.core.singleflight import SingleFlight, flight_key
+
+
+def test_flight_key_normalizes_case_and_whitespace():
+    assert flight_key("query", "  What is  Aspirin? ") == flight_key("query", "what is aspirin?")
+    assert flight_key("query", "aspirin", {"top_k": 5}) != flight_key("query", "aspirin", {"top_k": 3})
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "answer"
+
+    async def main():
+        return await asyncio.gather(*(flight.do("key", compute) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["answer"] * 5
+    assert calls == 1
+    assert flight.stats()["shared"] == 4
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_error_is_raised_to_every_caller():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main():
+        return await asyncio.gather(*(flight.do("key", fail) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    flight = SingleFlight()
+
+    async def compute():
+        await asyncio.sleep(0.02)
+        return "answer"
+
+    async def main():
+        first = asyncio.create_task(flight.do("key", compute))
+        second = asyncio.create_task(flight.do("key", compute))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main()) == "answer"
+
+
+def test_stream_fans_out_every_chunk():
+    flight = SingleFlight()
+    produced = 0
+
+    async def source():
+        nonlocal produced
+        produced += 1
+        for chunk in ("a", "b", "c"):
+            await asyncio.sleep(0.001)
+            yield chunk
+
+    async def consume():
+        return [chunk async for chunk in flight.stream("key", source)]
+
+    async def main():
+        return await asyncio.gather(consume(), consume())
+
+    assert asyncio.run(main()) == [["a", "b", "c"], ["a", "b", "c"]]
+    assert produced == 1
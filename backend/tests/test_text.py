@@ -0,0 +1,39 @@
+from app.core.text import SENTENCE_TOKENS_KEY, TOKEN_COUNT_KEY, pack_contexts, split_sentences
+
+LONG = "Aspirin reduces fever in adults. It also relieves mild pain. Ibuprofen is an alternative."
+
+
+def meta(tokens, sentence_tokens=None):
+    return {TOKEN_COUNT_KEY: tokens, SENTENCE_TOKENS_KEY: sentence_tokens}
+
+
+def test_split_sentences_merges_fragments():
+    assert split_sentences(LONG) == [
+        "Aspirin reduces fever in adults.", "It also relieves mild pain.", "Ibuprofen is an alternative."
+    ]
+    assert split_sentences("Long first sentence. Second.") == ["Long first sentence. Second."]
+
+
+def test_pack_contexts_keeps_whole_contexts_within_budget():
+    contexts = ["first", "second", "third"]
+    packed = pack_contexts(contexts, [meta(3, [3]), meta(4, [4]), meta(5, [5])], budget=10)
+    assert packed == [(0, "first", 3), (1, "second", 4)]
+
+
+def test_pack_contexts_cuts_first_overflowing_context_at_sentence_boundary():
+    contexts = ["Intro.", LONG, "Never reached."]
+    packed = pack_contexts(contexts, [meta(2), meta(9, [3, 3, 3]), meta(1)], budget=8)
+    assert packed == [(0, "Intro.", 2), (1, "Aspirin reduces fever in adults. It also relieves mild pain.", 6)]
+
+
+def test_pack_contexts_always_keeps_first_sentence_of_best_context():
+    packed = pack_contexts([LONG], [meta(50, [40, 5, 5])], budget=5)
+    assert packed == [(0, "Aspirin reduces fever in adults.", 40)]
+
+
+def test_pack_contexts_estimates_tokens_without_stored_counts():
+    packed = pack_contexts(["x" * 40], [{}], budget=100)
+    assert packed == [(0, "x" * 40, 10)]
+    # Stale sentence counts (a different split) fall back to estimates too
+    packed = pack_contexts([LONG], [meta(50, [1, 1])], budget=16)
+    assert packed == [(0, "Aspirin reduces fever in adults. It also relieves mild pain.", 14)]
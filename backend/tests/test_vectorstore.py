@@ -0,0 +1,49 @@
+import os
+
+from langchain_core.documents import Document
+
+from app.core.fakes import FakeEmbeddings
+from app.core.vectorstore import NumpyVectorStore
+
+TEXTS = ["aspirin reduces fever", "ibuprofen treats pain", "insulin lowers blood sugar"]
+
+
+def make_store(path=None):
+    store = NumpyVectorStore(FakeEmbeddings(dim=32, latency_ms=0), path=path)
+    store.add_texts(TEXTS, ids=["a", "b", "c"])
+    return store
+
+
+def test_compact_drops_deleted_rows_and_keeps_live_points():
+    store = make_store()
+    store.delete(["b"])
+    assert store.stats()["rows"] == 3
+
+    store.compact()
+    assert store.stats()["rows"] == 2
+    assert store.existing_ids(["a", "b", "c"]) == {"a", "c"}
+    doc, score = store.similarity_search_with_score("insulin blood sugar", k=1)[0]
+    assert doc.metadata["_id"] == "c"
+    assert score > 0.5
+
+
+def test_upsert_reuses_row_of_existing_id():
+    store = make_store()
+    store.upsert_vectors(["a"], [Document(page_content="updated")], [[1.0] + [0.0] * 31])
+    assert store.stats()["rows"] == 3
+    assert store.get_by_ids(["a"])[0].page_content == "updated"
+
+
+def test_compaction_survives_reload(tmp_path):
+    path = str(tmp_path / "store")
+    store = make_store(path)
+    store.delete(["a"])
+    store.compact()
+    files = set(os.listdir(path))
+
+    reloaded = NumpyVectorStore(FakeEmbeddings(dim=32, latency_ms=0), path=path)
+    assert reloaded.existing_ids(["a", "b", "c"]) == {"b", "c"}
+    assert reloaded.stats()["rows"] == 2
+    assert reloaded.get_vectors(["b"]) == store.get_vectors(["b"])
+    # The files of the previous generation were removed
+    assert not {"vectors.f32", "payloads.jsonl"} & files
@@ -10,6 +10,7 @@ import {
 } from "@/components/ui/accordion";
 
 interface Message {
+  id?: number;
   role: "user" | "assistant";
   content: string;
   contexts?: string[];
@@ -47,13 +48,26 @@ const ChatInterface = () => {
     setInput("");
     setIsTyping(true);
 
+    // The streamed answer is created on its first event and updated in place
+    const assistantId = Date.now();
+    let assistantStarted = false;
+    const updateAssistant = (update: Partial<Message>) => {
+      assistantStarted = true;
+      setMessages((prev) =>
+        prev.some((message) => message.id === assistantId)
+          ? prev.map((message) => (message.id === assistantId ? { ...message, ...update } : message))
+          : [...prev, { role: "assistant", content: "", id: assistantId, ...update }]
+      );
+    };
+
     try {
-      // Call the query endpoint which returns answer + contexts
+      // Stream the query endpoint: sources arrive right after retrieval, then answer tokens
       const apiUrl = import.meta.env.VITE_API_URL || "http://localhost:8000";
-      const response = await fetch(`${apiUrl}/api/v1/query`, {
+      const response = await fetch(`${apiUrl}/api/v1/query/stream`, {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
+          Accept: "text/event-stream",
         },
         body: JSON.stringify({
           query: userQuery,
@@ -62,27 +76,70 @@ const ChatInterface = () => {
         }),
       });
 
-      if (!response.ok) {
+      if (!response.ok || !response.body) {
         throw new Error(`API error: ${response.status}`);
       }
 
-      const data = await response.json();
-      
-      const botMessage: Message = {
-        role: "assistant",
-        content: data.answer || "I apologize, but I couldn't generate a response. Please try again.",
-        contexts: data.contexts || [],
-        scores: data.scores || [],
-        metadata: data.metadata || [],
-      };
-      setMessages((prev) => [...prev, botMessage]);
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let answer = "";
+      let finished = false;
+
+      while (!finished) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // SSE events are separated by a blank line
+        let boundary = buffer.indexOf("\n\n");
+        while (boundary !== -1) {
+          const rawEvent = buffer.slice(0, boundary);
+          buffer = buffer.slice(boundary + 2);
+          boundary = buffer.indexOf("\n\n");
+
+          let event = "message";
+          let data = "";
+          for (const line of rawEvent.split("\n")) {
+            if (line.startsWith("event:")) event = line.slice(6).trim();
+            else if (line.startsWith("data:")) data += line.slice(5).trim();
+          }
+          if (!data) continue;
+          const payload = JSON.parse(data);
+
+          if (event === "contexts") {
+            setIsTyping(false);
+            updateAssistant({
+              contexts: payload.contexts || [],
+              scores: payload.scores || [],
+              metadata: payload.metadata || [],
+            });
+          } else if (event === "token") {
+            setIsTyping(false);
+            answer += payload.text;
+            updateAssistant({ content: answer });
+          } else if (event === "done") {
+            updateAssistant({
+              content: payload.answer || "I apologize, but I couldn't generate a response. Please try again.",
+            });
+            finished = true;
+          } else if (event === "error") {
+            throw new Error(payload.detail || "Streaming error");
+          }
+        }
+      }
     } catch (error) {
       console.error("Error calling API:", error);
-      const errorMessage: Message = {
-        role: "assistant",
-        content: "I apologize, but I'm having trouble connecting to the server. Please make sure the backend is running and try again.",
-      };
-      setMessages((prev) => [...prev, errorMessage]);
+      const errorContent = "I apologize, but I'm having trouble connecting to the server. Please make sure the backend is running and try again.";
+      if (!assistantStarted) {
+        const errorMessage: Message = {
+          role: "assistant",
+          content: errorContent,
+        };
+        setMessages((prev) => [...prev, errorMessage]);
+      } else {
+        updateAssistant({ content: errorContent });
+      }
     } finally {
       setIsTyping(false);
     }